@@ -16,6 +16,7 @@ from dfm_tools.interpolate_grid2bnd import *
 from dfm_tools.linebuilder import *
 from dfm_tools.modplot import *
 from dfm_tools.xarray_helpers import *
+from dfm_tools.chunking import *
 from dfm_tools.xugrid_helpers import *
 from dfm_tools.energy_dissipation import *
 from dfm_tools.bathymetry import *
@@ -0,0 +1,142 @@
+import numpy as np
+import dask
+import xarray as xr
+from dfm_tools.xarray_helpers import file_to_list
+
+__all__ = ["get_chunks"]
+
+ACCESS_PATTERNS = ['snapshot', 'timeseries', 'reduction']
+
+
+def get_variables_chunkinfo(file_nc:str, dimn_time:str = 'time') -> list:
+    """
+    Read the dimension sizes, itemsize and on-disk chunksizes of all variables with a time dimension
+    and at least one other dimension from the netCDF header, without reading any data.
+    The file is opened with xarray, so the netCDF/HDF5 access is guarded by the xarray locks
+    and get_chunks() is safe to call from multiple threads.
+    """
+    varinfo_list = []
+    with xr.open_dataset(file_nc, decode_cf=False) as ds:
+        for varn, var in ds.variables.items():
+            if dimn_time not in var.dims or var.ndim < 2:
+                continue
+            sizes = dict(zip(var.dims, var.shape))
+            chunksizes = var.encoding.get('chunksizes')
+            if chunksizes is None:
+                # contiguous: any hyperslab can be read efficiently, so no constraint on the chunksizes
+                disk_chunks = {dimn:1 for dimn in var.dims}
+            else:
+                disk_chunks = dict(zip(var.dims, chunksizes))
+            varinfo = {'name': varn,
+                       'sizes': sizes,
+                       'disk_chunks': disk_chunks,
+                       'itemsize': var.dtype.itemsize,
+                       }
+            varinfo_list.append(varinfo)
+    return varinfo_list
+
+
+def round_to_disk_chunks(chunksize:int, disk_chunksize:int, size:int) -> int:
+    """
+    Clip the chunksize to the dimension size and round it down to a multiple of the on-disk chunksize,
+    so every dask chunk reads complete on-disk chunks. Chunksizes smaller than the on-disk chunksize
+    are increased to the on-disk chunksize, since the entire on-disk chunk is read anyway.
+    """
+    if chunksize >= size:
+        return size
+    if disk_chunksize > 1:
+        chunksize = max(disk_chunksize, chunksize // disk_chunksize * disk_chunksize)
+    return int(min(size, max(1, chunksize)))
+
+
+def get_chunks(file_nc:str, access_pattern:str = 'snapshot', chunksize_bytes:int = None, dimn_time:str = 'time', npartitions:int = 1) -> dict:
+    """
+    Derive chunks for opening a netCDF file based on the dimension sizes, dtypes and on-disk
+    chunking of the variables and the intended access pattern. Only the netCDF header of the
+    first file is read. The variable with the most bytes per timestep is leading for the time chunk,
+    spatial dimensions are only chunked if a chunk would otherwise exceed chunksize_bytes.
+
+    Parameters
+    ----------
+    file_nc : str
+        Path to the netCDF file(s), wildcards are supported (only the first file is used).
+    access_pattern : str, optional
+        The intended access pattern of the data, one of:
+
+        - 'snapshot': access to (a few) timesteps for the entire domain, for instance for plotting maps.
+          The time chunk is equal to the on-disk time chunk (often 1).
+        - 'timeseries': access to many timesteps for (a few) locations, for instance for point extraction.
+          The time dimension is not chunked and the spatial dimension is chunked instead.
+        - 'reduction': reductions over time like mean/sum/max. As many timesteps as fit in chunksize_bytes
+          are combined in one chunk.
+
+        The default is 'snapshot'.
+    chunksize_bytes : int, optional
+        The target chunksize in bytes. If None, the dask configuration value "array.chunk-size" is used,
+        which can be set with e.g. `dask.config.set({"array.chunk-size": "64MiB"})`. The default is None.
+    dimn_time : str, optional
+        The name of the time dimension. The default is 'time'.
+    npartitions : int, optional
+        The number of partitions that are merged along the spatial dimensions after opening,
+        like in dfmt.open_partitioned_dataset(). The bytes per timestep are multiplied with npartitions and
+        spatial dimensions are not chunked, since they are merged into a single chunk. The default is 1.
+
+    Raises
+    ------
+    ValueError
+        If an unknown access_pattern is provided.
+
+    Returns
+    -------
+    chunks : dict
+        Chunks that can be passed to xr.open_dataset() or xr.open_mfdataset().
+
+    """
+    if access_pattern not in ACCESS_PATTERNS:
+        raise ValueError(f"unknown access_pattern '{access_pattern}', options are {ACCESS_PATTERNS}")
+
+    if chunksize_bytes is None:
+        chunksize_bytes = dask.utils.parse_bytes(dask.config.get('array.chunk-size'))
+
+    file_nc_one = file_to_list(file_nc)[0]
+    varinfo_list = get_variables_chunkinfo(file_nc_one, dimn_time=dimn_time)
+    if len(varinfo_list) == 0:
+        # no variables with time dimension, equal to previous default
+        return {dimn_time:1}
+
+    # bytes per timestep (for the merged dataset in case of partitions)
+    for varinfo in varinfo_list:
+        nvalues_timestep = np.prod([size for dimn, size in varinfo['sizes'].items() if dimn != dimn_time])
+        varinfo['nbytes_timestep'] = varinfo['itemsize'] * nvalues_timestep * npartitions
+    varinfo_lead = max(varinfo_list, key=lambda varinfo: varinfo['nbytes_timestep'])
+    ntimes = varinfo_lead['sizes'][dimn_time]
+    disk_chunk_time = varinfo_lead['disk_chunks'][dimn_time]
+
+    # derive time chunk from leading variable
+    if access_pattern == 'snapshot':
+        chunk_time = disk_chunk_time if disk_chunk_time * varinfo_lead['nbytes_timestep'] <= chunksize_bytes else 1
+    elif access_pattern == 'reduction' or npartitions > 1:
+        chunk_time = chunksize_bytes // varinfo_lead['nbytes_timestep']
+    else: # timeseries
+        # bytes for all timesteps of one location of the largest spatial dimension
+        dimn_split = max([dimn for dimn in varinfo_lead['sizes'] if dimn != dimn_time], key=varinfo_lead['sizes'].get)
+        nbytes_location = varinfo_lead['nbytes_timestep'] / varinfo_lead['sizes'][dimn_split] * ntimes
+        chunk_time = ntimes if nbytes_location <= chunksize_bytes else chunksize_bytes // (nbytes_location / ntimes)
+    chunk_time = round_to_disk_chunks(chunk_time, disk_chunksize=disk_chunk_time, size=ntimes)
+    chunks = {dimn_time: chunk_time}
+
+    if npartitions > 1:
+        return chunks
+
+    # chunk the largest spatial dimension of each variable if a chunk of this variable exceeds chunksize_bytes
+    for varinfo in varinfo_list:
+        nbytes_chunk = varinfo['nbytes_timestep'] * min(chunk_time, varinfo['sizes'][dimn_time])
+        if nbytes_chunk <= chunksize_bytes:
+            continue
+        dimn_split = max([dimn for dimn in varinfo['sizes'] if dimn != dimn_time], key=varinfo['sizes'].get)
+        size_split = varinfo['sizes'][dimn_split]
+        chunk_split = chunksize_bytes // (nbytes_chunk / size_split)
+        chunk_split = round_to_disk_chunks(chunk_split, disk_chunksize=varinfo['disk_chunks'][dimn_split], size=size_split)
+        chunks[dimn_split] = min(chunks.get(dimn_split, size_split), chunk_split)
+
+    return chunks
@@ -6,7 +6,7 @@ __all__ = ["compute_energy_dissipation"]
 def compute_energy_dissipation(data_xr_map,file_ED_computed):
     """
     Example:
-        data_xr_map = dfmt.open_partitioned_dataset(file_nc_map,chunks={'time':100}) #TODO: important to have time>1, otherwise time-mean floods memory (100-200 seems optimal for GTSM 1month, but memory still floods so 1 year would probably be impossible).
+        data_xr_map = dfmt.open_partitioned_dataset(file_nc_map,access_pattern='reduction') #important to have time>1, otherwise time-mean floods memory
         data_xr_map = data_xr_map.sel(time=slice('2014-01-01','2014-02-01'))
         dfmt.compute_energy_dissipation(data_xr_map,file_ED_computed)
 
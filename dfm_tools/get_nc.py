@@ -1,16 +1,24 @@
+import os
 import numpy as np
 import datetime as dt
 import re
+import dask
+import scipy.sparse
 import xugrid as xu
 import xarray as xr
 import matplotlib.pyplot as plt
+import geopandas
 from dfm_tools.xarray_helpers import Dataset_varswithdim
-from dfm_tools.xugrid_helpers import get_vertical_dimensions, decode_default_fillvals
+from dfm_tools.xugrid_helpers import get_vertical_dimensions, decode_default_fillvals, get_face_locator, FaceLocator, get_grid_key, sparse_weighted_mean
 
 __all__ = ["polyline_mapslice",
+           "polyline_mapslice_batch",
+           "get_crs_timestep",
            "reconstruct_zw_zcc",
            "get_Dataset_atdepths",
+           "Rasterizer",
            "rasterize_ugrid",
+           "extract_timeseries_at_points",
            "plot_ztdata",
     ]
 
@@ -39,10 +47,16 @@ def calc_dist_haversine(lon1,lon2,lat1,lat2):
     return distance
 
 
-def intersect_edges_withsort(uds,edges): #TODO: move sorting to xugrid? https://deltares.github.io/xugrid/api/xugrid.Ugrid2d.intersect_edges.html
-    
-    edge_index, face_index, intersections = uds.grid.intersect_edges(edges) #TODO: is fast, but maybe speed can be increased with bounding box?
+def intersect_edges_withsort(uds, edges, face_locator=None): #TODO: move sorting to xugrid? https://deltares.github.io/xugrid/api/xugrid.Ugrid2d.intersect_edges.html
     
+    if face_locator is None:
+        face_locator = get_face_locator(uds.grid)
+    edge_index, face_index, intersections = face_locator.intersect_edges(edges) # with bounding box prefilter if the celltree is not built yet
+    edge_index, face_index, intersections = sort_intersections(edges, edge_index, face_index, intersections)
+    return edge_index, face_index, intersections
+
+
+def sort_intersections(edges, edge_index, face_index, intersections):
     #ordering of face_index is wrong (visible with cb3 with long line_array), so sort on distance from startpoint (in x/y units)
     
     #compute distance from start of line to start of each linepart
@@ -65,14 +79,11 @@ def intersect_edges_withsort(uds,edges): #TODO: move sorting to xugrid? https://
 
 def get_xzcoords_onintersection(uds, face_index, crs_dist_starts, crs_dist_stops):
     #TODO: remove hardcoding of variable names
-    if 'time' in uds.dims: #TODO: maybe make time dependent grid?
-        raise Exception('time dimension present in uds, provide uds.isel(time=timestep) instead. This is necessary to retrieve correct waterlevel or fullgrid output')
-    
     dimn_layer, dimn_interfaces = get_vertical_dimensions(uds)
     gridname = uds.grid.name
     
-    #construct fullgrid info (zcc/zw) for 3D models
-    if dimn_layer in uds.dims:
+    #construct fullgrid info (zcc/zw) for 3D models, unless already reconstructed (e.g. by polyline_mapslice_batch)
+    if dimn_layer in uds.dims and f'{gridname}_flowelem_zw' not in uds.variables:
         uds = reconstruct_zw_zcc(uds)
 
     #drop all variables that do not contain a face dimension, then select only all sliced faceidx
@@ -84,13 +95,21 @@ def get_xzcoords_onintersection(uds, face_index, crs_dist_starts, crs_dist_stops
     # take zvals_interface
     if dimn_layer in uds_sel.dims: #3D model
         nlay = uds.sizes[dimn_layer]
-        zvals_interface_filled = uds_sel[f'{gridname}_flowelem_zw'].bfill(dim=dimn_interfaces) #fill nan values (below bed) with equal values
-        zvals_interface = zvals_interface_filled.to_numpy().T #transpose to make in line with 2D sigma dataset
+        zvals_interface_xr = uds_sel[f'{gridname}_flowelem_zw'].bfill(dim=dimn_interfaces) #fill nan values (below bed) with equal values
     else: #2D model, no layers
         nlay = 1
-        data_frommap_wl3_sel = uds_sel[f'{gridname}_s1'].to_numpy() #TODO: add escape for missing wl/bl vars
-        data_frommap_bl_sel = uds_sel[f'{gridname}_flowelem_bl'].to_numpy()
-        zvals_interface = np.linspace(data_frommap_bl_sel,data_frommap_wl3_sel,nlay+1)
+        dimn_interfaces = 'crs_interfaces'
+        data_frommap_wl3_sel = uds_sel[f'{gridname}_s1'] #TODO: add escape for missing wl/bl vars
+        data_frommap_bl_sel = uds_sel[f'{gridname}_flowelem_bl']
+        data_frommap_bl_sel, data_frommap_wl3_sel = xr.broadcast(data_frommap_bl_sel, data_frommap_wl3_sel)
+        zvals_interface_xr = xr.concat([data_frommap_bl_sel, data_frommap_wl3_sel], dim=dimn_interfaces)
+    zvals_interface_xr = zvals_interface_xr.transpose(..., dimn_interfaces, 'ncrossed_faces') #in line with 2D sigma dataset
+    
+    # the grid is time-independent, so take the zvalues of the first timestep in case of a time dimension
+    if 'time' in zvals_interface_xr.dims:
+        zvals_interface = zvals_interface_xr.isel(time=0).to_numpy()
+    else:
+        zvals_interface = zvals_interface_xr.to_numpy()
 
     #derive crs_verts
     crs_dist_starts_matrix = np.repeat(crs_dist_starts[np.newaxis],nlay,axis=0)
@@ -114,14 +133,44 @@ def get_xzcoords_onintersection(uds, face_index, crs_dist_starts, crs_dist_stops
     else: #2D: still make sure xr_crs_grid.face_dimension is created, using stack since .rename() gives "UserWarning: rename 'ncrossed_faces' to 'mesh2d_nFaces' does not create an index anymore."
         crs_plotdata_clean = uds_sel.stack({xr_crs_grid.face_dimension:['ncrossed_faces']},create_index=False)
                     
+    #add lazy time-varying zvalues of the nodes, in the same order as the crs_verts
+    if 'time' in zvals_interface_xr.dims:
+        zvals_top = zvals_interface_xr.isel({dimn_interfaces:slice(1,None)})
+        zvals_bot = zvals_interface_xr.isel({dimn_interfaces:slice(None,-1)})
+        zvals_verts = xr.concat([zvals_top, zvals_top, zvals_bot, zvals_bot], dim='crs_nmax_face_nodes')
+        zvals_verts = zvals_verts.transpose('time', dimn_interfaces, 'ncrossed_faces', 'crs_nmax_face_nodes')
+        nodez_data = zvals_verts.data.reshape(zvals_verts.shape[0], -1)
+        crs_plotdata_clean[f'{xr_crs_grid.name}_node_z'] = xr.DataArray(nodez_data, dims=('time', xr_crs_grid.node_dimension))
+    
     #combine into xugrid
     xr_crs_ugrid = xu.UgridDataset(crs_plotdata_clean, grids=[xr_crs_grid])
     return xr_crs_ugrid
 
 
-def polyline_mapslice(uds:xu.UgridDataset, line_array:np.array) -> xu.UgridDataset:
+def get_crs_timestep(xr_crs_ugrid:xu.UgridDataset, timestep:int) -> xu.UgridDataset:
+    """
+    Select one timestep from a time-dependent cross section created with dfmt.polyline_mapslice() and replace the
+    node_y of the time-independent grid with the zvalues of this timestep.
+    """
+    varn_nodez = f'{xr_crs_ugrid.grid.name}_node_z'
+    xr_crs_ugrid_sel = xr_crs_ugrid.isel(time=timestep)
+    grid = xr_crs_ugrid.grid
+    xr_crs_grid = xu.Ugrid2d(node_x=grid.node_x,
+                             node_y=xr_crs_ugrid_sel[varn_nodez].to_numpy(),
+                             fill_value=-1,
+                             face_node_connectivity=grid.face_node_connectivity,
+                             )
+    ds = xr_crs_ugrid_sel.ugrid.obj.drop_vars(varn_nodez)
+    xr_crs_ugrid_sel = xu.UgridDataset(ds, grids=[xr_crs_grid])
+    return xr_crs_ugrid_sel
+
+
+def polyline_mapslice(uds:xu.UgridDataset, line_array:np.array, face_locator:FaceLocator = None) -> xu.UgridDataset:
     """
     Slice trough mapdata, combine: intersect_edges_withsort, calculation of distances and conversion to ugrid dataset.
+    If uds contains a time dimension, the intersection is computed only once and the data remains lazy. The node_y of the
+    cross section grid then contains the zvalues of the first timestep and the zvalues of all timesteps are stored
+    in the {gridname}_node_z variable. Use dfmt.get_crs_timestep() to get a cross section with the grid of another timestep.
 
     Parameters
     ----------
@@ -129,8 +178,8 @@ def polyline_mapslice(uds:xu.UgridDataset, line_array:np.array) -> xu.UgridDatas
         DESCRIPTION.
     line_array : np.array
         DESCRIPTION.
-    calcdist_fromlatlon : bool, optional
-        DESCRIPTION. The default is None.
+    face_locator : FaceLocator, optional
+        Reusable spatial index of the grid, retrieved with dfmt.get_face_locator(uds.grid) if not provided. The default is None.
 
     Raises
     ------
@@ -146,10 +195,20 @@ def polyline_mapslice(uds:xu.UgridDataset, line_array:np.array) -> xu.UgridDatas
     
     #compute intersection coordinates of crossings between edges and faces and their respective indices
     edges = np.stack([line_array[:-1],line_array[1:]],axis=1)
-    edge_index, face_index, intersections = intersect_edges_withsort(uds=uds, edges=edges)
+    edge_index, face_index, intersections = intersect_edges_withsort(uds=uds, edges=edges, face_locator=face_locator)
     if len(edge_index) == 0:
         raise ValueError('polyline does not cross mapdata')
     
+    #compute pyt/haversine start/stop distances for all intersections
+    crs_dist_starts, crs_dist_stops = get_crs_distances(uds, edges, edge_index, intersections)
+    
+    #derive vertices from cross section (distance from first point)
+    xr_crs_ugrid = get_xzcoords_onintersection(uds=uds, face_index=face_index, crs_dist_starts=crs_dist_starts, crs_dist_stops=crs_dist_stops)
+    
+    return xr_crs_ugrid
+
+
+def get_crs_distances(uds, edges, edge_index, intersections):
     if uds.grids[0].is_geographic:
         calc_dist = calc_dist_haversine
     else:
@@ -161,11 +220,95 @@ def polyline_mapslice(uds:xu.UgridDataset, line_array:np.array) -> xu.UgridDatas
     edge_len_cum0 = np.concatenate([[0],edge_len_cum[:-1]])
     crs_dist_starts = calc_dist(edges[edge_index,0,0], intersections[:,0,0], edges[edge_index,0,1], intersections[:,0,1]) + edge_len_cum0[edge_index]
     crs_dist_stops  = calc_dist(edges[edge_index,0,0], intersections[:,1,0], edges[edge_index,0,1], intersections[:,1,1]) + edge_len_cum0[edge_index]
+    return crs_dist_starts, crs_dist_stops
+
+
+def concat_crs_ugrids(crs_list:list, dimn_transect:str = 'transect') -> xu.UgridDataset:
+    """
+    Concatenate cross section UgridDatasets into one UgridDataset, the transect number of each face is
+    added as a face coordinate.
+    """
+    grids = [xr_crs_ugrid.grid for xr_crs_ugrid in crs_list]
+    node_offsets = np.cumsum([0] + [grid.n_node for grid in grids[:-1]])
+    face_node_connectivity = np.concatenate([grid.face_node_connectivity + offset for grid, offset in zip(grids, node_offsets)])
+    xr_crs_grid = xu.Ugrid2d(node_x=np.concatenate([grid.node_x for grid in grids]),
+                             node_y=np.concatenate([grid.node_y for grid in grids]),
+                             fill_value=-1,
+                             face_node_connectivity=face_node_connectivity,
+                             )
+    facedim = xr_crs_grid.face_dimension
+    ds_list = []
+    for itransect, xr_crs_ugrid in enumerate(crs_list):
+        ds_one = xr_crs_ugrid.ugrid.obj.assign_coords({dimn_transect:(facedim, np.full(xr_crs_ugrid.grid.n_face, itransect))})
+        ds_list.append(ds_one)
+    ds = xr.concat(ds_list, dim=facedim, data_vars='minimal', coords='minimal', compat='override')
+    xr_crs_ugrid = xu.UgridDataset(ds, grids=[xr_crs_grid])
+    return xr_crs_ugrid
+
+
+def polyline_mapslice_batch(uds:xu.UgridDataset, line_array_list:list, face_locator:FaceLocator = None, concat:bool = False):
+    """
+    Slice trough mapdata with multiple polylines at once. The zw/zcc reconstruction of 3D models is done only once,
+    the edges of all polylines are intersected with the grid in one call and the crossed faces of all
+    polylines are loaded at once.
+
+    Parameters
+    ----------
+    uds : xu.UgridDataset
+        DESCRIPTION.
+    line_array_list : list
+        list of np.array polylines with shape (npoints, 2).
+    face_locator : FaceLocator, optional
+        Reusable spatial index of the grid, retrieved with dfmt.get_face_locator(uds.grid) if not provided. The default is None.
+    concat : bool, optional
+        Concatenate the cross sections of all polylines into one UgridDataset with a transect face coordinate. The default is False.
+
+    Raises
+    ------
+    ValueError
+        If one of the polylines does not cross the mapdata.
+
+    Returns
+    -------
+    list or xu.UgridDataset
+        list of cross section UgridDatasets (one per polyline) or one concatenated UgridDataset if concat=True.
+
+    """
+    #construct fullgrid info (zcc/zw) for 3D models only once
+    dimn_layer, dimn_interfaces = get_vertical_dimensions(uds)
+    if dimn_layer in uds.dims:
+        uds = reconstruct_zw_zcc(uds)
     
-    #derive vertices from cross section (distance from first point)
-    xr_crs_ugrid = get_xzcoords_onintersection(uds=uds, face_index=face_index, crs_dist_starts=crs_dist_starts, crs_dist_stops=crs_dist_stops)
+    #compute intersections of the edges of all polylines at once
+    edges_list = [np.stack([line_array[:-1],line_array[1:]],axis=1) for line_array in line_array_list]
+    edges_offsets = np.cumsum([0] + [len(edges) for edges in edges_list])
+    edges_all = np.concatenate(edges_list)
+    if face_locator is None:
+        face_locator = get_face_locator(uds.grid)
+    edge_index_all, face_index_all, intersections_all = face_locator.intersect_edges(edges_all)
     
-    return xr_crs_ugrid
+    #select and load the crossed faces of all polylines at once, time-dependent data is kept lazy
+    #the reconstructed zw/zcc are face coordinates, so they are selected as well and not reconstructed per polyline
+    xu_facedim = uds.grid.face_dimension
+    face_unique, face_index_unique = np.unique(face_index_all, return_inverse=True)
+    uds_faces = Dataset_varswithdim(uds, dimname=xu_facedim).isel({xu_facedim:face_unique})
+    if 'time' not in uds_faces.dims:
+        uds_faces = uds_faces.load()
+    
+    crs_list = []
+    for iline, edges in enumerate(edges_list):
+        bool_line = (edge_index_all >= edges_offsets[iline]) & (edge_index_all < edges_offsets[iline+1])
+        if not bool_line.any():
+            raise ValueError(f'polyline {iline} does not cross mapdata')
+        edge_index = edge_index_all[bool_line] - edges_offsets[iline]
+        edge_index, face_index, intersections = sort_intersections(edges, edge_index, face_index_unique[bool_line], intersections_all[bool_line])
+        crs_dist_starts, crs_dist_stops = get_crs_distances(uds, edges, edge_index, intersections)
+        xr_crs_ugrid = get_xzcoords_onintersection(uds=uds_faces, face_index=face_index, crs_dist_starts=crs_dist_starts, crs_dist_stops=crs_dist_stops)
+        crs_list.append(xr_crs_ugrid)
+    
+    if concat:
+        return concat_crs_ugrids(crs_list)
+    return crs_list
 
 
 def get_formula_terms(uds, varn_contains):
@@ -222,11 +365,13 @@ def reconstruct_zw_zcc_fromz(uds):
     # zvals_center = uds[f'{gridname}_layer_z']
     # zcc = (uds_z0+zvals_center).clip(min=uds_bl, max=uds_eta)
 
-    #deriving zinterface values, first expanding zint to wl.max(), then clipping zw to bl/wl
+    #deriving zinterface values, first expanding top zint to inf, then clipping zw to bl/wl
     zvals_interface = uds[f'{gridname}_interface_z']
-    # make sure mesh2d_interface_z.max()>=wl.max() (is clipped to wl again in next step)
-    if zvals_interface[-1] < uds_eta.max():
-        zvals_interface[-1] = uds_eta.max()
+    # the top interface is always clipped to the wl, so replace it with inf instead of wl.max().
+    # This avoids reading the entire waterlevel variable and modifying the interface_z variable inplace
+    nint = zvals_interface.sizes[dimn_interfaces]
+    bool_topint = xr.DataArray(np.arange(nint)==nint-1, dims=dimn_interfaces)
+    zvals_interface = zvals_interface.where(~bool_topint, np.inf)
     zw = (uds_z0+zvals_interface).clip(min=uds_bl, max=uds_eta)
        
     # correction: set interfaces below bed to nan (keeping the interface at the bed with shift)
@@ -255,18 +400,19 @@ def reconstruct_zw_zcc_fromzsigma(uds):
     dimn_layer, dimn_interfaces = get_vertical_dimensions(uds)
     gridname = uds.grid.name
     
-    # temporarily decode default fillvalues
-    # TODO: xarray only decodes explicitly set fillvalues: https://github.com/Deltares/dfm_tools/issues/490
-    uds = xu.UgridDataset(decode_default_fillvals(uds.obj),grids=uds.grids)
-    
     osz_formulaterms_int_dict = get_formula_terms(uds,varn_contains='interface')
     # osz_formulaterms_lay_dict = get_formula_terms(uds,varn_contains='layer')
     
-    uds_eta = uds[osz_formulaterms_int_dict['eta']] #mesh2d_s1
-    uds_depth = uds[osz_formulaterms_int_dict['depth']] #mesh2d_bldepth: positive version of mesh2d_flowelem_bl, but this one is always in file
-    uds_depth_c = uds[osz_formulaterms_int_dict['depth_c']] #mesh2d_sigmazdepth
-    uds_zlev_int = uds[osz_formulaterms_int_dict['zlev']] #mesh2d_interface_z
-    uds_sigma_int = uds[osz_formulaterms_int_dict['sigma']] #mesh2d_interface_sigma
+    # temporarily decode default fillvalues, only for the formula_terms variables
+    # TODO: xarray only decodes explicitly set fillvalues: https://github.com/Deltares/dfm_tools/issues/490
+    varnames_formulaterms = [osz_formulaterms_int_dict[key] for key in ['eta','depth','depth_c','zlev','sigma']]
+    ds_formulaterms = decode_default_fillvals(uds.obj[varnames_formulaterms])
+    
+    uds_eta = ds_formulaterms[osz_formulaterms_int_dict['eta']] #mesh2d_s1
+    uds_depth = ds_formulaterms[osz_formulaterms_int_dict['depth']] #mesh2d_bldepth: positive version of mesh2d_flowelem_bl, but this one is always in file
+    uds_depth_c = ds_formulaterms[osz_formulaterms_int_dict['depth_c']] #mesh2d_sigmazdepth
+    uds_zlev_int = ds_formulaterms[osz_formulaterms_int_dict['zlev']] #mesh2d_interface_z
+    uds_sigma_int = ds_formulaterms[osz_formulaterms_int_dict['sigma']] #mesh2d_interface_sigma
     # uds_zlev_lay = uds[osz_formulaterms_lay_dict['zlev']] #mesh2d_layer_z
     # uds_sigma_lay = uds[osz_formulaterms_lay_dict['sigma']] #mesh2d_layer_sigma
     
@@ -295,15 +441,46 @@ def reconstruct_zw_zcc_fromzsigma(uds):
     return uds
 
 
-def reconstruct_zw_zcc(uds:xu.UgridDataset):
+ZWZCC_CACHE = {}
+ZWZCC_CACHE_MAXSIZE = 8
+
+
+def get_zw_zcc_cachekey(uds:xu.UgridDataset) -> str:
+    """
+    Deterministic key of all variables that are used to reconstruct zw/zcc (including their time/face selection),
+    based on the dask names of lazy variables and the data of loaded variables.
+    """
+    gridname = uds.grid.name
+    varnames = [f'{gridname}_s1', f'{gridname}_flowelem_bl', f'{gridname}_interface_z', f'{gridname}_layer_z']
+    for varn, var in uds.filter_by_attrs(formula_terms=lambda v: v is not None).variables.items():
+        if 'formula_terms' not in var.attrs:
+            continue
+        varnames.append(varn)
+        tokens = re.split('[:\\s]+', var.attrs['formula_terms'])
+        varnames.extend(tokens[1::2])
+    varnames = sorted(set(varnames) & set(uds.variables))
+    cachekey = dask.base.tokenize(gridname, varnames, [uds.variables[varn] for varn in varnames])
+    return cachekey
+
+
+def reconstruct_zw_zcc(uds:xu.UgridDataset, cache:bool = True, file_zw:str = None):
     """
     reconstruct full grid output (time/face-varying z-values) for all layertypes,
-    calls the respective reconstruction function
+    calls the respective reconstruction function. The reconstructed zw/zcc are cached on the
+    variables they are derived from (including the time/face selection), so repeated depth slices
+    and transects of the same selection reuse them. Lazy zw/zcc stay lazy, the cache only stores
+    their variables (dask graphs or loaded arrays) and no references to the dataset.
 
     Parameters
     ----------
     uds : xu.UgridDataset
         DESCRIPTION.
+    cache : bool, optional
+        Reuse zw/zcc that were reconstructed before for the same selection of the dataset. The default is True.
+    file_zw : str, optional
+        Path to a netcdf file to persist the reconstructed zw/zcc, for instance next to the mapfile.
+        If the file exists and was written for the same selection of the dataset, zw/zcc are read
+        from this file (into memory) instead, otherwise the file is (over)written. The default is None.
 
     Raises
     ------
@@ -319,10 +496,34 @@ def reconstruct_zw_zcc(uds:xu.UgridDataset):
     
     gridname = uds.grid.name
     varname_zint = f'{gridname}_flowelem_zw'
+    varname_zcen = f'{gridname}_flowelem_zcc'
     
     #reconstruct zw/zcc variables (if not in file) and treat as fullgrid mapfile from here
     if varname_zint in uds.variables: #fullgrid info already available, so continuing
         print(f'zw/zcc (fullgrid) values already present in Dataset in variable {varname_zint}')
+        return uds
+    
+    if cache or file_zw is not None:
+        cachekey = get_zw_zcc_cachekey(uds)
+    
+    if file_zw is not None and os.path.exists(file_zw):
+        # load and close the file directly, so it can be overwritten for another selection
+        with xr.open_dataset(file_zw) as ds_zw:
+            if ds_zw.attrs.get('dfmt_cachekey') == cachekey:
+                print(f'zw/zcc (fullgrid) values read from {file_zw}')
+                ds_zw = ds_zw.load()
+                uds[varname_zint] = ds_zw[varname_zint]
+                uds[varname_zcen] = ds_zw[varname_zcen]
+                uds = uds.set_coords([varname_zint,varname_zcen])
+                return uds
+    
+    if cache and cachekey in ZWZCC_CACHE:
+        print('zw/zcc (fullgrid) values reused from cache')
+        zw, zcc = ZWZCC_CACHE[cachekey]
+        # shallow copies, so changing the attrs of the returned variables does not alter the cache
+        uds[varname_zint] = zw.copy(deep=False)
+        uds[varname_zcen] = zcc.copy(deep=False)
+        uds = uds.set_coords([varname_zint,varname_zcen])
     elif len(uds.filter_by_attrs(standard_name='ocean_sigma_z_coordinate')) != 0:
         print('zsigma-layer model, computing zw/zcc (fullgrid) values and treat as fullgrid model from here')
         uds = reconstruct_zw_zcc_fromzsigma(uds)
@@ -334,14 +535,132 @@ def reconstruct_zw_zcc(uds:xu.UgridDataset):
         uds = reconstruct_zw_zcc_fromz(uds)
     else:
         raise KeyError(f'layers present, but unknown layertype, expected one of variables: {gridname}_flowelem_zw, {gridname}_layer_sigma, {gridname}_layer_z')
+    
+    if cache and cachekey not in ZWZCC_CACHE:
+        zw = uds[varname_zint].variable
+        zcc = uds[varname_zcen].variable
+        if len(ZWZCC_CACHE) >= ZWZCC_CACHE_MAXSIZE:
+            ZWZCC_CACHE.pop(next(iter(ZWZCC_CACHE)))
+        ZWZCC_CACHE[cachekey] = (zw, zcc)
+    
+    if file_zw is not None:
+        print(f'>> writing zw/zcc (fullgrid) values to {file_zw}: ',end='')
+        dtstart = dt.datetime.now()
+        ds_zw = xr.Dataset({varname_zint:uds[varname_zint].obj.reset_coords(drop=True),
+                            varname_zcen:uds[varname_zcen].obj.reset_coords(drop=True)},
+                           attrs={'dfmt_cachekey':cachekey})
+        ds_zw.to_netcdf(file_zw)
+        print(f'{(dt.datetime.now()-dtstart).total_seconds():.2f} sec')
     return uds
 
     
-def get_Dataset_atdepths(data_xr:xu.UgridDataset, depths, reference:str ='z0'):    
+def fill_nan_interfaces(zvals:np.ndarray) -> np.ndarray:
+    """
+    Replace nan zvalues along the last axis (below bed and above waterlevel in zlayer models) with -inf
+    below the first valid value and with inf otherwise, so the zvalues are monotonically increasing.
+    """
+    bool_nan = np.isnan(zvals)
+    bool_belowvalid = np.cumsum(~bool_nan, axis=-1) == 0
+    zvals_filled = np.where(bool_nan, np.where(bool_belowvalid, -np.inf, np.inf), zvals)
+    return zvals_filled
+
+
+def searchsorted_lastaxis(zvals:np.ndarray, depths:np.ndarray) -> np.ndarray:
+    """
+    np.searchsorted(side='right') of depths in each row of zvals with shape (..., n), the rows have
+    to be monotonically increasing. A binary search is done for all rows and depths at once, so it
+    takes ceil(log2(n+1)) steps. Returns an array with shape (..., ndepths) with the number of zvalues
+    below or on each depth.
+    """
+    nvals = zvals.shape[-1]
+    shape_out = zvals.shape[:-1] + (len(depths),)
+    depths = np.broadcast_to(depths, shape_out)
+    index_lo = np.zeros(shape_out, dtype=int)
+    index_hi = np.full(shape_out, nvals, dtype=int)
+    for _ in range(int(np.ceil(np.log2(nvals + 1)))):
+        index_mid = (index_lo + index_hi) // 2
+        z_mid = np.take_along_axis(zvals, np.minimum(index_mid, nvals - 1), axis=-1)
+        bool_active = index_lo < index_hi
+        bool_right = bool_active & (z_mid <= depths)
+        index_lo = np.where(bool_right, index_mid + 1, index_lo)
+        index_hi = np.where(bool_active & ~bool_right, index_mid, index_hi)
+    return index_lo
+
+
+def get_layer_index(zw:np.ndarray, depths:np.ndarray) -> np.ndarray:
+    """
+    Layer index of the layer containing each depth for interface zvalues with shape (..., ninterfaces),
+    returns an array with shape (..., ndepths) with -1 for depths outside of the watercolumn.
+    Depths on an interface are assigned to the upper layer, unless it is the top interface.
+    """
+    nlay = zw.shape[-1] - 1
+    zw_filled = fill_nan_interfaces(zw)
+    # number of interfaces below or on each depth
+    layer_index = searchsorted_lastaxis(zw_filled, depths) - 1
+    
+    def bool_layer_contains(layer_index):
+        layer_index_clipped = np.clip(layer_index, 0, nlay-1)
+        z_bot = np.take_along_axis(zw_filled, layer_index_clipped, axis=-1)
+        z_top = np.take_along_axis(zw_filled, layer_index_clipped+1, axis=-1)
+        bool_valid = (layer_index >= 0) & (layer_index < nlay) & np.isfinite(z_bot) & np.isfinite(z_top)
+        return bool_valid & (z_bot <= depths) & (z_top >= depths)
+    
+    # depths on the top interface are in the layer below this interface
+    layer_index = np.where(bool_layer_contains(layer_index), layer_index,
+                           np.where(bool_layer_contains(layer_index-1), layer_index-1, -1))
+    return layer_index
+
+
+def get_center_index_weights(zcc:np.ndarray, depths:np.ndarray):
+    """
+    Indices of the cell centers below and above each depth for center zvalues with shape (..., nlayers)
+    and the weight of the upper center for linear interpolation. Above the highest and below the lowest
+    cell center the value of the nearest cell center is used.
+    """
+    nlay = zcc.shape[-1]
+    zcc_filled = fill_nan_interfaces(zcc)
+    center_index = searchsorted_lastaxis(zcc_filled, depths) - 1
+    index_bot = np.clip(center_index, 0, nlay-1)
+    index_top = np.clip(center_index+1, 0, nlay-1)
+    z_bot = np.take_along_axis(zcc_filled, index_bot, axis=-1)
+    z_top = np.take_along_axis(zcc_filled, index_top, axis=-1)
+    # use the nearest valid center if one of the centers is below bed or above waterlevel
+    index_bot = np.where(np.isneginf(z_bot), index_top, index_bot)
+    index_top = np.where(np.isposinf(z_top), index_bot, index_top)
+    z_bot = np.take_along_axis(zcc_filled, index_bot, axis=-1)
+    z_top = np.take_along_axis(zcc_filled, index_top, axis=-1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        weight_top = np.where(index_top != index_bot, (depths - z_bot) / (z_top - z_bot), 0)
+    weight_top = np.clip(weight_top, 0, 1)
+    return index_bot, index_top, weight_top
+
+
+def take_layers(values:np.ndarray, layer_index:np.ndarray) -> np.ndarray:
+    """
+    Gather values with shape (..., nlayers) at layer_index with shape (..., ndepths), nan for layer_index -1.
+    """
+    values_atdepths = np.take_along_axis(values, np.clip(layer_index, 0, None), axis=-1)
+    values_atdepths = np.where(layer_index >= 0, values_atdepths, np.nan)
+    return values_atdepths
+
+
+def take_layers_linear(values:np.ndarray, layer_index:np.ndarray, index_bot:np.ndarray, index_top:np.ndarray, weight_top:np.ndarray) -> np.ndarray:
+    """
+    Linearly interpolate values with shape (..., nlayers) between the cell centers, nan for layer_index -1.
+    """
+    values_bot = np.take_along_axis(values, index_bot, axis=-1)
+    values_top = np.take_along_axis(values, index_top, axis=-1)
+    values_atdepths = values_bot + weight_top * (values_top - values_bot)
+    values_atdepths = np.where(layer_index >= 0, values_atdepths, np.nan)
+    return values_atdepths
+
+
+def get_Dataset_atdepths(data_xr:xu.UgridDataset, depths, reference:str ='z0', method:str = 'layer'):    
     """
     Lazily depth-slice a dataset with layers. Performance can be increased by using a subset of variables or subsetting the dataset in any dimension.
     This can be done for instance with ds.isel(time=-1) or uds.ugrid.sel(x=slice(),y=slice()) to subset a ugrid dataset in space.
-    The return dataset only contains the sliced variables.
+    The return dataset only contains the sliced variables. The layer containing each depth is derived once from the
+    interface zvalues for every time/face/depth, after which the values of all variables are gathered from these layers.
     
     Parameters
     ----------
@@ -352,9 +671,10 @@ def get_Dataset_atdepths(data_xr:xu.UgridDataset, depths, reference:str ='z0'):
         int/float or list/array of int/float. Depths w.r.t. reference level. If reference=='waterlevel', depth>0 returns only nans. If reference=='bedlevel', depth<0 returns only nans. Depths are sorted and only uniques are kept.
     reference : str, optional
         compute depth w.r.t. z0/waterlevel/bed. The default is 'z0'.
-    zlayer_z0_selnearest : bool, optional
-        Use xr.interp() to interpolate zlayer model to z-value. Only possible for reference='z' (not 'waterlevel' or 'bedlevel'). Only used if "mesh2d_layer_z" is present (zlayer model)
-        This is faster but results in values interpolated between zcc (z cell centers), so it is different than slicing.. The default is False.
+    method : str, optional
+        'layer' returns the value of the layer that contains the depth. 'linear' interpolates linearly
+        between the cell center zvalues (zcc), with the value of the nearest cell center above the highest
+        or below the lowest cell center. Depths outside of the watercolumn result in nan values for both methods. The default is 'layer'.
 
     Raises
     ------
@@ -375,12 +695,14 @@ def get_Dataset_atdepths(data_xr:xu.UgridDataset, depths, reference:str ='z0'):
     if dimn_layer is not None: #D-FlowFM mapfile
         gridname = data_xr.grid.name
         varname_zint = f'{gridname}_flowelem_zw'
+        varname_zcen = f'{gridname}_flowelem_zcc'
         dimname_layc = dimn_layer
         dimname_layw = dimn_interfaces
         varname_wl = f'{gridname}_s1'
         varname_bl = f'{gridname}_flowelem_bl'
     elif 'laydim' in data_xr.dims: #D-FlowFM hisfile
         varname_zint = 'zcoordinate_w'
+        varname_zcen = 'zcoordinate_c'
         dimname_layc = 'laydim'
         dimname_layw = 'laydimw'
         varname_wl = 'waterlevel'
@@ -391,6 +713,8 @@ def get_Dataset_atdepths(data_xr:xu.UgridDataset, depths, reference:str ='z0'):
     
     if not isinstance(data_xr,(xr.Dataset,xu.UgridDataset)):
         raise TypeError(f'data_xr_map should be of type xr.Dataset, but is {type(data_xr)}')
+    if method not in ['layer', 'linear']:
+        raise ValueError(f'unknown method "{method}" (possible are layer and linear)')
     
     #create depth xr.DataArray
     if isinstance(depths,(float,int)):
@@ -408,37 +732,64 @@ def get_Dataset_atdepths(data_xr:xu.UgridDataset, depths, reference:str ='z0'):
     
     #correct reference level
     if reference=='z0':
-        zw_reference = data_xr[varname_zint]
+        z_reference = 0
     elif reference=='waterlevel':
         if varname_wl not in data_xr.variables:
             raise KeyError(f'get_Dataset_atdepths() called with reference=waterlevel, but {varname_wl} variable not present')
-        data_wl = data_xr[varname_wl]
-        zw_reference = data_xr[varname_zint] - data_wl
+        z_reference = data_xr[varname_wl]
     elif reference=='bedlevel':
         if varname_bl not in data_xr.variables:
             raise KeyError(f'get_Dataset_atdepths() called with reference=bedlevel, but {varname_bl} variable not present') #TODO: in case of zsigma/sigma it can also be -mesh2d_bldepth
-        data_bl = data_xr[varname_bl]
-        zw_reference = data_xr[varname_zint] - data_bl
+        z_reference = data_xr[varname_bl]
     else:
         raise KeyError(f'unknown reference "{reference}" (possible are z0, waterlevel and bedlevel') #TODO: make enum?
     
     print('>> subsetting data on fixed depth in fullgrid z-data: ',end='')
     dtstart = dt.datetime.now()
     
-    #get layerbool via z-interface value (zw), check which celltop-interfaces are above/on depth and which which cellbottom-interfaces are below/on depth
-    bool_topinterface_abovedepth = zw_reference.isel({dimname_layw:slice(1,None)}) >= depths_xr
-    bool_botinterface_belowdepth = zw_reference.isel({dimname_layw:slice(None,-1)}) <= depths_xr
-    bool_topbotinterface_arounddepth = bool_topinterface_abovedepth & bool_botinterface_belowdepth #this bool also automatically excludes all values below bed and above wl
-    bool_topbotinterface_arounddepth = bool_topbotinterface_arounddepth.rename({dimname_layw:dimname_layc}) #correct dimname for interfaces to centers
+    if isinstance(data_xr, xu.UgridDataset):
+        ds = data_xr.obj
+    else:
+        ds = data_xr
+    zw_reference = ds[varname_zint] - z_reference
+    
+    # temporary depth dimension in case of a single depth
+    dimn_depth = depth_vardimname
+    depths_1d = xr.DataArray(np.atleast_1d(depths), dims=dimn_depth)
+    
+    #get layer index of every depth via z-interface value (zw), this also automatically excludes all values below bed and above wl
+    gufunc_kwargs = dict(dask='parallelized', dask_gufunc_kwargs={'allow_rechunk':True})
+    layer_index = xr.apply_ufunc(get_layer_index, zw_reference, depths_1d,
+                                 input_core_dims=[[dimname_layw],[dimn_depth]],
+                                 output_core_dims=[[dimn_depth]],
+                                 output_dtypes=[int], **gufunc_kwargs)
     
     #subset variables that have no, time, face and/or layer dims, slice only variables with all three dims (and add to subset)
-    bool_dims = [x for x in bool_topbotinterface_arounddepth.dims if x!=depth_vardimname] #exclude depth_vardimname (present if multiple depths supplied), since it is not present in pre-slice variables
-    variables_toslice = [var for var in data_xr.data_vars if set(bool_dims).issubset(data_xr[var].dims)]
+    bool_dims = [x for x in layer_index.dims if x!=dimn_depth] + [dimname_layc] #exclude depth_vardimname, since it is not present in pre-slice variables
+    variables_toslice = [var for var in ds.data_vars if set(bool_dims).issubset(ds[var].dims)]
+    ds_toslice = ds[variables_toslice]
     
-    #actual slicing with .where().max()
-    ds_atdepths = data_xr[variables_toslice].where(bool_topbotinterface_arounddepth).max(dim=dimname_layc,keep_attrs=True) #set all layers but one to nan, followed by an arbitrary reduce (max in this case) #TODO: check if attributes should be passed/altered
-    #TODO: suppress warning (upon plotting/load/etc): "C:\Users\veenstra\Anaconda3\envs\dfm_tools_env\lib\site-packages\dask\array\reductions.py:640: RuntimeWarning: All-NaN slice encountered" >> already merged in xarray: https://github.com/dask/dask/pull/9916
+    #actual slicing by gathering the values from the layer index
+    if method == 'layer':
+        ds_atdepths = xr.apply_ufunc(take_layers, ds_toslice, layer_index,
+                                     input_core_dims=[[dimname_layc],[dimn_depth]],
+                                     output_core_dims=[[dimn_depth]],
+                                     output_dtypes=[float], keep_attrs=True, **gufunc_kwargs)
+    else:
+        zcc_reference = ds[varname_zcen] - z_reference
+        index_bot, index_top, weight_top = xr.apply_ufunc(get_center_index_weights, zcc_reference, depths_1d,
+                                                          input_core_dims=[[dimname_layc],[dimn_depth]],
+                                                          output_core_dims=[[dimn_depth],[dimn_depth],[dimn_depth]],
+                                                          output_dtypes=[int,int,float], **gufunc_kwargs)
+        ds_atdepths = xr.apply_ufunc(take_layers_linear, ds_toslice, layer_index, index_bot, index_top, weight_top,
+                                     input_core_dims=[[dimname_layc]] + [[dimn_depth]]*4,
+                                     output_core_dims=[[dimn_depth]],
+                                     output_dtypes=[float], keep_attrs=True, **gufunc_kwargs)
+    if depth_dims == ():
+        ds_atdepths = ds_atdepths.isel({dimn_depth:0})
     ds_atdepths = ds_atdepths.drop_dims([dimname_layw,dimname_layc],errors='ignore') #dropping interface dim if it exists, since it does not correspond to new depths dim
+    if isinstance(data_xr, xu.UgridDataset):
+        ds_atdepths = xu.UgridDataset(ds_atdepths, grids=data_xr.grids)
     
     #add depth as coordinate var
     ds_atdepths[depth_vardimname] = depths_xr
@@ -449,10 +800,243 @@ def get_Dataset_atdepths(data_xr:xu.UgridDataset, depths, reference:str ='z0'):
     return ds_atdepths
 
 
-def rasterize_ugrid(uds:xu.UgridDataset, ds_like:xr.Dataset = None, resolution:float = None):
+RASTERIZE_METHODS = ['sample', 'conservative']
+
+
+def get_bounds_from_centers(centers:np.ndarray) -> np.ndarray:
+    """
+    Derive the cell bounds with shape (n, 2) from monotonic cell centers, halfway between the centers
+    and extended with half a cell at both ends.
+    """
+    if len(centers) == 1:
+        raise ValueError("at least two raster cell centers are required to derive the cell bounds")
+    edges_inner = (centers[1:] + centers[:-1]) / 2
+    edge_first = centers[0] - (edges_inner[0] - centers[0])
+    edge_last = centers[-1] + (centers[-1] - edges_inner[-1])
+    edges = np.concatenate([[edge_first], edges_inner, [edge_last]])
+    bounds = np.column_stack([edges[:-1], edges[1:]])
+    return bounds
+
+
+def get_raster_polygons(x:np.ndarray, y:np.ndarray):
+    """
+    Vertices and counterclockwise face_node_connectivity of the raster cells (row-major, so y then x),
+    to intersect with the faces of a grid.
+    """
+    x_bounds = np.sort(get_bounds_from_centers(x), axis=1)
+    y_bounds = np.sort(get_bounds_from_centers(y), axis=1)
+    xlo, ylo = np.meshgrid(x_bounds[:,0], y_bounds[:,0])
+    xhi, yhi = np.meshgrid(x_bounds[:,1], y_bounds[:,1])
+    vertices_x = np.stack([xlo, xhi, xhi, xlo], axis=-1).ravel()
+    vertices_y = np.stack([ylo, ylo, yhi, yhi], axis=-1).ravel()
+    vertices = np.column_stack([vertices_x, vertices_y])
+    faces = np.arange(len(vertices)).reshape(-1, 4)
+    return vertices, faces
+
+
+class Rasterizer:
+    """
+    Precomputed raster cell to face mapping of a grid, to rasterize ugrid data of many timesteps and/or
+    variables with the same grid and raster, without locating the raster cells in the grid again.
+    
+    With method='sample', the value of the face under the center of each raster cell is used. Rasterizing
+    is then a gather of the face values, which is applied lazily per chunk. With method='conservative', the
+    overlap areas of the faces and the raster cells are stored in a sparse weight matrix and each raster
+    cell gets the area-weighted mean of all overlapping (non-nan) faces. This avoids aliasing when the
+    raster is coarser than the grid. The overlap areas are computed in the x/y coordinates of the grid.
+    
+    The mapping can be saved with to_netcdf() and loaded with Rasterizer.from_netcdf().
+    
+    Examples
+    --------
+    >>> rasterizer = dfmt.Rasterizer(uds.grid, resolution=100)
+    >>> ds = rasterizer.rasterize(uds['mesh2d_s1'])
+    >>> rasterizer.to_netcdf('raster_index.nc')
+    """
+    def __init__(self, grid:xu.Ugrid2d, ds_like:xr.Dataset = None, resolution:float = None, face_locator:FaceLocator = None, method:str = 'sample'):
+        """
+        Locate the raster cells in the grid. ds_like has higher priority than `resolution`.
+        If both are not passed, a raster is generated of at least 200x200.
+
+        Parameters
+        ----------
+        grid : xu.Ugrid2d
+            The grid of the data to rasterize.
+        ds_like : xr.Dataset, optional
+            xr.Dataset with x and y variables to interpolate uds to. The default is None.
+        resolution : float, optional
+            Only used if ds_like is not supplied. The default is None.
+        face_locator : FaceLocator, optional
+            Reusable spatial index of the grid, retrieved with dfmt.get_face_locator(grid) if not provided. The default is None.
+        method : str, optional
+            'sample' for the face under the raster cell centers or 'conservative' for the area-weighted mean
+            of the faces overlapping the raster cells. The default is 'sample'.
+
+        Raises
+        ------
+        ValueError
+            If an unknown method is provided.
+
+        """
+        if method not in RASTERIZE_METHODS:
+            raise ValueError(f"unknown method '{method}', options are {RASTERIZE_METHODS}")
+        
+        if ds_like is None:
+            xmin, ymin, xmax, ymax = grid.bounds
+            dx = xmax - xmin
+            dy = ymax - ymin
+            if resolution is None: # check if a rasterization resolution is passed, otherwise default to 200 raster cells otherwise for the smallest axis.
+                resolution = min(dx, dy) / 200
+            d = abs(resolution)
+            x = np.arange(xmin + 0.5 * d, xmax, d)
+            y = np.arange(ymin + 0.5 * d, ymax, d)
+        else:
+            x = ds_like['x'].to_numpy()
+            y = ds_like['y'].to_numpy()
+        
+        if face_locator is None:
+            face_locator = get_face_locator(grid)
+        face_locator.check_grid(grid)
+        
+        self.method = method
+        self.x = x
+        self.y = y
+        self.grid_key = face_locator.key
+        self.n_face = grid.n_face
+        self.face_index = None
+        self.weights = None
+        if method == 'sample':
+            yy, xx = np.meshgrid(y, x, indexing="ij")
+            xy = np.column_stack([xx.ravel(), yy.ravel()])
+            self.face_index = face_locator.celltree.locate_points(xy).reshape((y.size, x.size))
+        else:
+            vertices, faces = get_raster_polygons(x, y)
+            cell_index, face_index, overlap_area = face_locator.celltree.intersect_faces(vertices=vertices, faces=faces, fill_value=-1)
+            self.weights = scipy.sparse.csr_matrix((overlap_area, (cell_index, face_index)),
+                                                   shape=(y.size * x.size, grid.n_face))
+    
+    @property
+    def shape(self):
+        return (len(self.y), len(self.x))
+    
+    def rasterize(self, uds:xu.UgridDataset) -> xr.Dataset:
+        """
+        Rasterize the face variables of a ugrid dataset or dataarray with the precomputed face index or weights.
+        Raster cells outside of the grid are nan. For method='sample' this is equal to uds.ugrid.rasterize_like().
+        """
+        if isinstance(uds,(xu.core.wrap.UgridDataset,xu.core.wrap.UgridDataArray)):
+            grid = uds.grid
+        else:
+            raise TypeError(f'Rasterizer.rasterize expected xu.core.wrap.UgridDataset or xu.core.wrap.UgridDataArray, got {type(uds)} instead')
+        if grid.n_face != self.n_face:
+            raise ValueError(f"the grid has {grid.n_face} faces, but the Rasterizer was created for a grid with {self.n_face} faces")
+        
+        obj = uds.obj
+        dimn_face = grid.face_dimension
+        if self.method == 'sample':
+            rasterize_variable = self._take_faces
+        else:
+            rasterize_variable = self._regrid_faces
+        if isinstance(obj, xr.DataArray):
+            data = rasterize_variable(obj.variable, dimn_face)
+            coords = {varn: rasterize_variable(coord.variable, dimn_face) for varn, coord in obj.coords.items()}
+            obj_raster = xr.DataArray(data, coords=coords, name=obj.name, attrs=obj.attrs)
+        else:
+            data_vars = {varn: rasterize_variable(var.variable, dimn_face) for varn, var in obj.data_vars.items()}
+            coords = {varn: rasterize_variable(coord.variable, dimn_face) for varn, coord in obj.coords.items()}
+            obj_raster = xr.Dataset(data_vars, coords=coords, attrs=obj.attrs)
+        ds = obj_raster.assign_coords(y=self.y, x=self.x)
+        if self.method == 'sample':
+            indexer = xr.DataArray(data=self.face_index,
+                                   coords={"y": self.y, "x": self.x},
+                                   dims=["y", "x"])
+            ds = ds.where(indexer != -1)
+        return ds
+    
+    def _take_faces(self, var:xr.Variable, dimn_face:str) -> xr.Variable:
+        """
+        Gather the face values of all raster cells by replacing the face dimension by the y/x dimensions.
+        Equal to var.isel({dimn_face:indexer}) but for dask arrays it is applied per chunk with np.take,
+        which is much faster than dask fancy indexing. The face dimension is rechunked to a single chunk.
+        """
+        if dimn_face not in var.dims:
+            return var
+        axis = var.dims.index(dimn_face)
+        dims = var.dims[:axis] + ('y', 'x') + var.dims[axis+1:]
+        data = var.data
+        if isinstance(data, dask.array.Array):
+            data = data.rechunk({axis:-1})
+            chunks = data.chunks[:axis] + ((len(self.y),), (len(self.x),)) + data.chunks[axis+1:]
+            data = data.map_blocks(np.take, self.face_index, axis=axis, new_axis=axis+1,
+                                   chunks=chunks, dtype=data.dtype)
+        else:
+            data = np.take(data, self.face_index, axis=axis)
+        return xr.Variable(dims, data, attrs=var.attrs, encoding=var.encoding)
+    
+    def _regrid_faces(self, var:xr.Variable, dimn_face:str) -> xr.Variable:
+        """
+        Area-weighted mean of the faces overlapping each raster cell, by replacing the face dimension
+        by the y/x dimensions. For dask arrays it is applied per chunk, so the face dimension is not rechunked.
+        """
+        if dimn_face not in var.dims:
+            return var
+        dims_other = tuple(dimn for dimn in var.dims if dimn != dimn_face)
+        var_facelast = var.transpose(*dims_other, dimn_face)
+        data = sparse_weighted_mean(var_facelast.data, self.weights)
+        data = data.reshape(data.shape[:-1] + self.shape)
+        var_raster = xr.Variable(dims_other + ('y', 'x'), data, attrs=var.attrs)
+        axis = var.dims.index(dimn_face)
+        dims = var.dims[:axis] + ('y', 'x') + var.dims[axis+1:]
+        return var_raster.transpose(*dims)
+    
+    def to_netcdf(self, file_nc:str):
+        """
+        Save the raster coordinates and face index or weights to a netcdf file.
+        """
+        attrs = {'grid_key': self.grid_key, 'n_face': self.n_face, 'method': self.method}
+        if self.method == 'sample':
+            data_vars = {'face_index': (('y','x'), self.face_index)}
+        else:
+            weights_coo = self.weights.tocoo()
+            data_vars = {'weights_cell_index': ('nweights', weights_coo.row),
+                         'weights_face_index': ('nweights', weights_coo.col),
+                         'weights_area': ('nweights', weights_coo.data)}
+        ds_index = xr.Dataset(data_vars, coords={'y': self.y, 'x': self.x}, attrs=attrs)
+        ds_index.to_netcdf(file_nc)
+    
+    @classmethod
+    def from_netcdf(cls, file_nc:str, grid:xu.Ugrid2d = None):
+        """
+        Load a Rasterizer that was saved with to_netcdf(). If grid is provided, it is checked whether its
+        topology is equal to the topology of the grid the Rasterizer was created for.
+        """
+        with xr.open_dataset(file_nc) as ds_index:
+            ds_index = ds_index.load()
+        rasterizer = cls.__new__(cls)
+        rasterizer.method = ds_index.attrs.get('method', 'sample')
+        rasterizer.x = ds_index['x'].to_numpy()
+        rasterizer.y = ds_index['y'].to_numpy()
+        rasterizer.grid_key = ds_index.attrs['grid_key']
+        rasterizer.n_face = int(ds_index.attrs['n_face'])
+        rasterizer.face_index = None
+        rasterizer.weights = None
+        if rasterizer.method == 'sample':
+            rasterizer.face_index = ds_index['face_index'].to_numpy()
+        else:
+            weights_data = (ds_index['weights_area'].to_numpy(),
+                            (ds_index['weights_cell_index'].to_numpy(), ds_index['weights_face_index'].to_numpy()))
+            rasterizer.weights = scipy.sparse.csr_matrix(weights_data, shape=(ds_index.sizes['y'] * ds_index.sizes['x'], rasterizer.n_face))
+        if grid is not None and get_grid_key(grid) != rasterizer.grid_key:
+            raise ValueError(f"the topology of the grid does not match the topology of the Rasterizer in {file_nc}")
+        return rasterizer
+
+
+def rasterize_ugrid(uds:xu.UgridDataset, ds_like:xr.Dataset = None, resolution:float = None, face_locator:FaceLocator = None, rasterizer:Rasterizer = None, method:str = 'sample'):
     """
     Rasterizing ugrid dataset to regular dataset. ds_like has higher priority than `resolution`. If both are not passed, a raster is generated of at least 200x200
     inspired by xugrid.plot.imshow and xugrid.ugrid.ugrid2d.rasterize/rasterize_like.
+    To rasterize many timesteps or variables separately, create a dfmt.Rasterizer once and pass it
+    as rasterizer argument (or use Rasterizer.rasterize) so the raster cells are only located once.
     
     Parameters
     ----------
@@ -462,6 +1046,14 @@ def rasterize_ugrid(uds:xu.UgridDataset, ds_like:xr.Dataset = None, resolution:f
         xr.Dataset with ed x and y variables to interpolate uds to. The default is None.
     resolution : float, optional
         Only used if ds_like is not supplied. The default is None.
+    face_locator : FaceLocator, optional
+        Reusable spatial index of the grid, retrieved with dfmt.get_face_locator(uds.grid) if not provided. The default is None.
+    rasterizer : Rasterizer, optional
+        Precomputed raster cell to face index, ds_like/resolution/face_locator/method are ignored if it is provided. The default is None.
+    method : str, optional
+        'sample' for the face under the raster cell centers or 'conservative' for the area-weighted mean
+        of the faces overlapping the raster cells, which is recommended if the raster is coarser than the grid.
+        The default is 'sample'.
     
     Raises
     ------
@@ -484,22 +1076,103 @@ def rasterize_ugrid(uds:xu.UgridDataset, ds_like:xr.Dataset = None, resolution:f
     else:
         raise TypeError(f'rasterize_ugrid expected xu.core.wrap.UgridDataset or xu.core.wrap.UgridDataArray, got {type(uds)} instead')
     
-    if ds_like is None:
-        xmin, ymin, xmax, ymax = uds.grid.bounds
-        dx = xmax - xmin
-        dy = ymax - ymin
-        if resolution is None: # check if a rasterization resolution is passed, otherwise default to 200 raster cells otherwise for the smallest axis.
-            resolution = min(dx, dy) / 200
-        d = abs(resolution)
-        regx = np.arange(xmin + 0.5 * d, xmax, d)
-        regy = np.arange(ymin + 0.5 * d, ymax, d)
-        ds_like = xr.DataArray(np.empty((len(regy), len(regx))), {"y": regy, "x": regx}, ["y", "x"])
-    
-    print(f'>> rasterizing ugrid {face_str} to shape=({len(ds_like.y)},{len(ds_like.x)}): ',end='')
     dtstart = dt.datetime.now()
-    ds = uds.ugrid.rasterize_like(other=ds_like)
+    if rasterizer is None:
+        rasterizer = Rasterizer(uds.grid, ds_like=ds_like, resolution=resolution, face_locator=face_locator, method=method)
+    
+    print(f'>> rasterizing ugrid {face_str} to shape=({len(rasterizer.y)},{len(rasterizer.x)}): ',end='')
+    ds = rasterizer.rasterize(uds)
+    print(f'{(dt.datetime.now()-dtstart).total_seconds():.2f} sec')
+    
+    return ds
+
+
+def extract_timeseries_at_points(uds:xu.UgridDataset, gdf:geopandas.GeoDataFrame, dimn_point:str = 'point', load:bool = True, face_locator:FaceLocator = None) -> xr.Dataset:
+    """
+    Extract timeseries of all face variables of a mapfile at point locations.
+    The faces containing the points are located once with the celltree of the grid and every face is
+    selected only once, also if it contains multiple points. All variables are then read in a single
+    dask computation instead of per point and per variable. The selected faces are rechunked to a single
+    chunk along time. Open the mapfile with access_pattern='timeseries' (or large time chunks) to read
+    the data in large blocks along time, a warning is printed if the data is chunked along time.
+    
+    Parameters
+    ----------
+    uds : xu.UgridDataset
+        dfm model output read using dfm_tools.
+    gdf : geopandas.GeoDataFrame
+        gdf with Point geometries in the crs of the model. All other columns are added as coordinates.
+    dimn_point : str, optional
+        Name of the point dimension of the resulting dataset. The default is 'point'.
+    load : bool, optional
+        Load the timeseries into memory. The default is True.
+    face_locator : FaceLocator, optional
+        Reusable spatial index of the grid, retrieved with dfmt.get_face_locator(uds.grid) if not provided. The default is None.
+
+    Raises
+    ------
+    ValueError
+        If none of the points are located inside the grid.
+
+    Returns
+    -------
+    ds : xr.Dataset
+        Dataset with dims (point, time, layer). Points outside of the grid contain nan values.
+
+    """
+    grid = uds.grid
+    facedim = grid.face_dimension
+    
+    print(f'>> locating {len(gdf)} points in grid: ',end='')
+    dtstart = dt.datetime.now()
+    xy = np.column_stack([gdf.geometry.x, gdf.geometry.y])
+    if face_locator is None:
+        face_locator = get_face_locator(grid)
+    face_index = face_locator.locate_points(xy)
+    bool_inside = face_index != -1
     print(f'{(dt.datetime.now()-dtstart).total_seconds():.2f} sec')
+    if not bool_inside.any():
+        raise ValueError("none of the points are located inside the grid")
+    if not bool_inside.all():
+        print(f"WARNING: {(~bool_inside).sum()} points are located outside of the grid, these will contain nan values")
+    
+    # select every face only once and read all variables at once
+    face_unique, point_to_unique = np.unique(face_index[bool_inside], return_inverse=True)
+    ds_face = Dataset_varswithdim(uds.obj, facedim)
+    ds_unique = ds_face.isel({facedim:face_unique})
+    
+    # the timeseries of the selected faces are small, so combine them in one chunk along time
+    ntime_chunks = 1
+    for varn, var in ds_unique.data_vars.items():
+        if 'time' not in var.dims or not isinstance(var.data, dask.array.Array):
+            continue
+        ntime_chunks = max(ntime_chunks, len(var.chunksizes['time']))
+        ds_unique[varn] = var.chunk({'time':-1})
+    if ntime_chunks > 1:
+        print(f"WARNING: the data is read in {ntime_chunks} chunks along time, open the mapfile with access_pattern='timeseries' to read the timeseries in large blocks")
+    
+    if load:
+        print(f'>> loading {len(ds_unique.data_vars)} variables at {len(face_unique)} faces: ',end='')
+        dtstart = dt.datetime.now()
+        ds_unique = ds_unique.load()
+        print(f'{(dt.datetime.now()-dtstart).total_seconds():.2f} sec')
+    
+    # map the faces back to the points
+    point_index = np.zeros(len(xy), dtype=int)
+    point_index[bool_inside] = point_to_unique
+    ds = ds_unique.isel({facedim:xr.DataArray(point_index, dims=dimn_point)})
+    ds = ds.drop_vars(facedim, errors='ignore')
+    if not bool_inside.all():
+        ds = ds.where(xr.DataArray(bool_inside, dims=dimn_point))
     
+    # add point coordinates and other gdf columns
+    ds = ds.assign_coords({f'{grid.name}_x':(dimn_point, xy[:,0]),
+                           f'{grid.name}_y':(dimn_point, xy[:,1]),
+                           f'{grid.name}_face_index':(dimn_point, face_index)})
+    for colname in gdf.columns:
+        if colname != gdf.geometry.name:
+            ds = ds.assign_coords({colname:(dimn_point, gdf[colname].to_numpy())})
+    ds = ds.transpose(dimn_point, 'time', ..., missing_dims='ignore')
     return ds
 
 
@@ -1,3 +1,4 @@
+import hashlib
 import pandas as pd
 import cftime
 import numpy as np
@@ -64,6 +65,54 @@ def get_ncbnd_construct():
     return ncbnd_construct
 
 
+TIME_RELATIVE_CACHE = {}
+TIME_RELATIVE_CACHE_MAXSIZE = 4
+
+
+def get_time_relative(da_time:xr.DataArray) -> np.ndarray:
+    """
+    Times relative to the units in the encoding of da_time, like 'minutes since 2020-01-01'.
+    It is cached on the times and units, so it is only computed once for all points of a plipointsDataset.
+    """
+    refdate_str = da_time.encoding['units']
+    time_np = da_time.to_numpy()
+    key = (refdate_str, time_np.dtype.str, hashlib.sha1(np.ascontiguousarray(time_np).tobytes()).hexdigest())
+    if key not in TIME_RELATIVE_CACHE:
+        if len(TIME_RELATIVE_CACHE) >= TIME_RELATIVE_CACHE_MAXSIZE:
+            # remove the oldest times to limit memory usage
+            TIME_RELATIVE_CACHE.pop(next(iter(TIME_RELATIVE_CACHE)))
+        TIME_RELATIVE_CACHE[key] = date2num(pd.DatetimeIndex(time_np).to_pydatetime(),units=refdate_str,calendar='standard')
+    return TIME_RELATIVE_CACHE[key]
+
+
+def set_datablock(forcing_object, datablock_np:np.ndarray):
+    """
+    Return the hydrolib forcing object with the datablock set from a numpy array. Validating the datablock
+    with pydantic checks each value separately, which dominates the conversion time for long timeseries.
+    For numeric arrays, the datablock is therefore validated with numpy (2D shape, number of columns
+    compared to the quantityunitpairs and no NaN values) and set with copy(update=...) of the (pydantic.v1)
+    model, which does not validate. Other arrays are assigned with validation by hydrolib.
+    """
+    datablock_np = np.asarray(datablock_np)
+    if datablock_np.dtype.kind not in 'fiu':
+        # validated assignment, since validate_assignment is enabled for hydrolib models
+        forcing_object.datablock = datablock_np.tolist()
+        return forcing_object
+    
+    # the same checks as the hydrolib validation, but on the entire array at once
+    if datablock_np.ndim != 2:
+        raise ValueError(f"datablock should be 2D, but has {datablock_np.ndim} dimensions")
+    ncolumns = sum(len(qup.quantityunitpair) if isinstance(qup, hcdfm.VectorQuantityUnitPairs) else 1
+                   for qup in forcing_object.quantityunitpair)
+    if datablock_np.shape[1] != ncolumns:
+        raise ValueError(f"datablock has {datablock_np.shape[1]} columns, but {ncolumns} columns are expected from the quantityunitpairs")
+    if np.isnan(datablock_np).any():
+        raise ValueError("NaN is not supported in datablocks.")
+    datablock = datablock_np.astype(np.float64).tolist()
+    forcing_object = forcing_object.copy(update={'datablock':datablock})
+    return forcing_object
+
+
 def Dataset_to_T3D(datablock_xr):
     """
     convert an xarray.DataArray (is one data_var) or an xarray.Dataset (with one or two data_vars) with time and depth dimension to a hydrolib T3D object
@@ -113,7 +162,7 @@ def Dataset_to_T3D(datablock_xr):
     else:
         datablock_np = data_xr_var0.to_numpy()
     
-    timevar_sel_rel = date2num(pd.DatetimeIndex(data_xr_var0.time.to_numpy()).to_pydatetime(),units=refdate_str,calendar='standard')
+    timevar_sel_rel = get_time_relative(data_xr_var0.time)
     datablock_incltime = np.concatenate([timevar_sel_rel[:,np.newaxis],datablock_np],axis=1)
     
     # Each .bc file can contain 1 or more timeseries, in this case one for each support point
@@ -136,8 +185,8 @@ def Dataset_to_T3D(datablock_xr):
                            vertPositionType='ZDatum',
                            quantityunitpair=quantityunitpair,
                            timeinterpolation='linear',
-                           datablock=datablock_incltime.tolist(),
                            )
+    T3D_object = set_datablock(T3D_object, datablock_incltime)
     
     return T3D_object
 
@@ -166,7 +215,7 @@ def Dataset_to_TimeSeries(datablock_xr):
     
     #get datablock and concatenate with relative time data
     datablock_np = datablock_xr.to_numpy()[:,np.newaxis]
-    timevar_sel_rel = date2num(pd.DatetimeIndex(datablock_xr.time.to_numpy()).to_pydatetime(),units=refdate_str,calendar='standard')
+    timevar_sel_rel = get_time_relative(datablock_xr.time)
     datablock_incltime = np.concatenate([timevar_sel_rel[:,np.newaxis],datablock_np],axis=1)
     
     # Each .bc file can contain 1 or more timeseries, in this case one for each support point
@@ -174,8 +223,8 @@ def Dataset_to_TimeSeries(datablock_xr):
                                          quantityunitpair=[hcdfm.QuantityUnitPair(quantity="time", unit=refdate_str),
                                                            hcdfm.QuantityUnitPair(quantity=bcvarname, unit=datablock_xr.attrs['units'])],
                                          timeinterpolation='linear', #TODO: make userdefined via attrs?
-                                         datablock=datablock_incltime.tolist(), 
                                          )
+    TimeSeries_object = set_datablock(TimeSeries_object, datablock_incltime)
     return TimeSeries_object
 
 
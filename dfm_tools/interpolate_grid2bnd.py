@@ -1,5 +1,7 @@
 import os
 import glob
+import hashlib
+import threading
 import datetime as dt
 import numpy as np
 import pandas as pd
@@ -8,6 +10,7 @@ import xugrid as xu
 from pathlib import Path
 from scipy.spatial import KDTree
 import logging
+import warnings
 import hydrolib.core.dflowfm as hcdfm
 import geopandas
 
@@ -20,11 +23,15 @@ from dfm_tools.hydrolib_helpers import (Dataset_to_TimeSeries,
                                         maybe_convert_fews_to_dfmt,
                                         validate_polyline_names)
 from dfm_tools.errors import OutOfRangeError
+from dfm_tools.chunking import get_chunks
+from dfm_tools.xugrid_helpers import get_face_locator, FaceLocator
 
 __all__ = ["get_conversion_dict",
            "interpolate_tide_to_bc",
            "interpolate_tide_to_plipoints",
            "interp_regularnc_to_plipointsDataset",
+           "PlipointsInterpolator",
+           "get_plipoints_interpolator",
            "interp_uds_to_plipoints",
            "interp_hisnc_to_plipoints",
            "plipointsDataset_to_ForcingModel",
@@ -373,7 +380,10 @@ def open_prepare_dataset(dir_pattern, quantity, tstart, tstop, conversion_dict=N
     file_list_nc = glob.glob(str(dir_pattern))
     print(f'loading mfdataset of {len(file_list_nc)} files with pattern(s) {dir_pattern}')
     
-    data_xr = xr.open_mfdataset(file_list_nc, chunks=chunks, join="exact") #TODO: does chunks argument solve "PerformanceWarning: Slicing is producing a large chunk."? {'time':1} is not a convenient chunking to use for timeseries extraction
+    if chunks is None and len(file_list_nc) > 0:
+        # chunks for extraction of timeseries at boundary points
+        chunks = get_chunks(file_list_nc[0], access_pattern='timeseries')
+    data_xr = xr.open_mfdataset(file_list_nc, chunks=chunks, join="exact")
     
     data_xr = ds_apply_conventions(data_xr=data_xr)
     data_xr = ds_apply_conversion_dict(data_xr=data_xr, conversion_dict=conversion_dict, quantity=quantity)
@@ -397,52 +407,294 @@ def open_prepare_dataset(dir_pattern, quantity, tstart, tstop, conversion_dict=N
     return data_xr_vars
 
 
-def interp_regularnc_to_plipointsDataset(data_xr_reg, gdf_points, load=True):
+def _get_interp_stencil_1d(grid_vals:np.ndarray, vals:np.ndarray):
+    """
+    Get the indices of the two grid values surrounding each value, the linear weight of the second one
+    and the index of the nearest grid value. This is the same stencil as used by scipy.interpolate.interpn(),
+    so also for values exactly on a grid value the previous grid value is part of the stencil (with zero weight).
+    The grid values should be strictly ascending or descending.
+    """
+    n_grid = len(grid_vals)
+    is_descending = grid_vals[0] > grid_vals[-1]
+    if is_descending:
+        grid_vals = grid_vals[::-1]
+    index_0 = np.clip(np.searchsorted(grid_vals, vals) - 1, 0, n_grid - 2)
+    index_1 = index_0 + 1
+    weight_1 = (vals - grid_vals[index_0]) / (grid_vals[index_1] - grid_vals[index_0])
+    if is_descending:
+        index_0, index_1 = n_grid - 1 - index_0, n_grid - 1 - index_1
+    return index_0, index_1, weight_1
+
+
+def _interp_stencil_block(values:np.ndarray, lat_index:np.ndarray, lon_index:np.ndarray, weights:np.ndarray, nearest_corner:np.ndarray) -> np.ndarray:
+    """
+    Bilinear interpolation of the last two (latitude, longitude) axes of values to points, with the indices
+    and weights of the four stencil corners per point. If one of the corners is nan (also with zero weight,
+    like scipy.interpolate.interpn()), the value of the nearest corner is used instead.
+    """
+    corners = values[..., lat_index, lon_index]
+    data_lin = (corners * weights).sum(axis=-1)
+    data_near = corners[..., np.arange(len(nearest_corner)), nearest_corner]
+    return np.where(np.isnan(data_lin), data_near, data_lin)
+
+
+def get_regulargrid_key(data_xr_reg:xr.Dataset) -> str:
+    """
+    Hash of the longitude and latitude values, which identifies a regular grid.
+    """
+    sha = hashlib.sha1()
+    for varn in ['longitude','latitude']:
+        sha.update(np.ascontiguousarray(data_xr_reg[varn].to_numpy(), dtype=np.float64).tobytes())
+    return sha.hexdigest()
+
+
+def get_plipoints_key(gdf_points:geopandas.GeoDataFrame) -> str:
+    """
+    Hash of the coordinates and names of the points.
+    """
+    varn_pointname = get_ncbnd_construct()['varn_pointname']
+    sha = hashlib.sha1()
+    sha.update(np.ascontiguousarray(gdf_points.geometry.x.to_numpy(), dtype=np.float64).tobytes())
+    sha.update(np.ascontiguousarray(gdf_points.geometry.y.to_numpy(), dtype=np.float64).tobytes())
+    sha.update('\n'.join(gdf_points[varn_pointname].astype(str)).encode())
+    return sha.hexdigest()
+
+
+class PlipointsInterpolator:
+    """
+    Precomputed bilinear interpolation weights from a regular dataset with latitude/longitude
+    dimensions (like CMEMS) to boundary points, to interpolate many quantities and/or datasets on
+    the same grid without deriving the stencils again. The indices and weights of the four corners
+    of each point are stored, so interpolating is a gather of only the grid cells in the stencils.
+    The values are linearly interpolated, with a fallback to the nearest corner for points with nan
+    values in the stencil (like near land).
+    
+    The weights can be saved with to_netcdf() and loaded with PlipointsInterpolator.from_netcdf(),
+    to reuse them for instance in daily operational runs. Use dfmt.get_plipoints_interpolator()
+    to get a cached PlipointsInterpolator for a grid and points.
+    
+    Examples
+    --------
+    >>> interpolator = dfmt.PlipointsInterpolator(data_xr_reg, gdf_points)
+    >>> data_interp = interpolator.interpolate(data_xr_reg).load()
+    >>> interpolator.to_netcdf('plipoints_weights.nc')
+    """
+    def __init__(self, data_xr_reg:xr.Dataset, gdf_points:geopandas.GeoDataFrame):
+        """
+        Derive the bilinear stencils of the points in the grid of data_xr_reg.
+
+        Parameters
+        ----------
+        data_xr_reg : xr.Dataset
+            Regular dataset with latitude/longitude dimensions and variables, only these are used.
+        gdf_points : geopandas.GeoDataFrame
+            gdf with point geometries and point names.
+
+        Raises
+        ------
+        ValueError
+            If points are outside of the latitude/longitude range of the grid.
+
+        """
+        ncbnd_construct = get_ncbnd_construct()
+        varn_pointx = ncbnd_construct['varn_pointx']
+        varn_pointy = ncbnd_construct['varn_pointy']
+        
+        da_plipoints = da_from_gdf_points(gdf_points)
+        
+        # generate a proper error with outofbounds requested coordinates
+        lonvar_vals = data_xr_reg['longitude'].to_numpy()
+        latvar_vals = data_xr_reg['latitude'].to_numpy()
+        point_x = da_plipoints[varn_pointx].to_numpy()
+        point_y = da_plipoints[varn_pointy].to_numpy()
+        bool_reqlon_outbounds = (point_x < lonvar_vals.min()) | (point_x > lonvar_vals.max())
+        bool_reqlat_outbounds = (point_y < latvar_vals.min()) | (point_y > latvar_vals.max())
+        if bool_reqlon_outbounds.any() or bool_reqlat_outbounds.any():
+            reqlatlon_pd = pd.DataFrame({'longitude':point_x,'latitude':point_y,'lon outbounds':bool_reqlon_outbounds,'lat outbounds':bool_reqlat_outbounds})
+            reqlatlon_pd_outbounds = reqlatlon_pd.loc[bool_reqlon_outbounds | bool_reqlat_outbounds]
+            raise ValueError(f'{len(reqlatlon_pd_outbounds)} of requested pli points are out of bounds (valid longitude range {lonvar_vals.min()} to {lonvar_vals.max()}, valid latitude range {latvar_vals.min()} to {latvar_vals.max()}):\n{reqlatlon_pd_outbounds}')
+        
+        # bilinear stencil of all points, the corners are ordered (lat0,lon0), (lat0,lon1), (lat1,lon0), (lat1,lon1)
+        lon_index_0, lon_index_1, lon_weight_1 = _get_interp_stencil_1d(lonvar_vals, point_x)
+        lat_index_0, lat_index_1, lat_weight_1 = _get_interp_stencil_1d(latvar_vals, point_y)
+        
+        self.grid_key = get_regulargrid_key(data_xr_reg)
+        self.da_plipoints = da_plipoints
+        self.lon_index = np.stack([lon_index_0, lon_index_1, lon_index_0, lon_index_1], axis=1)
+        self.lat_index = np.stack([lat_index_0, lat_index_0, lat_index_1, lat_index_1], axis=1)
+        self.weights = np.stack([(1-lat_weight_1)*(1-lon_weight_1), (1-lat_weight_1)*lon_weight_1,
+                                 lat_weight_1*(1-lon_weight_1), lat_weight_1*lon_weight_1], axis=1)
+        # nearest corner, halfway points are assigned to the first grid value like in scipy.interpolate.interpn()
+        self.nearest_corner = 2*(lat_weight_1 > 0.5) + (lon_weight_1 > 0.5)
+    
+    @property
+    def n_point(self):
+        return len(self.nearest_corner)
+    
+    @property
+    def bbox_slices(self):
+        """
+        Index slices of the bounding box of all stencils, which is the bounding box of the points padded by the stencil.
+        """
+        bbox_slices = {'longitude': slice(self.lon_index.min(), self.lon_index.max() + 1),
+                       'latitude': slice(self.lat_index.min(), self.lat_index.max() + 1)}
+        return bbox_slices
+    
+    def interpolate(self, data_xr_reg:xr.Dataset) -> xr.Dataset:
+        """
+        Lazily interpolate the variables with latitude/longitude dimensions to the points, these
+        dimensions are replaced by the point dimension. Variables without these dimensions are kept as is.
+        """
+        if get_regulargrid_key(data_xr_reg) != self.grid_key:
+            raise ValueError("the latitude/longitude values of the dataset do not match the grid of the PlipointsInterpolator")
+        dimn_point = get_ncbnd_construct()['dimn_point']
+        
+        varns_latlon = [varn for varn in data_xr_reg.data_vars if set(['latitude','longitude']).issubset(data_xr_reg[varn].dims)]
+        
+        # lazily subset the bounding box of the stencils first, this slice is passed on to the reading
+        # of the source files, so only the bounding box is read instead of the entire (global) chunks
+        bbox_slices = self.bbox_slices
+        data_xr_bbox = data_xr_reg[varns_latlon].isel(bbox_slices)
+        nbytes_available = sum(data_xr_reg[varn].variable.nbytes for varn in varns_latlon)
+        nbytes_bbox = sum(data_xr_bbox[varn].variable.nbytes for varn in varns_latlon)
+        if nbytes_available > 0:
+            print(f'> bounding box of plipoints: reading {nbytes_bbox/1024**2:.2f} of {nbytes_available/1024**2:.2f} MB available ({nbytes_bbox/nbytes_available*100:.1f}%)')
+        
+        # gather only the grid rows/columns in the stencils, so each source chunk is read once
+        lon_needed, lon_index_needed = np.unique(self.lon_index - bbox_slices['longitude'].start, return_inverse=True)
+        lat_needed, lat_index_needed = np.unique(self.lat_index - bbox_slices['latitude'].start, return_inverse=True)
+        data_xr_sel = data_xr_bbox.isel(longitude=lon_needed, latitude=lat_needed)
+        if data_xr_sel.chunks:
+            data_xr_sel = data_xr_sel.chunk({'latitude':-1, 'longitude':-1})
+        
+        # linear with nearest fallback per chunk of the other dimensions
+        stencil = dict(lat_index=lat_index_needed.reshape(self.lat_index.shape),
+                       lon_index=lon_index_needed.reshape(self.lon_index.shape),
+                       weights=self.weights, nearest_corner=self.nearest_corner)
+        data_interp = xr.apply_ufunc(_interp_stencil_block, data_xr_sel,
+                                     input_core_dims=[['latitude','longitude']],
+                                     output_core_dims=[[dimn_point]],
+                                     kwargs=stencil,
+                                     dask='parallelized',
+                                     dask_gufunc_kwargs={'output_sizes':{dimn_point:self.n_point}},
+                                     output_dtypes=[np.float64],
+                                     )
+        data_interp = data_interp.drop_vars(['latitude','longitude'], errors='ignore')
+        
+        # add variables without latitude/longitude dims and the point coordinates
+        data_interp = data_xr_reg.drop_vars(varns_latlon + ['latitude','longitude']).merge(data_interp)
+        data_interp = data_interp[list(data_xr_reg.data_vars)].assign_coords(self.da_plipoints.coords)
+        for varn in varns_latlon:
+            data_interp[varn].attrs = data_xr_reg[varn].attrs
+        return data_interp
     
-    ncbnd_construct = get_ncbnd_construct()
-    varn_pointx = ncbnd_construct['varn_pointx']
-    varn_pointy = ncbnd_construct['varn_pointy']
+    def to_netcdf(self, file_nc:str):
+        """
+        Save the points, stencil indices and weights to a netcdf file.
+        """
+        dimn_point = get_ncbnd_construct()['dimn_point']
+        data_vars = {'lon_index': ((dimn_point,'corner'), self.lon_index),
+                     'lat_index': ((dimn_point,'corner'), self.lat_index),
+                     'weights': ((dimn_point,'corner'), self.weights),
+                     'nearest_corner': (dimn_point, self.nearest_corner)}
+        ds_weights = xr.Dataset(data_vars, coords=self.da_plipoints.coords, attrs={'grid_key': self.grid_key})
+        ds_weights.to_netcdf(file_nc)
+    
+    @classmethod
+    def from_netcdf(cls, file_nc:str):
+        """
+        Load a PlipointsInterpolator that was saved with to_netcdf().
+        """
+        with xr.open_dataset(file_nc) as ds_weights:
+            ds_weights = ds_weights.load()
+        interpolator = cls.__new__(cls)
+        interpolator.grid_key = ds_weights.attrs['grid_key']
+        interpolator.da_plipoints = xr.Dataset(coords=ds_weights.coords)
+        interpolator.lon_index = ds_weights['lon_index'].to_numpy()
+        interpolator.lat_index = ds_weights['lat_index'].to_numpy()
+        interpolator.weights = ds_weights['weights'].to_numpy()
+        interpolator.nearest_corner = ds_weights['nearest_corner'].to_numpy()
+        return interpolator
+
+
+PLIPOINTS_INTERPOLATOR_CACHE = {}
+PLIPOINTS_INTERPOLATOR_CACHE_MAXSIZE = 8
+
+
+def get_plipoints_interpolator(data_xr_reg:xr.Dataset, gdf_points:geopandas.GeoDataFrame, dir_weights:str = None) -> PlipointsInterpolator:
+    """
+    Get a PlipointsInterpolator for the grid of a regular dataset and points. It is cached on the
+    latitude/longitude values and the points, so it is reused for multiple quantities on the same grid.
+    If dir_weights is provided, the weights are also stored in a netcdf file in that directory and
+    loaded from there if it already exists, so they are reused across runs.
+
+    Parameters
+    ----------
+    data_xr_reg : xr.Dataset
+        Regular dataset with latitude/longitude dimensions and variables.
+    gdf_points : geopandas.GeoDataFrame
+        gdf with point geometries and point names.
+    dir_weights : str, optional
+        Directory to store and load the weights. The default is None.
+
+    Returns
+    -------
+    interpolator : PlipointsInterpolator
+        PlipointsInterpolator from the grid to the points.
+
+    """
+    key = f'{get_regulargrid_key(data_xr_reg)}_{get_plipoints_key(gdf_points)}'
+    if key not in PLIPOINTS_INTERPOLATOR_CACHE:
+        if len(PLIPOINTS_INTERPOLATOR_CACHE) >= PLIPOINTS_INTERPOLATOR_CACHE_MAXSIZE:
+            # remove the oldest interpolator to limit memory usage
+            PLIPOINTS_INTERPOLATOR_CACHE.pop(next(iter(PLIPOINTS_INTERPOLATOR_CACHE)))
+        file_weights = None
+        if dir_weights is not None:
+            file_weights = os.path.join(dir_weights, f'plipoints_weights_{hashlib.sha1(key.encode()).hexdigest()}.nc')
+        if file_weights is not None and os.path.exists(file_weights):
+            interpolator = PlipointsInterpolator.from_netcdf(file_weights)
+        else:
+            interpolator = PlipointsInterpolator(data_xr_reg, gdf_points)
+            if file_weights is not None:
+                # write to a temporary file first, so concurrent runs never read an incomplete file
+                os.makedirs(dir_weights, exist_ok=True)
+                file_weights_tmp = f'{file_weights}.{os.getpid()}.{threading.get_ident()}.tmp'
+                interpolator.to_netcdf(file_weights_tmp)
+                os.replace(file_weights_tmp, file_weights)
+        PLIPOINTS_INTERPOLATOR_CACHE[key] = interpolator
+    interpolator = PLIPOINTS_INTERPOLATOR_CACHE[key]
+    return interpolator
+
+
+def interp_regularnc_to_plipointsDataset(data_xr_reg, gdf_points, load=True, interpolator:PlipointsInterpolator = None):
+    """
+    Interpolate a regular dataset (like CMEMS) with latitude/longitude dimensions to the points in gdf_points.
+    The values are linearly interpolated, with a fallback to the nearest value for points with nan values
+    in the stencil (like near land). The stencils are derived with dfmt.get_plipoints_interpolator(),
+    so they are reused when interpolating multiple quantities on the same grid to the same points.
+    A PlipointsInterpolator can also be passed, for instance one loaded from a netcdf file.
+    """
     
-    da_plipoints = da_from_gdf_points(gdf_points)
+    if interpolator is None:
+        interpolator = get_plipoints_interpolator(data_xr_reg, gdf_points)
     
     #interpolation to lat/lon combinations
     print('> interp mfdataset to all PolyFile points (lat/lon coordinates)')
-    
-    # linear, nearest, combine_first
-    data_interp_lin = data_xr_reg.interp(longitude=da_plipoints[varn_pointx], latitude=da_plipoints[varn_pointy],
-                                         method='linear', 
-                                         kwargs={'bounds_error':True}) #error is only raised upon load(), so when the actual value retrieval happens
-    data_interp_near = data_xr_reg.interp(longitude=da_plipoints[varn_pointx], latitude=da_plipoints[varn_pointy],
-                                          method='nearest', 
-                                          kwargs={'bounds_error':True}) #error is only raised upon load(), so when the actual value retrieval happens
-    data_interp = data_interp_lin.combine_first(data_interp_near)
-    
-    # drop original latitude/longitude vars (lat/lon in da_plipoints)
-    data_interp = data_interp.drop_vars(['latitude','longitude'])
+    data_interp = interpolator.interpolate(data_xr_reg)
     
     if not load:
         return data_interp
     
-    print(f'> actual extraction of data from netcdf with .load() (for {len(gdf_points)} plipoints at once, this might take a while)')
+    print(f'> actual extraction of data from netcdf with .load() (for {interpolator.n_point} plipoints at once, this might take a while)')
     dtstart = dt.datetime.now()
-    try:
-        data_interp_loaded = data_interp.load() #loading data for all points at once is more efficient compared to loading data per point in loop 
-    except ValueError: #generate a proper error with outofbounds requested coordinates, default is "ValueError: One of the requested xi is out of bounds in dimension 0" #TODO: improve error in xarray
-        lonvar_vals = data_xr_reg['longitude'].to_numpy()
-        latvar_vals = data_xr_reg['latitude'].to_numpy()
-        data_pol_pd = data_interp[[varn_pointx,varn_pointy]].to_dataframe()
-        bool_reqlon_outbounds = (data_pol_pd[varn_pointx] <= lonvar_vals.min()) | (data_pol_pd[varn_pointx] >= lonvar_vals.max())
-        bool_reqlat_outbounds = (data_pol_pd[varn_pointy] <= latvar_vals.min()) | (data_pol_pd[varn_pointy] >= latvar_vals.max())
-        reqlatlon_pd = pd.DataFrame({'longitude':data_pol_pd[varn_pointx],'latitude':data_pol_pd[varn_pointy],'lon outbounds':bool_reqlon_outbounds,'lat outbounds':bool_reqlat_outbounds})
-        reqlatlon_pd_outbounds = reqlatlon_pd.loc[bool_reqlon_outbounds | bool_reqlat_outbounds]
-        raise ValueError(f'{len(reqlatlon_pd_outbounds)} of requested pli points are out of bounds (valid longitude range {lonvar_vals.min()} to {lonvar_vals.max()}, valid latitude range {latvar_vals.min()} to {latvar_vals.max()}):\n{reqlatlon_pd_outbounds}')
+    data_interp_loaded = data_interp.load() #loading data for all points at once is more efficient compared to loading data per point in loop 
     time_passed = (dt.datetime.now()-dtstart).total_seconds()
     print(f'>>time passed: {time_passed:.2f} sec')
 
     return data_interp_loaded
 
 
-def interp_uds_to_plipoints(uds:xu.UgridDataset, gdf:geopandas.GeoDataFrame) -> xr.Dataset:
+def interp_uds_to_plipoints(uds:xu.UgridDataset, gdf:geopandas.GeoDataFrame, face_locator:FaceLocator = None) -> xr.Dataset:
     """
     To interpolate an unstructured dataset (like a _map.nc file) read with xugrid to plipoint locations
     
@@ -452,6 +704,9 @@ def interp_uds_to_plipoints(uds:xu.UgridDataset, gdf:geopandas.GeoDataFrame) ->
         dfm model output read using dfm_tools. Dims: mesh2d_nLayers, mesh2d_nInterfaces, time, mesh2d_nNodes, mesh2d_nFaces, mesh2d_nMax_face_nodes, mesh2d_nEdges.
     gdf : geopandas.GeoDataFrame
         gdf with location, geometry (Point) and crs corresponding to model crs.
+    face_locator : FaceLocator, optional
+        Reusable spatial index of the grid, retrieved with dfmt.get_face_locator(uds.grid) if not provided.
+        The located faces are stored, so calling this function for multiple quantities searches the points only once. The default is None.
 
     Raises
     ------
@@ -482,8 +737,22 @@ def interp_uds_to_plipoints(uds:xu.UgridDataset, gdf:geopandas.GeoDataFrame) ->
             vars_without_facedim.append(varn)
     uds_face = uds.drop_vars(vars_without_facedim)
     
-    # interpolate to provided points
-    ds = uds_face.ugrid.sel_points(x=gdf.geometry.x, y=gdf.geometry.y)
+    # interpolate to provided points, equivalent to uds_face.ugrid.sel_points() but
+    # reusing the celltree and located faces of the face locator
+    if face_locator is None:
+        face_locator = get_face_locator(uds.grid)
+    gridname = uds.grid.name
+    xy = np.column_stack([gdf.geometry.x, gdf.geometry.y])
+    face_index = face_locator.locate_points(xy)
+    coords = {f"{gridname}_index": (facedim, np.arange(len(xy))),
+              f"{gridname}_x": (facedim, xy[:, 0]),
+              f"{gridname}_y": (facedim, xy[:, 1]),
+              }
+    ds = uds_face.ugrid.obj.isel({facedim: face_index}).assign_coords(coords)
+    bool_valid = face_index != -1
+    if not bool_valid.all():
+        warnings.warn("Not all points are located inside of the grid.")
+        ds = ds.where(xr.DataArray(bool_valid, dims=(facedim,)))
     
     # re-add removed variables again, sometimes important for e.g. depth
     # TODO: remove after fixing https://github.com/Deltares/xugrid/issues/274
@@ -549,7 +818,9 @@ def interp_hisnc_to_plipoints(data_xr_his, file_pli, kdtree_k=3, load=True):
 
 def plipointsDataset_to_ForcingModel(plipointsDataset):
     """
-    empty docstring
+    Convert a plipointsDataset to a hydrolib ForcingModel with a T3D, Astronomic or TimeSeries
+    object per point. The data is loaded once, points with only nan values (on land) are found
+    in one reduction and skipped, and nan values are filled over depth for all points at once.
     """
     
     ncbnd_construct = get_ncbnd_construct()
@@ -565,24 +836,31 @@ def plipointsDataset_to_ForcingModel(plipointsDataset):
     #start conversion to Forcingmodel object
     print(f'Converting {npoints} plipoints to hcdfm.ForcingModel():',end='')
     dtstart = dt.datetime.now()
+    plipointsDataset = plipointsDataset.load()
+    plipoint_names = plipointsDataset[varn_pointname].to_numpy().astype(str)
+    
+    # check if all values of plipoints are nan (on land) for any of the quantities
+    plipoints_onlynan = np.zeros(npoints, dtype=bool)
+    for quan in quantity_list:
+        dims_notpoint = [dimn for dimn in plipointsDataset[quan].dims if dimn != dimn_point]
+        plipoints_onlynan |= plipointsDataset[quan].isnull().all(dim=dims_notpoint).to_numpy()
+    for plipoint_name in plipoint_names[plipoints_onlynan]:
+        logger.warning(f'Plipoint "{plipoint_name}" might be on land since it only contain nan values. '
+                       'This point is skipped to avoid bc-writing errors. Consider altering your PolyFile or extrapolate the data.')
+    
+    #ffill/bfill nan data along over depth dimension (corresponds to vertical extrapolation) for all points at once
+    if dimn_depth in plipointsDataset.dims:
+        for quan in quantity_list:
+            plipointsDataset[quan] = plipointsDataset[quan].bfill(dim=dimn_depth).ffill(dim=dimn_depth)
+    
     ForcingModel_object = hcdfm.ForcingModel()
-    for iP in range(npoints):
+    for iP in np.flatnonzero(~plipoints_onlynan):
         print(f' {iP+1}',end='')
         
-        #select data for this point, ffill nans, concatenating time column, constructing T3D/TimeSeries and append to hcdfm.ForcingModel()
+        #select data for this point, concatenating time column, constructing T3D/TimeSeries and append to hcdfm.ForcingModel()
         datablock_xr_onepoint = plipointsDataset.isel({dimn_point:iP})
-        plipoint_name = str(datablock_xr_onepoint[varn_pointname].to_numpy())
-        plipoint_onlynan = False
         for quan in quantity_list:
-            datablock_xr_onepoint[quan].attrs['locationname'] = plipoint_name #TODO: is there a nicer way of passing this data?
-            if datablock_xr_onepoint[quan].isnull().all(): # check if all values of plipoint are nan (on land)
-                plipoint_onlynan = True
-                logger.warning(f'Plipoint "{plipoint_name}" might be on land since it only contain nan values. '
-                               'This point is skipped to avoid bc-writing errors. Consider altering your PolyFile or extrapolate the data.')
-        
-        # skip this point if quantity has only-nan values
-        if plipoint_onlynan:
-            continue
+            datablock_xr_onepoint[quan].attrs['locationname'] = plipoint_names[iP] #TODO: is there a nicer way of passing this data?
         
         if dimn_depth in plipointsDataset.dims:
             ts_one = Dataset_to_T3D(datablock_xr_onepoint)
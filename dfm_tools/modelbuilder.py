@@ -1,9 +1,11 @@
 import os
 import logging
+import multiprocessing
 import pandas as pd
 import dfm_tools as dfmt
 import datetime as dt
 import xarray as xr
+from concurrent.futures import ProcessPoolExecutor
 import hydrolib.core.dflowfm as hcdfm
 from hydrolib.core.dimr.models import DIMR, FMComponent, Start
 from hydrolib.core.utils import get_path_style_for_current_operating_system
@@ -45,51 +47,138 @@ def get_ncvarname(quantity, conversion_dict):
     return ncvarname
 
     
-def cmems_nc_to_bc(ext_bnd, list_quantities, tstart, tstop, file_pli, dir_pattern, dir_output, conversion_dict=None, refdate_str=None):
+def _cmems_open_quantity(quantity, tstart, tstop, dir_pattern, conversion_dict, refdate_str):
+    """
+    Lazily open and prepare the regular dataset(s) of one quantity, with ux/uy combined in one dataset.
+    """
+    quantity_list = get_quantity_list(quantity=quantity)
+    
+    for quantity_key in quantity_list: # loop over ux/uy
+        ncvarname = get_ncvarname(quantity=quantity_key, conversion_dict=conversion_dict)
+        dir_pattern_one = str(dir_pattern).format(ncvarname=ncvarname)
+        #open regulargridDataset and do some basic stuff (time selection, renaming depth/lat/lon/varname, converting units, etc)
+        data_xr_onevar = open_prepare_dataset(dir_pattern=dir_pattern_one, 
+                                              quantity=quantity_key,
+                                              tstart=tstart, tstop=tstop,
+                                              conversion_dict=conversion_dict,
+                                              refdate_str=refdate_str)
+        if quantity_key == quantity_list[0]:
+            data_xr_vars = data_xr_onevar
+        else: # only relevant in case of ux/uy, others all have only one quantity
+            data_xr_vars[quantity_key] = data_xr_onevar[quantity_key]
+    return data_xr_vars
+
+
+def _cmems_nc_to_bc_one(quantity, tstart, tstop, file_pli, gdf_points, dir_pattern, dir_output, conversion_dict, refdate_str, dir_weights, interpolator=None):
+    """
+    Interpolate one quantity to the boundary points, save the bc file and return the boundary object.
+    If no interpolator is provided, it is retrieved with dfmt.get_plipoints_interpolator().
+    """
+    print(f'processing quantity: {quantity}')
+    
+    data_xr_vars = _cmems_open_quantity(quantity, tstart=tstart, tstop=tstop, dir_pattern=dir_pattern,
+                                        conversion_dict=conversion_dict, refdate_str=refdate_str)
+    
+    # interpolate regulargridDataset to plipointsDataset
+    if interpolator is None:
+        interpolator = dfmt.get_plipoints_interpolator(data_xr_reg=data_xr_vars, gdf_points=gdf_points, dir_weights=dir_weights)
+    data_interp = dfmt.interp_regularnc_to_plipointsDataset(data_xr_reg=data_xr_vars, gdf_points=gdf_points, load=True, interpolator=interpolator)
+    
+    #convert plipointsDataset to hydrolib ForcingModel
+    ForcingModel_object = dfmt.plipointsDataset_to_ForcingModel(plipointsDataset=data_interp)
+    
+    # generate boundary object for the ext file (quantity, pli-filename, bc-filename)
+    file_bc_out = os.path.join(dir_output,f'{quantity}_CMEMS.bc')
+    ForcingModel_object.save(filepath=file_bc_out)
+    boundary_object = hcdfm.Boundary(quantity=quantity,
+                                     locationfile=file_pli, #placeholder, will be replaced later on
+                                     forcingfile=ForcingModel_object)
+    return boundary_object
+
+
+def cmems_nc_to_bc(ext_bnd, list_quantities, tstart, tstop, file_pli, dir_pattern, dir_output, conversion_dict=None, refdate_str=None, dir_weights=None, max_workers=1):
+    """
+    Interpolate CMEMS (or similar) netcdf files to the points in file_pli for each quantity,
+    save them as bc files in dir_output and add the boundaries to ext_bnd.
+    The quantities are independent, so they can be processed concurrently with max_workers > 1.
+    
+    Parameters
+    ----------
+    ext_bnd : hcdfm.ExtModel
+        The new format external forcings file to add the boundaries to.
+    list_quantities : list
+        Quantities like 'salinitybnd', 'temperaturebnd', 'uxuyadvectionvelocitybnd' and 'tracerbndNO3'.
+    tstart : str or pd.Timestamp
+        Start time, rounded down to midnight.
+    tstop : str or pd.Timestamp
+        Stop time, rounded up to midnight.
+    file_pli : str
+        Polyfile with the boundary points.
+    dir_pattern : str
+        Path pattern of the netcdf files, with {ncvarname} as placeholder for the variable name.
+    dir_output : str
+        Directory to write the bc files to.
+    conversion_dict : dict, optional
+        Variable names and unit conversions, retrieved with dfmt.get_conversion_dict() if not provided. The default is None.
+    refdate_str : str, optional
+        Reference date for the time units in the bc files, like 'minutes since 2020-01-01 00:00:00 +00:00'. The default is None.
+    dir_weights : str, optional
+        Directory to store and load the interpolation weights, to reuse them in subsequent runs. The default is None.
+    max_workers : int, optional
+        Number of processes used to process the quantities concurrently. Reading, interpolating,
+        converting to a ForcingModel and writing the bc file is then done for all quantities in
+        parallel, after which the boundaries are added to ext_bnd in the order of list_quantities.
+        Processes are used since netCDF4/HDF5 is not thread-safe and the conversion to ForcingModel
+        and writing of bc files is pure python. On Windows, this requires the `if __name__ == "__main__":`
+        guard in the calling script. With None, the default of concurrent.futures.ProcessPoolExecutor
+        is used. The default is 1 (sequential).
+    
+    Returns
+    -------
+    ext_bnd : hcdfm.ExtModel
+        ext_bnd with the added boundaries.
+
+    """
     #input examples in https://github.com/Deltares/dfm_tools/blob/main/tests/examples/preprocess_interpolate_nc_to_bc.py
     # TODO: rename ext_bnd to ext_new for consistency
     if conversion_dict is None:
         conversion_dict = dfmt.get_conversion_dict()
     
-    for quantity in list_quantities: # loop over salinitybnd/uxuyadvectionvelocitybnd/etc
-        print(f'processing quantity: {quantity}')
-        
-        # times in cmems API are at midnight, so round to nearest outer midnight datetime
-        tstart = pd.Timestamp(tstart).floor('1d')
-        tstop = pd.Timestamp(tstop).ceil('1d')
-        
-        quantity_list = get_quantity_list(quantity=quantity)
-        
-        for quantity_key in quantity_list: # loop over ux/uy
-            ncvarname = get_ncvarname(quantity=quantity_key, conversion_dict=conversion_dict)
-            dir_pattern_one = str(dir_pattern).format(ncvarname=ncvarname)
-            #open regulargridDataset and do some basic stuff (time selection, renaming depth/lat/lon/varname, converting units, etc)
-            data_xr_onevar = open_prepare_dataset(dir_pattern=dir_pattern_one, 
-                                                  quantity=quantity_key,
-                                                  tstart=tstart, tstop=tstop,
-                                                  conversion_dict=conversion_dict,
-                                                  refdate_str=refdate_str)
-            if quantity_key == quantity_list[0]:
-                data_xr_vars = data_xr_onevar
-            else: # only relevant in case of ux/uy, others all have only one quantity
-                data_xr_vars[quantity_key] = data_xr_onevar[quantity_key]
-        
-        # interpolate regulargridDataset to plipointsDataset
-        polyfile_obj = hcdfm.PolyFile(file_pli)
-        gdf_points = dfmt.PolyFile_to_geodataframe_points(polyfile_object=polyfile_obj)
-        data_interp = dfmt.interp_regularnc_to_plipointsDataset(data_xr_reg=data_xr_vars, gdf_points=gdf_points, load=True)
-        
-        #convert plipointsDataset to hydrolib ForcingModel
-        ForcingModel_object = dfmt.plipointsDataset_to_ForcingModel(plipointsDataset=data_interp)
-        
-        # generate boundary object for the ext file (quantity, pli-filename, bc-filename)
-        file_bc_out = os.path.join(dir_output,f'{quantity}_CMEMS.bc')
-        ForcingModel_object.save(filepath=file_bc_out)
-        boundary_object = hcdfm.Boundary(quantity=quantity,
-                                         locationfile=file_pli, #placeholder, will be replaced later on
-                                         forcingfile=ForcingModel_object)
+    # times in cmems API are at midnight, so round to nearest outer midnight datetime
+    tstart = pd.Timestamp(tstart).floor('1d')
+    tstop = pd.Timestamp(tstop).ceil('1d')
+    
+    # the interpolation weights are cached per grid, so they are derived only once for all quantities on the same grid
+    # with dir_weights, they are also stored in and loaded from netcdf files, to reuse them in subsequent runs
+    polyfile_obj = hcdfm.PolyFile(file_pli)
+    gdf_points = dfmt.PolyFile_to_geodataframe_points(polyfile_object=polyfile_obj)
+    
+    kwargs = dict(tstart=tstart, tstop=tstop, file_pli=file_pli, gdf_points=gdf_points,
+                  dir_pattern=dir_pattern, dir_output=dir_output, conversion_dict=conversion_dict,
+                  refdate_str=refdate_str, dir_weights=dir_weights)
+    if max_workers is None or max_workers > 1:
+        # the workers do not share the interpolator cache, so the interpolators are derived (once per grid)
+        # in this process from the lazily opened datasets and passed to the workers
+        interpolators = []
+        for quantity in list_quantities:
+            data_xr_vars = _cmems_open_quantity(quantity, tstart=tstart, tstop=tstop, dir_pattern=dir_pattern,
+                                                conversion_dict=conversion_dict, refdate_str=refdate_str)
+            interpolator = dfmt.get_plipoints_interpolator(data_xr_reg=data_xr_vars, gdf_points=gdf_points, dir_weights=dir_weights)
+            interpolators.append(interpolator)
+            data_xr_vars.close()
         
-        # add the boundary object to the ext file for each polyline in the polyfile
+        # process quantities concurrently, the results are collected in the original order
+        # spawn instead of fork, since forking a process with active dask/hdf5 threads can deadlock
+        mp_context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=mp_context) as executor:
+            futures = [executor.submit(_cmems_nc_to_bc_one, quantity, interpolator=interpolator, **kwargs)
+                       for quantity, interpolator in zip(list_quantities, interpolators)]
+            boundary_objects = [future.result() for future in futures]
+    else:
+        boundary_objects = [_cmems_nc_to_bc_one(quantity, **kwargs) for quantity in list_quantities]
+    
+    # add the boundary object to the ext file for each polyline in the polyfile
+    for boundary_object in boundary_objects:
         ext_add_boundary_object_per_polyline(ext_new=ext_bnd, boundary_object=boundary_object)
 
     return ext_bnd
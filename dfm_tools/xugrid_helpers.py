@@ -6,13 +6,27 @@ import datetime as dt
 import pandas as pd
 import meshkernel
 from dfm_tools.xarray_helpers import file_to_list
+from dfm_tools.chunking import get_chunks
 from netCDF4 import default_fillvals
 import warnings
+import json
+import hashlib
+import pooch
+import dask
+import scipy.sparse
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+import threading
 
 __all__ = [
     "open_partitioned_dataset",
     "open_dataset_curvilinear",
     "open_dataset_delft3d4",
+    "partitioned_map_to_zarr",
+    "open_dataset_zarr",
+    "FaceLocator",
+    "get_face_locator",
+    "LocationRegridder",
     "uda_to_faces",
     "uda_interfaces_to_centers",
     "add_network_cellinfo",
@@ -45,6 +59,21 @@ def get_vertical_dimensions(uds): #TODO: maybe add layer_dimension and interface
         return None, None
 
 
+def get_domainno_fromfname(fname):
+    """
+    Derive the domain number of a partition from the filename (like 'model_0001_map.nc'), None if it is not present.
+    """
+    if '_' not in fname: #safety escape in case there is no _ in the filename
+        print('[nodomainfname] ',end='')
+        return None
+    fname_splitted = fname.split('_')
+    part_domainno_fromfname = fname_splitted[-2] #this is not valid for rstfiles (date follows after partnumber), but they cannot be read with xugrid anyway since they lack topology and node_x/node_y variables: https://issuetracker.deltares.nl/browse/UNST-7176
+    if not part_domainno_fromfname.isnumeric() or len(part_domainno_fromfname)!=4:
+        print('[nodomainfname] ',end='')
+        return None
+    return int(part_domainno_fromfname)
+
+
 def remove_ghostcells(uds, fname): #TODO: remove ghostcells from output or align values between (non)ghost cells: https://issuetracker.deltares.nl/browse/UNST-6701
     """
     Dropping ghostcells if there is a domainno variable present and there is a domainno in the filename.
@@ -60,17 +89,11 @@ def remove_ghostcells(uds, fname): #TODO: remove ghostcells from output or align
         return uds
     
     #derive domainno from filename, return uds if not present
-    if '_' not in fname: #safety escape in case there is no _ in the filename
-        print('[nodomainfname] ',end='')
-        return uds
-    fname_splitted = fname.split('_')
-    part_domainno_fromfname = fname_splitted[-2] #this is not valid for rstfiles (date follows after partnumber), but they cannot be read with xugrid anyway since they lack topology and node_x/node_y variables: https://issuetracker.deltares.nl/browse/UNST-7176
-    if not part_domainno_fromfname.isnumeric() or len(part_domainno_fromfname)!=4:
-        print('[nodomainfname] ',end='')
+    part_domainno_fromfname = get_domainno_fromfname(fname)
+    if part_domainno_fromfname is None:
         return uds
     
     #drop ghostcells
-    part_domainno_fromfname = int(part_domainno_fromfname)
     da_domainno = uds.variables[varn_domain]
     idx = np.flatnonzero(da_domainno == part_domainno_fromfname)
     uds = uds.isel({uds.grid.face_dimension:idx})
@@ -171,7 +194,205 @@ def uds_auto_set_crs(uds : xu.UgridDataset):
         return
 
 
-def open_partitioned_dataset(file_nc:str, decode_fillvals:bool = False, remove_edges:bool = False, remove_ghost:bool = True, **kwargs): 
+def open_partition(file_nc_one:str, decode_fillvals:bool = False, remove_edges:bool = False, remove_ghost:bool = True, **kwargs):
+    """
+    Open a single partition of a (partitioned) mapfile as a xu.UgridDataset, including the
+    optional fillvalue decoding, removal of hanging edges and removal of ghostcells.
+    Used by open_partitioned_dataset for each of the partitions.
+    """
+    ds = open_partition_dataset(file_nc_one, decode_fillvals=decode_fillvals, remove_edges=remove_edges, **kwargs)
+    uds = xu.core.wrap.UgridDataset(ds)
+    if remove_ghost: #TODO: this makes it way slower (at least for GTSM, although merging seems faster), but is necessary since values on overlapping cells are not always identical (eg in case of Venice ucmag)
+        uds = remove_ghostcells(uds, file_nc_one)
+    uds_auto_set_crs(uds)
+    return uds
+
+
+def open_partition_dataset(file_nc_one:str, decode_fillvals:bool = False, remove_edges:bool = False, **kwargs) -> xr.Dataset:
+    """
+    Open a single partition of a (partitioned) mapfile as a xr.Dataset, including the
+    optional fillvalue decoding, removal of hanging edges and renaming of mapformat1 dimensions.
+    """
+    # suppress chunking warning: https://github.com/Deltares/dfm_tools/issues/947
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=UserWarning)
+        ds = xr.open_mfdataset(file_nc_one, **kwargs)
+    if decode_fillvals:
+        ds = decode_default_fillvals(ds)
+    if remove_edges:
+        ds = remove_unassociated_edges(ds)
+    if 'nFlowElem' in ds.dims and 'nNetElem' in ds.dims:
+        print('[mapformat1] ',end='')
+        #for mapformat1 mapfiles: merge different face dimensions (rename nFlowElem to nNetElem) to make sure the dataset topology is correct
+        ds = ds.rename({'nFlowElem':'nNetElem'})
+    remove_nan_fillvalue_attrs(ds)
+    return ds
+
+
+def get_ghostcell_keep_indices(partitions:list, file_nc_list:list) -> list:
+    """
+    Derive the indices of the non-ghost faces for all partitions at once. The domain variables
+    of all partitions are read in a single pass. Like in remove_ghostcells(), the faces of a partition
+    are the faces with the domain number from its filename. Partitions without domain variable or
+    without domain number in the filename keep all faces (None is returned).
+    """
+    varn_domain_list = [f'{uds.grid.name}_flowelem_domain' for uds in partitions]
+    has_domain = [varn in uds.data_vars for uds, varn in zip(partitions, varn_domain_list)]
+    if not any(has_domain):
+        print('[nodomainvar] ',end='')
+        return [None] * len(partitions)
+    
+    # read all domain variables in one pass
+    domain_list = dask.compute(*[uds.obj[varn].data for uds, varn, has in zip(partitions, varn_domain_list, has_domain) if has])
+    domain_iter = iter(domain_list)
+    domain_list = [np.asarray(next(domain_iter)).astype(int) if has else None for has in has_domain]
+    
+    keep_indices = []
+    for domain, file_nc_one in zip(domain_list, file_nc_list):
+        if domain is None:
+            keep_indices.append(None)
+            continue
+        part_domainno_fromfname = get_domainno_fromfname(file_nc_one)
+        if part_domainno_fromfname is None:
+            keep_indices.append(None)
+            continue
+        keep_indices.append(np.flatnonzero(domain == part_domainno_fromfname))
+    return keep_indices
+
+
+def get_partition_indexes(partitions:list, file_nc_list:list, remove_ghost:bool = True):
+    """
+    Remove ghostcells from the partition grids and merge them. The indices of the ghostcell removal
+    and of the merge are composed, so the result contains a single index array per grid dimension per
+    partition, that can be applied to the (lazy) data variables with one fancy-index.
+    """
+    if remove_ghost:
+        keep_indices = get_ghostcell_keep_indices(partitions, file_nc_list)
+    else:
+        keep_indices = [None] * len(partitions)
+    
+    grids_subset = []
+    indexes_subset = []
+    for uds, keep_index in zip(partitions, keep_indices):
+        grid = uds.grid
+        if keep_index is None:
+            keep_index = np.arange(grid.n_face)
+        grid_subset, index_subset = grid.topology_subset(keep_index, return_index=True)
+        grids_subset.append(grid_subset)
+        indexes_subset.append(index_subset)
+    
+    merged_grid, indexes_merge = grids_subset[0].merge_partitions(grids_subset)
+    indexes = {}
+    for dimn, index_merge_list in indexes_merge.items():
+        indexes[dimn] = [np.asarray(index_subset[dimn])[index_merge] for index_subset, index_merge in zip(indexes_subset, index_merge_list)]
+    return merged_grid, indexes
+
+
+def merge_partitions_indexed(partitions:list, grid:xu.Ugrid2d, indexes:dict) -> xu.UgridDataset:
+    """
+    Merge partition datasets by selecting each variable along its grid dimension with the
+    per-partition indices and concatenating the selections. Variables without a grid dimension
+    are taken from the first partition. Variables that are not present in all partitions or
+    have non-matching shapes are dropped, like in xu.merge_partitions().
+    """
+    partitions = [ds.obj if isinstance(ds, xu.UgridDataset) else ds for ds in partitions]
+    
+    # drop topology and connectivity variables, these are replaced by the merged grid
+    for ipart, ds in enumerate(partitions):
+        connectivity_vars = [varn for conn_dict in ds.ugrid_roles.connectivity.values() for varn in conn_dict.values()]
+        partitions[ipart] = ds.drop_vars(ds.ugrid_roles.topology + connectivity_vars)
+    
+    max_sizes = grid.max_connectivity_sizes
+    merged_vars = {}
+    for varn in partitions[0].variables:
+        if varn in partitions[0].dims:
+            # index variables are recreated by xugrid
+            continue
+        if not all(varn in ds.variables for ds in partitions):
+            continue
+        var_griddims = [dimn for dimn in partitions[0][varn].dims if dimn in indexes]
+        if len(var_griddims) == 0:
+            merged_vars[varn] = partitions[0][varn]
+            continue
+        dimn = var_griddims[0]
+        to_merge = []
+        for ds, index in zip(partitions, indexes[dimn]):
+            da_sel = ds[varn].isel({dimn:index})
+            pad_width = {dimn_max:(0, nmax-da_sel.sizes[dimn_max]) for dimn_max, nmax in max_sizes.items()
+                         if dimn_max in da_sel.dims and da_sel.sizes[dimn_max] != nmax}
+            if pad_width:
+                da_sel = da_sel.pad(pad_width=pad_width)
+            to_merge.append(da_sel)
+        shapes_other = set(tuple(size for dimn_da, size in da_sel.sizes.items() if dimn_da != dimn) for da_sel in to_merge)
+        if len(shapes_other) > 1:
+            continue
+        da_merged = xr.concat(to_merge, dim=dimn)
+        if da_merged.chunks:
+            # single chunk along grid dimension, like in xu.merge_partitions()
+            da_merged = da_merged.chunk({dimn:-1})
+        merged_vars[varn] = da_merged
+    ds_merged = xr.Dataset(merged_vars, attrs=partitions[0].attrs)
+    ds_merged = ds_merged.set_coords([varn for varn in partitions[0].coords if varn in ds_merged.variables])
+    
+    uds = xu.UgridDataset(ds_merged, grids=[grid])
+    uds_auto_set_crs(uds)
+    return uds
+
+
+def get_topology_cache_file(file_nc_list:list, **kwargs) -> str:
+    """
+    Get the path of the merged topology cachefile for a list of partitions. The cachekey is
+    derived from the filepaths, filesizes and modification times of the partitions and the
+    keyword arguments that influence the merged topology (like remove_edges/remove_ghost).
+    The cachefiles are stored in the dfm_tools cache directory.
+    """
+    files_info = []
+    for file_nc_one in file_nc_list:
+        file_stat = os.stat(file_nc_one)
+        files_info.append([os.path.abspath(file_nc_one), file_stat.st_size, file_stat.st_mtime_ns])
+    cache_info = json.dumps({'files':files_info, **kwargs}, sort_keys=True)
+    cache_key = hashlib.sha256(cache_info.encode()).hexdigest()
+    
+    dir_cache = os.path.join(str(pooch.os_cache('dfm_tools')), 'topology_cache')
+    os.makedirs(dir_cache, exist_ok=True)
+    file_cache = os.path.join(dir_cache, f'{cache_key}_topology.nc')
+    return file_cache
+
+
+def write_topology_cache(grid:xu.Ugrid2d, indexes:dict, file_cache:str):
+    """
+    Write the merged grid and the per-partition indices of all grid dimensions to the cachefile.
+    """
+    ds_cache = grid.to_dataset()
+    for dimn, index_list in indexes.items():
+        partition_number = np.concatenate([np.full(len(index), ipart) for ipart, index in enumerate(index_list)])
+        ds_cache[f'dfmt_partition_{dimn}'] = xr.DataArray(partition_number, dims=dimn)
+        ds_cache[f'dfmt_index_{dimn}'] = xr.DataArray(np.concatenate(index_list), dims=dimn)
+    ds_cache.attrs['topology'] = grid.name
+    # write to a temporary file first, so concurrent runs never read an incomplete file
+    file_cache_tmp = f'{file_cache}.{os.getpid()}.{threading.get_ident()}.tmp'
+    ds_cache.to_netcdf(file_cache_tmp)
+    os.replace(file_cache_tmp, file_cache)
+
+
+def read_topology_cache(file_cache:str, npartitions:int):
+    """
+    Read the merged grid and the per-partition indices of all grid dimensions from the cachefile.
+    """
+    with xr.open_dataset(file_cache) as ds_cache:
+        ds_cache = ds_cache.load()
+    grid = xu.Ugrid2d.from_dataset(ds_cache, topology=ds_cache.attrs['topology'])
+    indexes = {}
+    for dimn in grid.dims:
+        if f'dfmt_index_{dimn}' not in ds_cache.variables:
+            continue
+        partition_number = ds_cache[f'dfmt_partition_{dimn}'].to_numpy()
+        partition_index = ds_cache[f'dfmt_index_{dimn}'].to_numpy()
+        indexes[dimn] = [partition_index[partition_number==ipart] for ipart in range(npartitions)]
+    return grid, indexes
+
+
+def open_partitioned_dataset(file_nc:str, decode_fillvals:bool = False, remove_edges:bool = False, remove_ghost:bool = True, max_workers:int = 1, cache_topology:bool = False, access_pattern:str = 'snapshot', **kwargs): 
     """
     using xugrid to read and merge partitions, including support for delft3dfm mapformat1 
     by renaming old layerdim. Furthermore some optional extensions like removal of hanging
@@ -189,12 +410,32 @@ def open_partitioned_dataset(file_nc:str, decode_fillvals:bool = False, remove_e
     remove_ghost : bool, optional
         Remove ghostcells from the partitions. This is also done by xugrid automatically 
         upon merging, but then the domain numbers are not taken into account so 
-        the result will be different. The default is True.
+        the result will be different. The domain variables of all partitions are read at once
+        and ghostcells are removed upon merging, the domain number in the filename is only used
+        when opening a single partition. The default is True.
+    max_workers : int, optional
+        Number of threads used to open the partitions concurrently. Opening, fillvalue decoding
+        and removal of hanging edges and ghostcells is then done for all partitions in parallel,
+        after which the partitions are merged in the original order. Access to the netCDF files is
+        serialized by the netCDF/HDF5 lock of the xarray backends, so the speedup comes from the
+        work in between file reads. With None, the default of concurrent.futures.ThreadPoolExecutor
+        is used. The default is 1 (sequential).
+    cache_topology : bool, optional
+        Store the merged grid and the per-partition face/edge/node indices in the dfm_tools
+        cache directory. Subsequent calls for the same partitions (identical paths, sizes and
+        modification times) skip reading the partition topologies, removing ghostcells and merging
+        the grids and only select and concatenate the lazy data variables. Keyword arguments that alter
+        the topology (like a preprocess function) are not part of the cachekey. The default is False.
+    access_pattern : str, optional
+        The intended access pattern, used to derive the chunks if these are not provided in kwargs.
+        'snapshot' gives one timestep per chunk which is fast for plotting maps, 'reduction' gives
+        as many timesteps per chunk as fit in the dask "array.chunk-size", which prevents memory
+        overloads for sum/mean/etc over the time dimension. The default is 'snapshot'.
     file_nc : TYPE
         DESCRIPTION.
     kwargs : TYPE, optional
-        arguments that are passed to xr.open_dataset. The chunks argument is set if not provided
-        chunks={'time':1} increases performance significantly upon reading, but causes memory overloads when performing sum/mean/etc actions over time dimension (in that case 100/200 is better). The default is {'time':1}.
+        arguments that are passed to xr.open_dataset. The chunks argument is derived with
+        dfmt.get_chunks() from the access_pattern if not provided.
 
     Raises
     ------
@@ -223,45 +464,68 @@ def open_partitioned_dataset(file_nc:str, decode_fillvals:bool = False, remove_e
     #TODO: add support for multiple grids via keyword? https://github.com/Deltares/dfm_tools/issues/497
     #TODO: speed up open_dataset https://github.com/Deltares/dfm_tools/issues/225 (also remove_ghost)
     
-    if 'chunks' not in kwargs:
-        kwargs['chunks'] = {'time':1}
-    
     dtstart_all = dt.datetime.now()
     file_nc_list = file_to_list(file_nc)
     
+    if 'chunks' not in kwargs:
+        kwargs['chunks'] = get_chunks(file_nc_list[0], access_pattern=access_pattern, npartitions=len(file_nc_list))
+    
+    # only cache topology of partitioned mapfiles
+    cache_topology = cache_topology and len(file_nc_list) > 1
+    if cache_topology:
+        file_cache = get_topology_cache_file(file_nc_list, remove_edges=remove_edges, remove_ghost=remove_ghost)
+        if os.path.exists(file_cache):
+            print(f'>> xr.open_dataset() with {len(file_nc_list)} partition(s) and cached merged topology: ',end='')
+            grid, indexes = read_topology_cache(file_cache, npartitions=len(file_nc_list))
+            partitions = []
+            for iF, file_nc_one in enumerate(file_nc_list):
+                print(iF+1,end=' ')
+                ds = open_partition_dataset(file_nc_one, decode_fillvals=decode_fillvals, remove_edges=remove_edges, **kwargs)
+                partitions.append(ds)
+            ds_merged_xu = merge_partitions_indexed(partitions, grid=grid, indexes=indexes)
+            print(f': {(dt.datetime.now()-dtstart_all).total_seconds():.2f} sec')
+            return ds_merged_xu
+    
     print(f'>> xu.open_dataset() with {len(file_nc_list)} partition(s): ',end='')
     dtstart = dt.datetime.now()
-    partitions = []
-    for iF, file_nc_one in enumerate(file_nc_list):
-        print(iF+1,end=' ')
-        # suppress chunking warning: https://github.com/Deltares/dfm_tools/issues/947
-        with warnings.catch_warnings():
-            warnings.simplefilter("ignore", category=UserWarning)
-            ds = xr.open_mfdataset(file_nc_one, **kwargs)
-        if decode_fillvals:
-            ds = decode_default_fillvals(ds)
-        if remove_edges:
-            ds = remove_unassociated_edges(ds)
-        if 'nFlowElem' in ds.dims and 'nNetElem' in ds.dims:
-            print('[mapformat1] ',end='')
-            #for mapformat1 mapfiles: merge different face dimensions (rename nFlowElem to nNetElem) to make sure the dataset topology is correct
-            ds = ds.rename({'nFlowElem':'nNetElem'})
-        remove_nan_fillvalue_attrs(ds)
-        uds = xu.core.wrap.UgridDataset(ds)
-        if remove_ghost: #TODO: this makes it way slower (at least for GTSM, although merging seems faster), but is necessary since values on overlapping cells are not always identical (eg in case of Venice ucmag)
-            uds = remove_ghostcells(uds, file_nc_one)
-        uds_auto_set_crs(uds)
-        partitions.append(uds)
+    # ghostcells of multiple partitions are removed in a single batch upon merging
+    open_kwargs = dict(decode_fillvals=decode_fillvals, remove_edges=remove_edges,
+                       remove_ghost=remove_ghost and len(file_nc_list) == 1)
+    if max_workers is None or max_workers > 1:
+        # open partitions concurrently, the results are collected in the original order
+        # the xarray backends serialize the file access with the netCDF/HDF5 lock, so this is thread-safe
+        # threads are used since lazy datasets are not cheaply picklable between processes
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(open_partition, file_nc_one, **open_kwargs, **kwargs) for file_nc_one in file_nc_list]
+            partitions = [future.result() for future in futures]
+    else:
+        partitions = []
+        for iF, file_nc_one in enumerate(file_nc_list):
+            print(iF+1,end=' ')
+            uds = open_partition(file_nc_one, **open_kwargs, **kwargs)
+            partitions.append(uds)
     print(': ',end='')
     print(f'{(dt.datetime.now()-dtstart).total_seconds():.2f} sec')
     
     if len(partitions) == 1: #do not merge in case of 1 partition
         return partitions[0]
     
-    print(f'>> xu.merge_partitions() with {len(file_nc_list)} partition(s): ',end='')
-    dtstart = dt.datetime.now()
-    ds_merged_xu = xu.merge_partitions(partitions)
-    print(f'{(dt.datetime.now()-dtstart).total_seconds():.2f} sec')
+    if not all(len(uds.grids) == 1 and isinstance(uds.grid, xu.Ugrid2d) for uds in partitions):
+        # fallback for 1D networks and multiple grids
+        if remove_ghost:
+            partitions = [remove_ghostcells(uds, file_nc_one) for uds, file_nc_one in zip(partitions, file_nc_list)]
+        print(f'>> xu.merge_partitions() with {len(file_nc_list)} partition(s): ',end='')
+        dtstart = dt.datetime.now()
+        ds_merged_xu = xu.merge_partitions(partitions)
+        print(f'{(dt.datetime.now()-dtstart).total_seconds():.2f} sec')
+    else:
+        print(f'>> dfmt.merge_partitions_indexed() with {len(file_nc_list)} partition(s): ',end='')
+        dtstart = dt.datetime.now()
+        grid, indexes = get_partition_indexes(partitions, file_nc_list, remove_ghost=remove_ghost)
+        ds_merged_xu = merge_partitions_indexed(partitions, grid=grid, indexes=indexes)
+        print(f'{(dt.datetime.now()-dtstart).total_seconds():.2f} sec')
+        if cache_topology:
+            write_topology_cache(grid, indexes, file_cache=file_cache)
     
     #print variables that are dropped in merging procedure. Often only ['mesh2d_face_x_bnd', 'mesh2d_face_y_bnd'], which can be derived by combining node_coordinates (mesh2d_node_x mesh2d_node_y) and face_node_connectivity (mesh2d_face_nodes). >> can be removed from FM-mapfiles (email of 16-1-2023)
     varlist_onepart = list(partitions[0].variables.keys())
@@ -275,6 +539,288 @@ def open_partitioned_dataset(file_nc:str, decode_fillvals:bool = False, remove_e
     return ds_merged_xu
 
 
+def get_chunks_fromsize(uds:xu.UgridDataset, target_chunksize_mb:float = 100, dimn_time:str = 'time') -> dict:
+    """
+    Derive time and grid (face/edge/node) chunks for a merged mapfile from a target chunksize in MB.
+    The variable with the most bytes per timestep is leading. If one timestep of this variable
+    is smaller than the target, multiple timesteps are combined in one chunk and the grid dimensions
+    are not chunked. Otherwise, the time chunk is 1 and the grid dimensions are chunked.
+    Without time-dependent variables, only the grid dimensions are included (not chunked).
+    """
+    target_bytes = target_chunksize_mb * 1e6
+    grid_dims = uds.grid.dims
+    
+    varlist_time = [varn for varn in uds.data_vars if dimn_time in uds[varn].dims]
+    if len(varlist_time) == 0:
+        return {dimn:-1 for dimn in grid_dims if dimn in uds.dims}
+    
+    ntimes = uds.sizes[dimn_time]
+    nbytes_timestep = max([uds[varn].nbytes/ntimes for varn in varlist_time])
+    if nbytes_timestep <= target_bytes:
+        chunks = {dimn_time: int(min(target_bytes // nbytes_timestep, ntimes))}
+        chunks.update({dimn:-1 for dimn in grid_dims if dimn in uds.dims})
+    else:
+        fraction = target_bytes / nbytes_timestep
+        chunks = {dimn_time: 1}
+        chunks.update({dimn:max(1, int(uds.sizes[dimn] * fraction)) for dimn in grid_dims if dimn in uds.dims})
+    return chunks
+
+
+def partitioned_map_to_zarr(file_nc:str, store:str, chunks:dict = None, target_chunksize_mb:float = 100, dimn_time:str = 'time', **kwargs):
+    """
+    Convert a (partitioned) D-Flow FM mapfile to a single merged UGRID zarr store without ghostcells.
+    The merged dataset is written per time chunk, so the data of the entire run is never loaded into memory.
+    The zarr store can be opened with dfmt.open_dataset_zarr().
+
+    Parameters
+    ----------
+    file_nc : str
+        Path to the mapfile(s), wildcards are supported to read partitioned mapfiles (e.g. `*_0*_map.nc`).
+    store : str
+        Path to the zarr store, it is overwritten if it exists.
+    chunks : dict, optional
+        Chunks for the time and grid dimensions of the zarr store. If None, the chunks are derived from target_chunksize_mb. The default is None.
+    target_chunksize_mb : float, optional
+        Target size in MB of the chunks of the largest variable, only used if chunks is not provided. The default is 100.
+    dimn_time : str, optional
+        Name of the time dimension. Without time-dependent variables, the dataset is written at once. The default is 'time'.
+    **kwargs : TYPE
+        arguments that are passed to dfmt.open_partitioned_dataset().
+
+    Returns
+    -------
+    None.
+
+    """
+    
+    uds = open_partitioned_dataset(file_nc, **kwargs)
+    if chunks is None:
+        chunks = get_chunks_fromsize(uds, target_chunksize_mb=target_chunksize_mb, dimn_time=dimn_time)
+    print(f'>> writing merged dataset to zarr with chunks {chunks}')
+    
+    ds = uds.ugrid.to_dataset()
+    ds = ds.chunk(chunks)
+    # drop netcdf encoding like chunksizes/zlib, since it conflicts with the zarr chunks
+    encoding_keep = ['_FillValue', 'dtype', 'units', 'calendar', 'scale_factor', 'add_offset']
+    for varn in ds.variables:
+        encoding = ds.variables[varn].encoding
+        ds.variables[varn].encoding = {key:encoding[key] for key in encoding_keep if key in encoding}
+    
+    if dimn_time not in ds.chunksizes:
+        ds.to_zarr(store, mode='w')
+        return
+    
+    # write per time chunk, only appending variables with a time dimension after the first chunk
+    ntimes = ds.sizes[dimn_time]
+    ntimes_chunk = ds.chunksizes[dimn_time][0]
+    varlist_notime = [varn for varn in ds.variables if dimn_time not in ds.variables[varn].dims]
+    for itime in range(0, ntimes, ntimes_chunk):
+        print(f'>> writing timesteps {itime+1}-{min(itime+ntimes_chunk, ntimes)} of {ntimes} to zarr: ',end='')
+        dtstart = dt.datetime.now()
+        ds_sel = ds.isel({dimn_time:slice(itime, itime+ntimes_chunk)})
+        if itime == 0:
+            ds_sel.to_zarr(store, mode='w')
+        else:
+            ds_sel.drop_vars(varlist_notime).to_zarr(store, append_dim=dimn_time)
+        print(f'{(dt.datetime.now()-dtstart).total_seconds():.2f} sec')
+
+
+def open_dataset_zarr(store:str, **kwargs) -> xu.UgridDataset:
+    """
+    Open a merged UGRID zarr store, like the ones written with dfmt.partitioned_map_to_zarr().
+
+    Parameters
+    ----------
+    store : str
+        Path to the zarr store.
+    **kwargs : TYPE
+        arguments that are passed to xr.open_zarr.
+
+    Returns
+    -------
+    uds : xu.UgridDataset
+        DESCRIPTION.
+
+    """
+    ds = xr.open_zarr(store, **kwargs)
+    remove_nan_fillvalue_attrs(ds)
+    uds = xu.UgridDataset(ds)
+    uds_auto_set_crs(uds)
+    return uds
+
+
+def _get_vertex_corner_offsets(vertices_x:np.ndarray, vertices_y:np.ndarray, max_samples:int = 10000):
+    """
+    Derive the (i,j) corner offset of each of the four vertex indices of a structured grid, from the vertices
+    that are shared by neighbouring cells. Returns an array with shape (2,4) with the offset in each of
+    the two ij dimensions, or None if the vertices do not have a consistent structured topology.
+    """
+    if vertices_x.ndim != 3 or vertices_x.shape[-1] != 4:
+        return None
+    offsets = np.full((2, 4), -1)
+    for axis in range(2):
+        if vertices_x.shape[axis] < 2:
+            return None
+        slice_lower = [slice(None), slice(None)]
+        slice_upper = [slice(None), slice(None)]
+        slice_lower[axis] = slice(None, -1)
+        slice_upper[axis] = slice(1, None)
+        # compare the vertices of a subset of cells with the vertices of their upper neighbour
+        nsamples = vertices_x[tuple(slice_lower)].size // 4
+        step = max(1, nsamples // max_samples)
+        x_lower, y_lower, x_upper, y_upper = [arr[tuple(slc)].reshape(-1,4)[::step] for arr, slc in
+                                              [(vertices_x, slice_lower), (vertices_y, slice_lower),
+                                               (vertices_x, slice_upper), (vertices_y, slice_upper)]]
+        fraction_shared = np.empty((4, 4))
+        for ivert_lower in range(4):
+            for ivert_upper in range(4):
+                bool_shared = ((x_lower[:,ivert_lower] == x_upper[:,ivert_upper]) &
+                               (y_lower[:,ivert_lower] == y_upper[:,ivert_upper]))
+                fraction_shared[ivert_lower, ivert_upper] = bool_shared.mean()
+        # the two vertices of the shared edge are on the upper side of the lower cell
+        ivert_lower, ivert_upper = np.nonzero(fraction_shared > 0.5)
+        if len(ivert_lower) != 2 or len(np.unique(ivert_lower)) != 2 or len(np.unique(ivert_upper)) != 2:
+            return None
+        offsets[axis, ivert_lower] = 1
+        offsets[axis, ivert_upper] = 0
+    if (offsets == -1).any() or len(np.unique(offsets[0]*2 + offsets[1])) != 4:
+        return None
+    return offsets
+
+
+def get_curvilinear_face_node_connectivity(vertices_x:np.ndarray, vertices_y:np.ndarray):
+    """
+    Derive unique nodes and the face_node_connectivity from the vertices of a curvilinear grid with shape (n_i, n_j, n_vertices).
+    The vertices are numbered via the (i,j) topology of the structured grid, only vertices that disagree with the
+    shared corner of their neighbours (like periodic seams, folds or land cells) get a separate node. Afterwards,
+    nodes with identical coordinates are merged with a hash table, so the numbering is equal to
+    np.unique(vertices, axis=0, return_inverse=True) but without sorting all vertices.
+
+    Parameters
+    ----------
+    vertices_x : np.ndarray
+        x-coordinates of the vertices with shape (n_i, n_j, n_vertices).
+    vertices_y : np.ndarray
+        y-coordinates of the vertices with shape (n_i, n_j, n_vertices).
+
+    Returns
+    -------
+    node_x : np.ndarray
+        x-coordinates of the unique nodes.
+    node_y : np.ndarray
+        y-coordinates of the unique nodes.
+    face_node_connectivity : np.ndarray
+        node numbers with the same shape as vertices_x.
+
+    """
+    n_i, n_j = vertices_x.shape[:2]
+    offsets = _get_vertex_corner_offsets(vertices_x, vertices_y)
+    if offsets is None:
+        # no structured topology, so all vertices are candidate nodes
+        candidate_x = vertices_x.ravel()
+        candidate_y = vertices_y.ravel()
+        candidate_index = np.arange(vertices_x.size).reshape(vertices_x.shape)
+    else:
+        # number of the corner on the (n_i+1, n_j+1) node lattice of each vertex
+        index_i = np.arange(n_i)[:,np.newaxis,np.newaxis] + offsets[0]
+        index_j = np.arange(n_j)[np.newaxis,:,np.newaxis] + offsets[1]
+        candidate_index = index_i * (n_j+1) + index_j
+        n_lattice = (n_i+1) * (n_j+1)
+        lattice_x = np.empty(n_lattice, dtype=vertices_x.dtype)
+        lattice_y = np.empty(n_lattice, dtype=vertices_y.dtype)
+        lattice_x[candidate_index] = vertices_x
+        lattice_y[candidate_index] = vertices_y
+        # vertices that differ from the lattice corner (also nan) get a separate candidate node
+        bool_disagree = ((lattice_x[candidate_index] != vertices_x) |
+                         (lattice_y[candidate_index] != vertices_y))
+        candidate_index[bool_disagree] = n_lattice + np.arange(bool_disagree.sum())
+        candidate_x = np.concatenate([lattice_x, vertices_x[bool_disagree]])
+        candidate_y = np.concatenate([lattice_y, vertices_y[bool_disagree]])
+        # drop lattice corners that are only used by disagreeing vertices
+        bool_used = np.zeros(len(candidate_x), dtype=bool)
+        bool_used[candidate_index] = True
+        candidate_index = (np.cumsum(bool_used) - 1)[candidate_index]
+        candidate_x = candidate_x[bool_used]
+        candidate_y = candidate_y[bool_used]
+    
+    # merge candidate nodes with identical coordinates (periodic seams, folds and collapsed cells), nan nodes are not merged
+    codes_x, uniq_x = pd.factorize(candidate_x)
+    codes_y, uniq_y = pd.factorize(candidate_y)
+    key_xy = codes_x.astype(np.int64) * len(uniq_y) + codes_y
+    bool_nan = (codes_x == -1) | (codes_y == -1)
+    key_xy[bool_nan] = -1 - np.arange(bool_nan.sum())
+    codes_xy, uniq_xy = pd.factorize(key_xy)
+    node_x = np.empty(len(uniq_xy), dtype=candidate_x.dtype)
+    node_y = np.empty(len(uniq_xy), dtype=candidate_y.dtype)
+    node_x[codes_xy] = candidate_x
+    node_y[codes_xy] = candidate_y
+    
+    # sort nodes on x and y, like np.unique
+    node_order = np.lexsort((node_y, node_x))
+    node_number = np.empty_like(node_order)
+    node_number[node_order] = np.arange(len(node_order))
+    face_node_connectivity = node_number[codes_xy][candidate_index]
+    return node_x[node_order], node_y[node_order], face_node_connectivity
+
+
+def ravel_ij_dims(var:xr.Variable, ij_sizes:dict, face_dim:str, bool_faces:np.ndarray = None) -> xr.Variable:
+    """
+    Lazily ravel the ij dimensions of a variable to a single face dimension (in ij_sizes order), as an alternative
+    to ds.stack() that avoids the MultiIndex and the stacking of all variables. Variables with only one of the
+    ij dimensions are broadcasted to all ij dimensions first. Optionally, only the faces in bool_faces are kept.
+    """
+    other_dims = [dim for dim in var.dims if dim not in ij_sizes]
+    var = var.set_dims({**var.sizes, **ij_sizes}).transpose(*other_dims, *ij_sizes)
+    data = var.data.reshape(var.shape[:len(other_dims)] + (-1,))
+    if bool_faces is not None:
+        data = _compress_last_axis(data, bool_faces)
+    var_faces = xr.Variable(other_dims + [face_dim], data, attrs=var.attrs, encoding=var.encoding)
+    return var_faces
+
+
+def _compress_last_axis(data, bool_keep:np.ndarray):
+    """
+    Equal to data[..., bool_keep] but for dask arrays it is applied per chunk, which is much faster
+    than dask boolean indexing and preserves the chunks of all other dimensions.
+    """
+    if not isinstance(data, dask.array.Array):
+        return data[..., bool_keep]
+    bounds = np.cumsum((0,) + data.chunks[-1])
+    chunks_out = data.chunks[:-1] + (tuple(int(bool_keep[start:stop].sum()) for start, stop in zip(bounds[:-1], bounds[1:])),)
+    
+    def compress_block(block, block_info=None):
+        start, stop = block_info[0]['array-location'][-1]
+        return block[..., bool_keep[start:stop]]
+    
+    return data.map_blocks(compress_block, chunks=chunks_out, dtype=data.dtype)
+
+
+def get_edge_connectivity(face_node_connectivity:np.ndarray, n_node:int):
+    """
+    Derive the edge_node_connectivity and face_edge_connectivity from a face_node_connectivity (with fillvalue -1).
+    The result is equal to xugrid.ugrid.connectivity.edge_connectivity(), but the unique edges are found with a hash
+    table instead of np.unique(axis=0) on all face edges, which is slow for large grids.
+    """
+    bool_valid = face_node_connectivity != -1
+    # close the polygons, fillvalues are replaced by the first node
+    closed = np.where(bool_valid, face_node_connectivity, face_node_connectivity[:,:1])
+    closed = np.c_[closed, closed[:,0]]
+    face_edges = np.stack([closed[:,:-1].ravel(), closed[:,1:].ravel()], axis=1)
+    face_edges = face_edges[face_edges[:,0] != face_edges[:,1]]
+    face_edges.sort(axis=1)
+    
+    edge_key = face_edges[:,0].astype(np.int64) * n_node + face_edges[:,1]
+    codes, uniq_key = pd.factorize(edge_key)
+    # sort edges on node numbers, like np.unique
+    edge_order = np.argsort(uniq_key)
+    edge_number = np.empty_like(edge_order)
+    edge_number[edge_order] = np.arange(len(edge_order))
+    edge_node_connectivity = np.stack([uniq_key[edge_order] // n_node, uniq_key[edge_order] % n_node], axis=1)
+    face_edge_connectivity = np.full(face_node_connectivity.shape, -1, dtype=np.int64)
+    face_edge_connectivity[bool_valid] = edge_number[codes]
+    return edge_node_connectivity, face_edge_connectivity
+
+
 def open_dataset_curvilinear(file_nc,
                              varn_lon='longitude',
                              varn_lat='latitude',
@@ -282,6 +828,7 @@ def open_dataset_curvilinear(file_nc,
                              varn_vert_lat='vertices_latitude', #'grid_y'
                              ij_dims=['i','j'], #['N','M']
                              convert_360to180=False,
+                             access_pattern='snapshot',
                              **kwargs):
     """
     This is a first version of a function that creates a xugrid UgridDataset from a curvilinear dataset like CMCC. Curvilinear means in this case 2D lat/lon variables and i/j indexing. The CMCC dataset does contain vertices, which is essential for conversion to ugrid.
@@ -290,36 +837,27 @@ def open_dataset_curvilinear(file_nc,
     # TODO: maybe get varn_lon/varn_lat automatically with cf-xarray (https://github.com/xarray-contrib/cf-xarray)
     
     if 'chunks' not in kwargs:
-        kwargs['chunks'] = {'time':1}
+        kwargs['chunks'] = get_chunks(file_nc, access_pattern=access_pattern)
     
     # data_vars='minimal' to avoid time dimension on vertices_latitude and others when opening multiple files at once
     ds = xr.open_mfdataset(file_nc, data_vars="minimal", **kwargs)
     
     print('>> getting vertices from ds: ',end='')
     dtstart = dt.datetime.now()
-    vertices_longitude = ds.variables[varn_vert_lon].to_numpy()
-    vertices_longitude = vertices_longitude.reshape(-1,vertices_longitude.shape[-1])
-    vertices_latitude = ds.variables[varn_vert_lat].to_numpy()
-    vertices_latitude = vertices_latitude.reshape(-1,vertices_latitude.shape[-1])
+    # vertices in the same i/j order as the faces of the resulting dataset
+    vertices_longitude = ds.variables[varn_vert_lon].transpose(*ij_dims,...).to_numpy()
+    vertices_latitude = ds.variables[varn_vert_lat].transpose(*ij_dims,...).to_numpy()
     print(f'{(dt.datetime.now()-dtstart).total_seconds():.2f} sec')
     
     # convert from 0to360 to -180 to 180
     if convert_360to180:
         vertices_longitude = (vertices_longitude+180) % 360 - 180
     
-    # face_xy = np.stack([longitude,latitude],axis=-1)
-    # face_coords_x, face_coords_y = face_xy.T
-    #a,b = np.unique(face_xy,axis=0,return_index=True) #TODO: there are non_unique face_xy values, inconvenient
-    face_xy_vertices = np.stack([vertices_longitude,vertices_latitude],axis=-1)
-    face_xy_vertices_flat = face_xy_vertices.reshape(-1,2)
-    uniq,inv = np.unique(face_xy_vertices_flat, axis=0, return_inverse=True)
-    #len(uniq) = 104926 >> amount of unique node coords
-    #uniq.max() = 359.9654541015625 >> node_coords_xy
-    #len(inv) = 422816 >> is length of face_xy_vertices.reshape(-1,2)
-    #inv.max() = 104925 >> node numbers
-    node_coords_x, node_coords_y = uniq.T
-    
-    face_node_connectivity = inv.reshape(face_xy_vertices.shape[:2]) #fnc.max() = 104925
+    print('>> deriving nodes from structured vertices: ',end='')
+    dtstart = dt.datetime.now()
+    node_coords_x, node_coords_y, face_node_connectivity = get_curvilinear_face_node_connectivity(vertices_longitude, vertices_latitude)
+    face_node_connectivity = face_node_connectivity.reshape(-1,face_node_connectivity.shape[-1])
+    print(f'{(dt.datetime.now()-dtstart).total_seconds():.2f} sec')
     
     #remove all faces that have only 1 unique node (does not result in a valid grid) #TODO: not used yet except for print
     fnc_all_duplicates = (face_node_connectivity.T==face_node_connectivity[:,0]).all(axis=0)
@@ -333,24 +871,39 @@ def open_dataset_curvilinear(file_nc,
     print(f'WARNING: dropping {fnc_has_duplicates.sum()} faces with duplicate nodes ({fnc_all_duplicates.sum()} with one unique node)')
     face_node_connectivity = face_node_connectivity[bool_combined]
     
+    # derive the edges with a hash table, instead of sorting all face edges upon xu.UgridDataset init
+    # the face_edge_connectivity is derived by xugrid only when it is needed
+    print('>> deriving edges: ',end='')
+    dtstart = dt.datetime.now()
+    edge_node_connectivity, _ = get_edge_connectivity(face_node_connectivity, len(node_coords_x))
+    print(f'{(dt.datetime.now()-dtstart).total_seconds():.2f} sec')
+    
     grid = xu.Ugrid2d(node_x=node_coords_x,
                       node_y=node_coords_y,
                       face_node_connectivity=face_node_connectivity,
+                      edge_node_connectivity=edge_node_connectivity,
                       fill_value=-1,
                       )
     
-    print('>> stacking ds i/j coordinates: ',end='') #fast
+    print('>> raveling ds i/j dimensions to faces: ',end='') #fast
     dtstart = dt.datetime.now()
     face_dim = grid.face_dimension
-    # TODO: lev/time bnds are dropped, avoid this. maybe stack initial dataset since it would also simplify the rest of the function a bit
-    ds_stacked = ds.stack({face_dim:ij_dims}).sel({face_dim:bool_combined})
     latlon_vars = [varn_lon, varn_lat, varn_vert_lon, varn_vert_lat]
-    ds_stacked = ds_stacked.drop_vars(ij_dims + latlon_vars)
+    ds = ds.drop_vars(latlon_vars + ij_dims, errors='ignore')
+    ij_sizes = {dim:ds.sizes[dim] for dim in ij_dims}
+    variables = {}
+    for varn, var in ds.variables.items():
+        if set(ij_dims).intersection(var.dims):
+            var = ravel_ij_dims(var, ij_sizes=ij_sizes, face_dim=face_dim, bool_faces=bool_combined)
+        variables[varn] = var
+    ds_faces = xr.Dataset(data_vars={varn:variables[varn] for varn in ds.data_vars},
+                          coords={varn:variables[varn] for varn in ds.coords},
+                          attrs=ds.attrs)
     print(f'{(dt.datetime.now()-dtstart).total_seconds():.2f} sec')
     
-    print('>> init uds: ',end='') #long
+    print('>> init uds: ',end='')
     dtstart = dt.datetime.now()
-    uds = xu.UgridDataset(ds_stacked,grids=[grid])
+    uds = xu.UgridDataset(ds_faces,grids=[grid])
     print(f'{(dt.datetime.now()-dtstart).total_seconds():.2f} sec')
     
     # drop 0-area cells (relevant for CMCC global datasets)
@@ -378,55 +931,31 @@ def get_delft3d4_nanmask(x,y):
     return bool_mask
 
 
-def open_dataset_delft3d4(file_nc, **kwargs):
-    
-    if 'chunks' not in kwargs:
-        kwargs['chunks'] = {'time':1}
-    
-    ds = xr.open_dataset(file_nc, **kwargs)
-    
-    if ('U1' in ds.data_vars) and ('V1' in ds.data_vars):
-        #mask u and v separately with 0 to avoid high velocities (cannot be nan, since (nan+value)/2= nan instead of value=2
-        mask_u1 = (ds.U1==-999) | (ds.U1==-999.999)
-        mask_v1 = (ds.V1==-999) | (ds.V1==-999.999)
-        u1_mn = ds.U1.where(~mask_u1,0)
-        v1_mn = ds.V1.where(~mask_v1,0)
-        
-        #create combined uv mask (have to rename dimensions)
-        mask_u1_mn = mask_u1.rename({'MC':'M'})
-        mask_v1_mn = mask_v1.rename({'NC':'N'})
-        mask_uv1_mn = mask_u1_mn & mask_v1_mn
-
-        #average U1/V1 values to M/N
-        u1_mn = (u1_mn + u1_mn.shift(MC=1))/2 #TODO: or MC=-1
-        u1_mn = u1_mn.rename({'MC':'M'})
-        u1_mn = u1_mn.where(~mask_uv1_mn,np.nan) #replace temporary zeros with nan
-        v1_mn = (v1_mn + v1_mn.shift(NC=1))/2 #TODO: or NC=-1
-        v1_mn = v1_mn.rename({'NC':'N'})
-        v1_mn = v1_mn.where(~mask_uv1_mn,np.nan) #replace temporary zeros with nan
-        ds = ds.drop_vars(['U1','V1']) #to avoid creating large chunks, alternative is to overwrite the vars with the MN-averaged vars, but it requires passing and updating of attrs
-        
-        #compute ux/uy/umag/udir #TODO: add attrs to variables
-        alfas_rad = np.deg2rad(ds.ALFAS)
-        vel_x = u1_mn*np.cos(alfas_rad) - v1_mn*np.sin(alfas_rad)
-        vel_y = u1_mn*np.sin(alfas_rad) + v1_mn*np.cos(alfas_rad)
-        ds['ux'] = vel_x
-        ds['uy'] = vel_y
-        ds['umag'] = np.sqrt(vel_x**2 + vel_y**2)
-        ds['udir'] = np.rad2deg(np.arctan2(vel_y, vel_x))%360
-    
-    mn_slice = slice(1,None)
-    ds = ds.isel(M=mn_slice,N=mn_slice) #cut off first values of M/N (centers), since they are fillvalues and should have different size than MC/NC (corners)
+DELFT3D4_GRID_CACHE = {}
+DELFT3D4_GRID_CACHE_MAXSIZE = 8
+
+
+def get_delft3d4_grid(xcor:np.ndarray, ycor:np.ndarray, grid_attrs:dict = None):
+    """
+    Get the Ugrid2d and a boolean of the faces with four valid nodes from the XCOR/YCOR corner coordinates
+    of a Delft3D4 trim file, the faces are in the order of the raveled (M,N) dimensions of the cell centers.
+    It is cached on the corner coordinates, so it is only derived once per grid. Copies of the cached
+    grid are returned, so modifying the grid (for instance setting the crs) does not alter the cache.
+    """
+    if grid_attrs is None:
+        grid_attrs = {}
+    hash_xy = hashlib.sha1(np.ascontiguousarray(xcor))
+    hash_xy.update(np.ascontiguousarray(ycor))
+    key = (xcor.shape, hash_xy.hexdigest(), json.dumps(grid_attrs, sort_keys=True))
+    if key in DELFT3D4_GRID_CACHE:
+        grid, keep_faces_bool = DELFT3D4_GRID_CACHE[key]
+        return grid.copy(), keep_faces_bool.copy()
     
     #find and set nans in XCOR/YCOR arrays
-    mask_xy = get_delft3d4_nanmask(ds.XCOR,ds.YCOR) #-999.999 in kivu and 0.0 in curvedbend, both in westernscheldt
-    ds['XCOR'] = ds.XCOR.where(~mask_xy)
-    ds['YCOR'] = ds.YCOR.where(~mask_xy)
-
-    #convert to ugrid
-    node_coords_x = ds.XCOR.to_numpy().ravel()
-    node_coords_y = ds.YCOR.to_numpy().ravel()
-    xcor_shape = ds.XCOR.shape
+    mask_xy = get_delft3d4_nanmask(xcor,ycor) #-999.999 in kivu and 0.0 in curvedbend, both in westernscheldt
+    node_coords_x = np.where(mask_xy, np.nan, xcor).ravel()
+    node_coords_y = np.where(mask_xy, np.nan, ycor).ravel()
+    xcor_shape = xcor.shape
     xcor_nvals = xcor_shape[0] * xcor_shape[1]
     
     #remove weird outlier values in kivu model
@@ -454,42 +983,554 @@ def open_dataset_delft3d4(file_nc, **kwargs):
     
     face_node_connectivity = face_node_connectivity[keep_faces_bool]
     
+    # derive the edges with a hash table, instead of sorting all face edges
+    # the face_edge_connectivity is derived by xugrid only when it is needed
+    edge_node_connectivity, _ = get_edge_connectivity(face_node_connectivity, len(node_coords_x))
+    
     grid = xu.Ugrid2d(node_x=node_coords_x,
                       node_y=node_coords_y,
                       face_node_connectivity=face_node_connectivity,
+                      edge_node_connectivity=edge_node_connectivity,
                       fill_value=-1,
                       )
     
-    face_dim = grid.face_dimension
-    ds_stacked = ds.stack({face_dim:('M','N')}).sel({face_dim:keep_faces_bool})
-    ds_stacked = ds_stacked.drop_vars(['M','N','mesh2d_nFaces'])
-    uds = xu.UgridDataset(ds_stacked,grids=[grid]) 
+    # set grid attrs like vertical dimensions via the dataset
+    # TODO: would be more convenient to do within xu.Ugrid2d(): https://github.com/Deltares/xugrid/issues/195#issuecomment-2111841390
+    if grid_attrs:
+        ds_grid = grid.to_dataset()
+        ds_grid[grid.name] = ds_grid[grid.name].assign_attrs(grid_attrs)
+        grid = xu.Ugrid2d.from_dataset(ds_grid)
+    
+    if len(DELFT3D4_GRID_CACHE) >= DELFT3D4_GRID_CACHE_MAXSIZE:
+        DELFT3D4_GRID_CACHE.pop(next(iter(DELFT3D4_GRID_CACHE)))
+    DELFT3D4_GRID_CACHE[key] = (grid, keep_faces_bool)
+    return grid.copy(), keep_faces_bool.copy()
+
+
+def _delft3d4_velocity_block(u1:np.ndarray, v1:np.ndarray, alfas:np.ndarray) -> np.ndarray:
+    """
+    Derive the velocity in x/y direction in the cell centers from the U1/V1 velocities (in M/N direction)
+    of a Delft3D4 trim file. The last two axes of u1/v1/alfas are (MC,N), (M,NC) and (M,N) and should not be chunked.
+    The first cell centers are skipped, since they are fillvalues. ux and uy are stacked in a new first axis.
+    """
+    #mask u and v separately with 0 to avoid high velocities (cannot be nan, since (nan+value)/2= nan instead of value=2
+    mask_u1 = (u1==-999) | (u1==-999.999)
+    mask_v1 = (v1==-999) | (v1==-999.999)
+    u1 = np.where(mask_u1, 0, u1)
+    v1 = np.where(mask_v1, 0, v1)
+    
+    #average U1/V1 values to M/N and replace temporary zeros with nan where both are masked
+    mask_uv1_mn = mask_u1[...,1:,1:] & mask_v1[...,1:,1:]
+    u1_mn = (u1[...,1:,1:] + u1[...,:-1,1:])/2 #TODO: or MC=-1
+    v1_mn = (v1[...,1:,1:] + v1[...,1:,:-1])/2 #TODO: or NC=-1
+    u1_mn = np.where(mask_uv1_mn, np.nan, u1_mn)
+    v1_mn = np.where(mask_uv1_mn, np.nan, v1_mn)
+    
+    alfas_rad = np.deg2rad(alfas[1:,1:])
+    vel_x = u1_mn*np.cos(alfas_rad) - v1_mn*np.sin(alfas_rad)
+    vel_y = u1_mn*np.sin(alfas_rad) + v1_mn*np.cos(alfas_rad)
+    return np.stack([vel_x, vel_y])
+
+
+def get_delft3d4_velocities(ds:xr.Dataset) -> xr.Dataset:
+    """
+    Lazily derive ux/uy/umag/udir in the cell centers (without the first M/N) from U1/V1/ALFAS of a Delft3D4 trim file.
+    For dask arrays, the velocities are derived blockwise per chunk of the other dimensions (like time),
+    so they are only computed when the variables are accessed.
+    """
+    u1 = ds.U1.transpose(...,'MC','N')
+    v1 = ds.V1.transpose(*u1.dims[:-2],'M','NC')
+    alfas = ds.ALFAS.transpose('M','N').to_numpy()
+    other_dims = u1.dims[:-2]
+    
+    if isinstance(u1.data, dask.array.Array):
+        u1_data = u1.data.rechunk({-2:-1, -1:-1})
+        v1_data = dask.array.asarray(v1.data).rechunk(u1_data.chunks[:-2] + (-1,-1))
+        chunks_out = ((2,),) + u1_data.chunks[:-2] + ((u1.shape[-2]-1,), (u1.shape[-1]-1,))
+        vel_xy = dask.array.map_blocks(_delft3d4_velocity_block, u1_data, v1_data, alfas=alfas,
+                                       new_axis=0, chunks=chunks_out, dtype=np.result_type(u1.dtype, v1.dtype, alfas.dtype))
+    else:
+        vel_xy = _delft3d4_velocity_block(u1.to_numpy(), v1.to_numpy(), alfas=alfas)
+    
+    #compute ux/uy/umag/udir #TODO: add attrs to variables
+    dims = other_dims + ('M','N')
+    vel_x = xr.DataArray(vel_xy[0], dims=dims)
+    vel_y = xr.DataArray(vel_xy[1], dims=dims)
+    ds_vel = xr.Dataset()
+    ds_vel['ux'] = vel_x
+    ds_vel['uy'] = vel_y
+    ds_vel['umag'] = np.sqrt(vel_x**2 + vel_y**2)
+    ds_vel['udir'] = np.rad2deg(np.arctan2(vel_y, vel_x))%360
+    return ds_vel
+
+
+def open_dataset_delft3d4(file_nc, access_pattern='snapshot', **kwargs):
     
-    uds = uds.drop_vars(['XCOR','YCOR','grid'])
-    uds = uds.drop_dims(['MC','NC']) #clean up dataset by dropping corner dims (drops also variabes with U/V masks and U/V/C bedlevel)
+    if 'chunks' not in kwargs:
+        kwargs['chunks'] = get_chunks(file_nc, access_pattern=access_pattern)
     
-    # convert to xarray.Dataset to update/remove attrs
-    ds_temp = uds.ugrid.to_dataset()
+    ds = xr.open_dataset(file_nc, **kwargs)
     
-    # set vertical dimensions attr
-    # TODO: would be more convenient to do within xu.Ugrid2d(): https://github.com/Deltares/xugrid/issues/195#issuecomment-2111841390
+    print('>> deriving grid from XCOR/YCOR: ',end='')
+    dtstart = dt.datetime.now()
     grid_attrs = {"vertical_dimensions": ds.grid.attrs["vertical_dimensions"]}
-    ds_temp["mesh2d"] = ds_temp["mesh2d"].assign_attrs(grid_attrs)
-
+    grid, keep_faces_bool = get_delft3d4_grid(ds.XCOR.to_numpy(), ds.YCOR.to_numpy(), grid_attrs=grid_attrs)
+    print(f'{(dt.datetime.now()-dtstart).total_seconds():.2f} sec')
+    
+    if ('U1' in ds.data_vars) and ('V1' in ds.data_vars):
+        ds_vel = get_delft3d4_velocities(ds)
+    else:
+        ds_vel = xr.Dataset()
+    
+    # clean up dataset by dropping grid variables and variables on corner dims (U/V masks and U/V/C bedlevel)
+    corner_vars = [varn for varn in ds.variables if set(['MC','NC']).intersection(ds.variables[varn].dims)]
+    ds = ds.drop_vars(corner_vars + ['grid'])
+    
+    mn_slice = slice(1,None)
+    ds = ds.isel(M=mn_slice,N=mn_slice) #cut off first values of M/N (centers), since they are fillvalues and should have different size than MC/NC (corners)
+    ds = ds.drop_vars(['M','N'], errors='ignore')
+    ds = ds.assign(ds_vel)
+    
+    # ravel the M/N dimensions of the cell centers to faces per variable, instead of stacking the entire dataset
+    face_dim = grid.face_dimension
+    mn_sizes = {'M':ds.sizes['M'], 'N':ds.sizes['N']}
+    variables = {}
+    for varn, var in ds.variables.items():
+        if set(mn_sizes).intersection(var.dims):
+            var = ravel_ij_dims(var, ij_sizes=mn_sizes, face_dim=face_dim, bool_faces=keep_faces_bool)
+        variables[varn] = var
+    ds_faces = xr.Dataset(data_vars={varn:variables[varn] for varn in ds.data_vars},
+                          coords={varn:variables[varn] for varn in ds.coords},
+                          attrs=ds.attrs)
+    
     # drop attrs pointing to the removed grid variable (topology is now in mesh2d)
-    # TODO: this is not possible on the xu.UgridDataset directly
-    for varn in ds_temp.data_vars:
-        if "grid" in ds_temp[varn].attrs.keys():
-            del ds_temp[varn].attrs["grid"]
-
-    uds = xu.UgridDataset(ds_temp)
+    for varn in ds_faces.data_vars:
+        if "grid" in ds_faces[varn].attrs.keys():
+            del ds_faces[varn].attrs["grid"]
     
+    # add node coordinates like in datasets opened from ugrid files
+    node_coords = grid.attrs["node_coordinates"].split()
+    ds_faces = ds_faces.assign_coords(grid.to_dataset()[node_coords].variables)
+    
+    uds = xu.UgridDataset(ds_faces,grids=[grid])
     return uds
 
 
+GRID_KEY_CACHE = weakref.WeakKeyDictionary()
+
+
+def get_grid_key(grid:xu.Ugrid2d) -> str:
+    """
+    Hash of the node coordinates and face_node_connectivity, which identifies the topology of a grid.
+    The hash is stored per grid object (as long as the grid exists), so the arrays are only hashed
+    once per grid. The topology of a grid is assumed not to be modified inplace after the first call.
+    """
+    key = GRID_KEY_CACHE.get(grid)
+    if key is None:
+        sha = hashlib.sha1()
+        for array in [grid.node_x, grid.node_y, grid.face_node_connectivity]:
+            sha.update(np.ascontiguousarray(array).tobytes())
+        key = sha.hexdigest()
+        GRID_KEY_CACHE[grid] = key
+    return key
+
+
+# bounding box prefilter settings for FaceLocator.intersect_edges()
+PREFILTER_MAX_EDGES = 100
+PREFILTER_MAX_FRACTION = 0.25
+# number of located point sets and prefiltered celltrees stored per FaceLocator
+FACE_INDEX_CACHE_MAXSIZE = 4
+
+
+class FaceLocator:
+    """
+    Reusable spatial index (celltree) of a Ugrid2d to locate points and intersect edges with faces.
+    The celltree is built once and the face indices of the last few located point sets are stored, so
+    repeated searches on the same grid (for instance for multiple quantities) are only done once.
+    As long as the celltree of the entire grid is not built, edges are intersected via a bounding box
+    prefilter: only the faces with bounding boxes overlapping the edges are put in a (small) celltree.
+    The last few of these celltrees are stored for reuse. Once the prefiltered celltrees together
+    contained as many faces as the grid, the celltree of the entire grid is built and used instead.
+    Use dfmt.get_face_locator() to get a cached FaceLocator for a grid.
+    """
+    def __init__(self, grid:xu.Ugrid2d):
+        self.grid = grid
+        self.key = get_grid_key(grid)
+        self._celltree = None
+        self._face_bounds = None
+        self._face_index_cache = {}
+        self._celltree_subset_cache = {}
+        self._celltree_subset_nfaces = 0
+    
+    @property
+    def celltree(self):
+        """
+        Celltree of the entire grid, built upon first use.
+        """
+        if self._celltree is None:
+            self._celltree = self.grid.celltree
+        return self._celltree
+    
+    @property
+    def face_bounds(self):
+        """
+        Bounding boxes (xmin, ymin, xmax, ymax) of all faces, derived upon first use.
+        """
+        if self._face_bounds is None:
+            self._face_bounds = self.grid.face_bounds
+        return self._face_bounds
+    
+    def locate_points(self, xy:np.ndarray) -> np.ndarray:
+        """
+        Find in which face the points with shape (n_points, 2) are located, -1 for points outside of the grid.
+        """
+        xy = np.ascontiguousarray(xy, dtype=np.float64)
+        xy_key = hashlib.sha1(xy.tobytes()).hexdigest()
+        if xy_key in self._face_index_cache:
+            # move to the end, so the least recently used face indices are removed first
+            face_index = self._face_index_cache.pop(xy_key)
+        else:
+            if len(self._face_index_cache) >= FACE_INDEX_CACHE_MAXSIZE:
+                self._face_index_cache.pop(next(iter(self._face_index_cache)))
+            face_index = self.celltree.locate_points(xy)
+        self._face_index_cache[xy_key] = face_index
+        return face_index.copy()
+    
+    def get_faces_in_edges_bbox(self, edges:np.ndarray) -> np.ndarray:
+        """
+        Indices of the faces with a bounding box that overlaps the bounding box of at least one of the edges.
+        For many edges, the bounding box of all edges is used instead.
+        """
+        edges_min = edges.min(axis=1)
+        edges_max = edges.max(axis=1)
+        if len(edges) > PREFILTER_MAX_EDGES:
+            edges_min = edges_min.min(axis=0, keepdims=True)
+            edges_max = edges_max.max(axis=0, keepdims=True)
+        xmin, ymin, xmax, ymax = self.face_bounds.T
+        bool_overlap = np.zeros(len(xmin), dtype=bool)
+        for (edge_xmin, edge_ymin), (edge_xmax, edge_ymax) in zip(edges_min, edges_max):
+            bool_overlap |= (xmax >= edge_xmin) & (xmin <= edge_xmax) & (ymax >= edge_ymin) & (ymin <= edge_ymax)
+        return np.flatnonzero(bool_overlap)
+    
+    def intersect_edges(self, edges:np.ndarray, prefilter:bool = True):
+        """
+        Find which faces are crossed by edges with shape (n_edges, 2, 2) and compute the intersections,
+        like xu.Ugrid2d.intersect_edges(). If the celltree of the entire grid is not yet built and the
+        edges only overlap a small part of the grid, a celltree of the overlapping faces is used instead.
+        """
+        edges = np.ascontiguousarray(edges, dtype=np.float64)
+        if prefilter and self._celltree is None and self._celltree_subset_nfaces < self.grid.n_face:
+            face_candidates = self.get_faces_in_edges_bbox(edges)
+            if len(face_candidates) == 0:
+                return np.array([], dtype=int), np.array([], dtype=int), np.empty((0,2,2))
+            if len(face_candidates) <= PREFILTER_MAX_FRACTION * self.grid.n_face:
+                celltree_subset = self.get_celltree_subset(face_candidates)
+                edge_index, face_index, intersections = celltree_subset.intersect_edges(edges)
+                return edge_index, face_candidates[face_index], intersections
+        return self.celltree.intersect_edges(edges)
+    
+    def get_celltree_subset(self, face_candidates:np.ndarray):
+        """
+        Celltree of a subset of the faces, the last few are stored so repeated intersections
+        with the same (or nearby) edges do not build the celltree again.
+        """
+        face_key = hashlib.sha1(face_candidates.tobytes()).hexdigest()
+        if face_key in self._celltree_subset_cache:
+            # move to the end, so the least recently used celltree is removed first
+            celltree_subset = self._celltree_subset_cache.pop(face_key)
+        else:
+            if len(self._celltree_subset_cache) >= FACE_INDEX_CACHE_MAXSIZE:
+                self._celltree_subset_cache.pop(next(iter(self._celltree_subset_cache)))
+            # nodes are not renumbered, so the subset grid is cheap to construct
+            face_node_connectivity = self.grid.face_node_connectivity[face_candidates]
+            grid_subset = xu.Ugrid2d(self.grid.node_x, self.grid.node_y, xu.constants.FILL_VALUE, face_node_connectivity)
+            celltree_subset = grid_subset.celltree
+            self._celltree_subset_nfaces += len(face_candidates)
+        self._celltree_subset_cache[face_key] = celltree_subset
+        return celltree_subset
+    
+    def check_grid(self, grid:xu.Ugrid2d):
+        """
+        Raise a ValueError if the topology of the grid does not match the topology of the FaceLocator,
+        since the face indices would then refer to the faces of another grid.
+        """
+        if grid is not self.grid and get_grid_key(grid) != self.key:
+            raise ValueError("the topology of the grid does not match the topology of the FaceLocator")
+
+
+FACE_LOCATOR_CACHE = {}
+FACE_LOCATOR_CACHE_MAXSIZE = 4
+
+
+def get_face_locator(grid:xu.Ugrid2d) -> FaceLocator:
+    """
+    Get a FaceLocator for a grid, it is cached on the topology of the grid so it is reused for
+    grids with identical node coordinates and face_node_connectivity, also if the grids are
+    different objects because the dataset was opened again. The topology is only hashed upon
+    the first call for a grid object.
+
+    Parameters
+    ----------
+    grid : xu.Ugrid2d
+        Grid to locate points in and intersect edges with, for instance uds.grid.
+
+    Returns
+    -------
+    face_locator : FaceLocator
+        Reusable spatial index of the grid, with a celltree that is built upon first use.
+
+    """
+    key = get_grid_key(grid)
+    if key not in FACE_LOCATOR_CACHE:
+        if len(FACE_LOCATOR_CACHE) >= FACE_LOCATOR_CACHE_MAXSIZE:
+            # remove the oldest face locator to limit memory usage
+            FACE_LOCATOR_CACHE.pop(next(iter(FACE_LOCATOR_CACHE)))
+        FACE_LOCATOR_CACHE[key] = FaceLocator(grid)
+    face_locator = FACE_LOCATOR_CACHE[key]
+    return face_locator
+
+
+CONNECTIVITY_MATRIX_CACHE = {}
+CONNECTIVITY_MATRIX_CACHE_MAXSIZE = 16
+
+
+def get_connectivity_matrix(connectivity:np.ndarray, n_columns:int) -> scipy.sparse.csr_matrix:
+    """
+    Get a sparse matrix with ones for all valid entries of a connectivity array like face_node_connectivity,
+    with a row per row of the connectivity and a column per connected node/edge/face (fillvalues -1 are skipped).
+    It is cached on the connectivity, so it is only constructed once per grid.
+    """
+    key = (n_columns, connectivity.shape, hashlib.sha1(np.ascontiguousarray(connectivity)).hexdigest())
+    if key not in CONNECTIVITY_MATRIX_CACHE:
+        if len(CONNECTIVITY_MATRIX_CACHE) >= CONNECTIVITY_MATRIX_CACHE_MAXSIZE:
+            CONNECTIVITY_MATRIX_CACHE.pop(next(iter(CONNECTIVITY_MATRIX_CACHE)))
+        n_rows = connectivity.shape[0]
+        row_index = np.repeat(np.arange(n_rows), connectivity.shape[1]).reshape(connectivity.shape)
+        bool_valid = connectivity != -1
+        data = np.ones(bool_valid.sum())
+        matrix = scipy.sparse.csr_matrix((data, (row_index[bool_valid], connectivity[bool_valid])),
+                                         shape=(n_rows, n_columns))
+        CONNECTIVITY_MATRIX_CACHE[key] = matrix
+    return CONNECTIVITY_MATRIX_CACHE[key]
+
+
+def _sparse_sum_count_block(block:np.ndarray, matrix:scipy.sparse.csr_matrix) -> np.ndarray:
+    """
+    Weighted sum and sum of weights of the non-nan values of the last axis of block with a sparse
+    (target x source) matrix, for all other axes at once. The sum and count are stacked in a new first axis.
+    """
+    shape = block.shape
+    values = np.ascontiguousarray(block.reshape(-1, shape[-1]).T)
+    bool_nan = np.isnan(values) if values.dtype.kind == 'f' else np.zeros((), dtype=bool)
+    if bool_nan.any():
+        target_sum = matrix.dot(np.where(bool_nan, 0, values))
+        target_count = matrix.dot((~bool_nan).astype(np.float64))
+    else:
+        target_sum = matrix.dot(values)
+        target_count = np.broadcast_to(matrix.sum(axis=1), target_sum.shape)
+    result = np.stack([target_sum.T, target_count.T])
+    return result.reshape((2,) + shape[:-1] + (matrix.shape[0],))
+
+
+def _sparse_sum_count(arr, matrix:scipy.sparse.csr_matrix):
+    """
+    Apply _sparse_sum_count_block to a numpy or dask array. For dask arrays, it is applied blockwise per chunk
+    of the last (source) dimension with the corresponding columns of the matrix and the results are summed,
+    so the source dimension does not have to be rechunked and the time/layer chunks are preserved.
+    """
+    if not isinstance(arr, dask.array.Array):
+        return _sparse_sum_count_block(arr, matrix)
+    
+    bounds = np.cumsum((0,) + arr.chunks[-1])
+    chunks_out = ((2,),) + arr.chunks[:-1] + ((matrix.shape[0],),)
+    result = None
+    for iblock in range(len(arr.chunks[-1])):
+        arr_block = arr.blocks[(slice(None),)*(arr.ndim-1) + (iblock,)]
+        matrix_block = matrix[:, bounds[iblock]:bounds[iblock+1]]
+        result_block = arr_block.map_blocks(_sparse_sum_count_block, matrix_block, new_axis=0,
+                                            chunks=chunks_out, dtype=np.float64)
+        result = result_block if result is None else result + result_block
+    return result
+
+
+def sparse_weighted_mean(arr, matrix:scipy.sparse.csr_matrix):
+    """
+    Weighted mean of the last (source) axis of a numpy or dask array with a sparse (target x source)
+    weight matrix, nan values are skipped. Targets without any non-nan source value are nan.
+    """
+    sum_count = _sparse_sum_count(arr, matrix)
+    if isinstance(sum_count, dask.array.Array):
+        # divide per chunk, since the errstate context is not applied to lazy computations
+        return sum_count.map_blocks(_divide_sum_count, drop_axis=0, dtype=np.float64)
+    return _divide_sum_count(sum_count)
+
+
+def _divide_sum_count(sum_count:np.ndarray) -> np.ndarray:
+    with np.errstate(invalid='ignore', divide='ignore'):
+        result = sum_count[0] / sum_count[1]
+    return result
+
+
+class LocationRegridder:
+    """
+    Regridding of ugrid variables between the node, edge and face locations of a grid, by averaging the
+    values of all connected source nodes/edges/faces of each target node/edge/face. The sparse operators
+    are constructed once per location pair and applied lazily per chunk of the source dimension.
+    
+    Examples
+    --------
+    >>> regridder = dfmt.LocationRegridder(uds.grid)
+    >>> uda_node = regridder.regrid(uds['mesh2d_s1'], target='node', weights='area')
+    """
+    
+    LOCATIONS = ['node', 'edge', 'face']
+    
+    def __init__(self, grid:xu.Ugrid2d):
+        self.grid = grid
+        self._operators = {}
+    
+    def get_dimension(self, location:str) -> str:
+        dimensions = {'node': self.grid.node_dimension,
+                      'edge': self.grid.edge_dimension,
+                      'face': self.grid.face_dimension}
+        return dimensions[location]
+    
+    def get_source_location(self, uda:xu.UgridDataArray) -> str:
+        """
+        Get the location of a variable (node/edge/face) from its dimensions.
+        """
+        for location in self.LOCATIONS:
+            if self.get_dimension(location) in uda.dims:
+                return location
+        raise KeyError(f'provided uda/variable "{uda.name}" does not have a node, edge or face dimension')
+    
+    def _get_connectivity_operator(self, source:str, target:str) -> scipy.sparse.csr_matrix:
+        grid = self.grid
+        if (source, target) == ('node', 'face'):
+            return get_connectivity_matrix(grid.face_node_connectivity, grid.n_node)
+        elif (source, target) == ('edge', 'face'):
+            return get_connectivity_matrix(grid.face_edge_connectivity, grid.n_edge)
+        elif (source, target) == ('node', 'edge'):
+            return get_connectivity_matrix(grid.edge_node_connectivity, grid.n_node)
+        # the other location pairs are the transposed matrices
+        return self._get_connectivity_operator(target, source).T.tocsr()
+    
+    def get_operator(self, source:str, target:str, weights:str = None) -> scipy.sparse.csr_matrix:
+        """
+        Get the sparse (target x source) operator with the weights of all connected source nodes/edges/faces
+        of each target node/edge/face. The operator is constructed once and reused afterwards.
+
+        Parameters
+        ----------
+        source : str
+            The location of the source data, 'node', 'edge' or 'face'.
+        target : str
+            The location of the regridded data, 'node', 'edge' or 'face'.
+        weights : str, optional
+            None for equal weights of all connected source values or 'area' for face area weights
+            (only for source 'face'). The default is None.
+
+        Raises
+        ------
+        ValueError
+            If the locations or weights are not supported.
+
+        Returns
+        -------
+        operator : scipy.sparse.csr_matrix
+            Sparse matrix with shape (n_target, n_source).
+
+        """
+        for location in [source, target]:
+            if location not in self.LOCATIONS:
+                raise ValueError(f"unknown location '{location}', options are {self.LOCATIONS}")
+        if source == target:
+            raise ValueError(f"source and target location are both '{source}'")
+        if weights not in [None, 'area']:
+            raise ValueError(f"unknown weights '{weights}', options are None and 'area'")
+        if weights == 'area' and source != 'face':
+            raise ValueError(f"weights='area' is only supported for source location 'face', not '{source}'")
+        
+        key = (source, target, weights)
+        if key not in self._operators:
+            operator = self._get_connectivity_operator(source, target)
+            if weights == 'area':
+                operator = operator.multiply(self.grid.area[np.newaxis,:]).tocsr()
+            self._operators[key] = operator
+        return self._operators[key]
+    
+    def regrid(self, uda:xu.UgridDataArray, target:str, weights:str = None) -> xu.UgridDataArray:
+        """
+        Regrid a ugrid variable to another location by (weighted) averaging of the connected
+        source values, nan values are skipped. Dask arrays stay lazy and are not rechunked.
+
+        Parameters
+        ----------
+        uda : xu.UgridDataArray
+            Variable with a node, edge or face dimension.
+        target : str
+            The location of the regridded data, 'node', 'edge' or 'face'.
+        weights : str, optional
+            None for equal weights of all connected source values or 'area' for face area weights
+            (only for source 'face'). The default is None.
+
+        Returns
+        -------
+        uda_target : xu.UgridDataArray
+            The regridded variable, with the target dimension as last dimension.
+
+        """
+        source = self.get_source_location(uda)
+        dimn_source = self.get_dimension(source)
+        dimn_target = self.get_dimension(target)
+        operator = self.get_operator(source, target, weights=weights)
+        
+        # this converts the xu.UgridDataArray to a xr.DataArray, so we convert it back
+        uda_target_ds = xr.apply_ufunc(sparse_weighted_mean, uda.obj,
+                                       kwargs={'matrix': operator},
+                                       input_core_dims=[[dimn_source]],
+                                       output_core_dims=[[dimn_target]],
+                                       dask='allowed',
+                                       keep_attrs=True,
+                                       )
+        # the grid of the variable, which has the same topology but can be another grid object
+        uda_target = xu.UgridDataArray(uda_target_ds, grid=uda.grid)
+        #update attrs from source to target location
+        target_attrs = {'location': target, 'cell_methods': f'{dimn_target}: mean'}
+        uda_target = uda_target.assign_attrs(target_attrs)
+        return uda_target
+
+
+LOCATION_REGRIDDER_CACHE = {}
+LOCATION_REGRIDDER_CACHE_MAXSIZE = 4
+
+
+def get_location_regridder(grid:xu.Ugrid2d, edges:bool = False) -> LocationRegridder:
+    """
+    Get a LocationRegridder for a grid, it is cached on the topology and dimension names of the grid, so the
+    sparse operators are reused for grids with identical node coordinates and face_node_connectivity.
+    The edges are not part of the topology key, so for edge variables (edges=True) of another grid object
+    the edge_node_connectivity is compared and a new LocationRegridder is created if it differs.
+    """
+    key = (get_grid_key(grid), grid.node_dimension, grid.edge_dimension, grid.face_dimension)
+    regridder = LOCATION_REGRIDDER_CACHE.get(key)
+    if regridder is not None and edges and regridder.grid is not grid:
+        if not np.array_equal(regridder.grid.edge_node_connectivity, grid.edge_node_connectivity):
+            regridder = None
+    if regridder is None:
+        if key not in LOCATION_REGRIDDER_CACHE and len(LOCATION_REGRIDDER_CACHE) >= LOCATION_REGRIDDER_CACHE_MAXSIZE:
+            # remove the oldest regridder to limit memory usage
+            LOCATION_REGRIDDER_CACHE.pop(next(iter(LOCATION_REGRIDDER_CACHE)))
+        regridder = LocationRegridder(grid)
+        LOCATION_REGRIDDER_CACHE[key] = regridder
+    return regridder
+
+
 def uda_to_faces(uda : xu.UgridDataArray) -> xu.UgridDataArray:
     """
     Interpolates a ugrid variable (xu.DataArray) with a node or edge dimension to the faces by averaging the 3/4 nodes/edges around each face.
+    This is done with dfmt.LocationRegridder, which is cached per grid and uses a sparse face x node/edge matrix
+    that is applied per chunk of the node/edge dimension, so no rechunking is required. Nan values are skipped in the averaging.
     
     Parameters
     ----------
@@ -509,70 +1550,61 @@ def uda_to_faces(uda : xu.UgridDataArray) -> xu.UgridDataArray:
     """
     grid = uda.grid
     
-    dimn_faces = grid.face_dimension
-    reduce_dim = 'nMax_face_nodes' #arbitrary dimname that is reduced anyway
-    dimn_nodes = grid.node_dimension
-    dimn_edges = grid.edge_dimension
-    
-    # construct indexing array
-    if dimn_nodes in uda.dims:
+    if grid.node_dimension in uda.dims:
         dimn_notfaces_name = "node"
-        dimn_notfaces = dimn_nodes
-        indexer_np = grid.face_node_connectivity
-    elif dimn_edges in uda.dims:
+    elif grid.edge_dimension in uda.dims:
         dimn_notfaces_name = "edge"
-        dimn_notfaces = dimn_edges
-        indexer_np = grid.face_edge_connectivity
     else:
         print(f'provided uda/variable "{uda.name}" does not have an node or edge dimension, returning unchanged uda')
         return uda
     
-    # rechunk to make sure the node/edge dimension is not chunked, otherwise we will 
-    # get "PerformanceWarning: Slicing with an out-of-order index is generating 384539 times more chunks."
-    chunks = {dimn_notfaces:-1}
-    uda = uda.chunk(chunks)
-
-    indexer = xr.DataArray(indexer_np,dims=(dimn_faces,reduce_dim))
-    indexer_validbool = indexer!=-1
-    indexer = indexer.where(indexer_validbool,-1)
-    
     print(f'{dimn_notfaces_name}-to-face interpolation: ',end='')
     dtstart = dt.datetime.now()
-    # for each face, select all corresponding node/edge values
-    # we do this via stack and unstack since 2D indexing does not
-    # properly work in dask yet: https://github.com/dask/dask/pull/10237
-    # this process converts the xu.UgridDataArray to a xr.DataArray, so we convert it back
-    indexer_stacked = indexer.stack(__tmp_dim__=(dimn_faces, reduce_dim))
-    uda_face_allnodes_ds_stacked = uda.isel({dimn_notfaces: indexer_stacked})
-    uda_face_allnodes_ds = uda_face_allnodes_ds_stacked.unstack("__tmp_dim__")
-    uda_face_allnodes = xu.UgridDataArray(uda_face_allnodes_ds,grid=grid)
-    
-    # replace nonexistent nodes/edges with nan
-    uda_face_allnodes = uda_face_allnodes.where(indexer_validbool) #replace all values for fillvalue nodes/edges (-1) with nan
-    # average node/edge values per face
-    uda_face = uda_face_allnodes.mean(dim=reduce_dim,keep_attrs=True)
-    #update attrs from node/edge to face
-    face_attrs = {'location': 'face', 'cell_methods': f'{dimn_faces}: mean'}
-    uda_face = uda_face.assign_attrs(face_attrs)
+    regridder = get_location_regridder(grid, edges=dimn_notfaces_name=='edge')
+    uda_face = regridder.regrid(uda, target='face')
     print(f'{(dt.datetime.now()-dtstart).total_seconds():.2f} sec')
     
     return uda_face
 
 
 def uda_interfaces_to_centers(uda_int : xu.UgridDataArray) -> xu.UgridDataArray:
+    """
+    Interpolates a ugrid variable (xu.DataArray) with an interface dimension to the layer centers by averaging
+    the interfaces below and above each layer. This is a slice-and-average stencil that is applied lazily
+    per chunk, so the chunks of the other dimensions are preserved. Layers with a nan value at one of
+    their interfaces are nan.
+    
+    Parameters
+    ----------
+    uda_int : xu.UgridDataArray
+        DESCRIPTION.
+
+    Returns
+    -------
+    uda_cen : xu.UgridDataArray
+        DESCRIPTION.
+
+    """
     dimn_layer, dimn_interface = get_vertical_dimensions(uda_int)
     
     if dimn_interface not in uda_int.dims:
         print('no interface dimension found, returning original array')
         return uda_int
-        
-    # define layers to be halfway inbetween the interfaces
-    nlayers = uda_int.sizes[dimn_interface] - 1
-    array_shift_half = xr.DataArray(np.arange(0.5,nlayers),dims=dimn_layer)
-    # interpolate from interfaces to layers
-    uda_cen = uda_int.interp({dimn_interface:array_shift_half},assume_sorted=True)
-    # drop interface coordinate
-    uda_cen = uda_cen.drop_vars(dimn_interface)
+    
+    def interfaces_to_centers(var):
+        # average the interfaces below and above each layer
+        if dimn_interface not in var.dims:
+            return var
+        var_bot = var.isel({dimn_interface:slice(None,-1)})
+        var_top = var.isel({dimn_interface:slice(1,None)})
+        dims = [dimn_layer if dimn==dimn_interface else dimn for dimn in var.dims]
+        return xr.Variable(dims, (var_bot.data + var_top.data) / 2, attrs=var.attrs)
+    
+    # also interpolate the coordinates with an interface dimension, except for the interface coordinate itself
+    da_int = uda_int.obj
+    coords = {varn: interfaces_to_centers(coord.variable) for varn, coord in da_int.coords.items() if varn != dimn_interface}
+    da_cen = xr.DataArray(interfaces_to_centers(da_int.variable), coords=coords, name=da_int.name)
+    uda_cen = xu.UgridDataArray(da_cen, grid=uda_int.grid)
     
     return uda_cen
 
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark for the stencil in dfmt.uda_interfaces_to_centers() compared to the previous
+implementation that interpolated to half indices with uda.interp()
+"""
+
+import datetime as dt
+import numpy as np
+import xarray as xr
+import dfm_tools as dfmt
+from dfm_tools.xugrid_helpers import get_vertical_dimensions
+
+
+def uda_interfaces_to_centers_interp(uda_int):
+    # previous implementation of dfmt.uda_interfaces_to_centers(), for comparison only
+    dimn_layer, dimn_interface = get_vertical_dimensions(uda_int)
+    nlayers = uda_int.sizes[dimn_interface] - 1
+    array_shift_half = xr.DataArray(np.arange(0.5,nlayers),dims=dimn_layer)
+    uda_cen = uda_int.interp({dimn_interface:array_shift_half},assume_sorted=True)
+    uda_cen = uda_cen.drop_vars(dimn_interface)
+    return uda_cen
+
+
+file_nc_list = [dfmt.data.fm_grevelingen_map(return_filepath=True), #zlayer
+                r'p:\1204257-dcsmzuno\2006-2012\3D-DCSM-FM\A18b_ntsu1\DFM_OUTPUT_DCSM-FM_0_5nm\DCSM-FM_0_5nm_0*_map.nc', #fullgrid with 50 layers
+                ]
+
+for file_nc in file_nc_list:
+    uds = dfmt.open_partitioned_dataset(file_nc)
+    _, dimn_interface = get_vertical_dimensions(uds)
+    varn_int = [varn for varn in uds.data_vars if dimn_interface in uds[varn].dims][0]
+    uda_int = uds[varn_int].isel(time=slice(None,10))
+
+    dtstart = dt.datetime.now()
+    uda_cen_interp = uda_interfaces_to_centers_interp(uda_int).compute()
+    time_interp = (dt.datetime.now()-dtstart).total_seconds()
+
+    dtstart = dt.datetime.now()
+    uda_cen = dfmt.uda_interfaces_to_centers(uda_int).compute()
+    time_stencil = (dt.datetime.now()-dtstart).total_seconds()
+    assert np.allclose(uda_cen, uda_cen_interp, equal_nan=True)
+
+    print(f'>> variable {varn_int} with shape {uda_int.shape} and chunks {uda_int.chunks}')
+    print(f'   interfaces-to-centers: interp {time_interp:.4f} sec, stencil {time_stencil:.4f} sec')
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark for the bounding box prefilter of dfmt.FaceLocator.intersect_edges() compared to
+the celltree of the entire grid (xu.Ugrid2d.intersect_edges), used in dfmt.polyline_mapslice()
+"""
+
+import datetime as dt
+import numpy as np
+import dfm_tools as dfmt
+from dfm_tools.xugrid_helpers import FaceLocator
+
+file_nc_list = [dfmt.data.fm_curvedbend_map(return_filepath=True),
+                dfmt.data.fm_grevelingen_map(return_filepath=True),
+                ]
+
+line_array_dict = {'cb_3d_map': np.array([[ 185.08667065, 2461.11775254],
+                                          [2934.63837418, 1134.16019127]]),
+                   'Grevelingen': np.array([[ 56267.59146475, 415644.67447155],
+                                            [ 64053.73427496, 419407.58239502]]),
+                   }
+
+nrepeats = 5
+for file_nc in file_nc_list:
+    uds = dfmt.open_partitioned_dataset(file_nc)
+    line_array = [line_array for key, line_array in line_array_dict.items() if key in file_nc][0]
+    edges = np.stack([line_array[:-1],line_array[1:]],axis=1)
+    
+    # compile numba functions before timing
+    FaceLocator(uds.grid.copy()).intersect_edges(edges)
+    uds.grid.copy().intersect_edges(edges)
+    
+    # first call on a new grid, including the construction of the spatial index
+    dtstart = dt.datetime.now()
+    face_locator = FaceLocator(uds.grid.copy())
+    edge_index, face_index, intersections = face_locator.intersect_edges(edges)
+    time_prefilter_first = (dt.datetime.now()-dtstart).total_seconds()
+    
+    dtstart = dt.datetime.now()
+    grid = uds.grid.copy()
+    edge_index_full, face_index_full, intersections_full = grid.intersect_edges(edges)
+    time_full_first = (dt.datetime.now()-dtstart).total_seconds()
+    assert np.array_equal(np.sort(face_index), np.sort(face_index_full))
+    
+    # repeated calls with a cached spatial index
+    dtstart = dt.datetime.now()
+    for i in range(nrepeats):
+        face_locator.intersect_edges(edges)
+    time_prefilter_repeat = (dt.datetime.now()-dtstart).total_seconds()/nrepeats
+    
+    dtstart = dt.datetime.now()
+    for i in range(nrepeats):
+        grid.intersect_edges(edges)
+    time_full_repeat = (dt.datetime.now()-dtstart).total_seconds()/nrepeats
+    
+    print(f'>> {uds.grid.n_face} faces, {len(face_index)} crossed faces')
+    print(f'   first call: prefilter {time_prefilter_first:.4f} sec, entire grid {time_full_first:.4f} sec')
+    print(f'   repeated calls: prefilter {time_prefilter_repeat:.4f} sec, entire grid {time_full_repeat:.4f} sec')
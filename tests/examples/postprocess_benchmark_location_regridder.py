@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark for dfmt.LocationRegridder compared to dfmt.uda_to_faces() and the previous
+stack/isel/unstack implementation of the node/edge-to-face averaging
+"""
+
+import datetime as dt
+import numpy as np
+import xarray as xr
+import xugrid as xu
+import dfm_tools as dfmt
+
+
+def uda_to_faces_isel(uda):
+    # previous implementation of dfmt.uda_to_faces(), for comparison only
+    grid = uda.grid
+    dimn_faces = grid.face_dimension
+    reduce_dim = 'nMax_face_nodes'
+    if grid.node_dimension in uda.dims:
+        dimn_notfaces = grid.node_dimension
+        indexer_np = grid.face_node_connectivity
+    else:
+        dimn_notfaces = grid.edge_dimension
+        indexer_np = grid.face_edge_connectivity
+    uda = uda.chunk({dimn_notfaces:-1})
+    indexer = xr.DataArray(indexer_np,dims=(dimn_faces,reduce_dim))
+    indexer_validbool = indexer!=-1
+    indexer_stacked = indexer.stack(__tmp_dim__=(dimn_faces, reduce_dim))
+    uda_face_allnodes_ds = uda.isel({dimn_notfaces: indexer_stacked}).unstack("__tmp_dim__")
+    uda_face_allnodes = xu.UgridDataArray(uda_face_allnodes_ds,grid=grid)
+    uda_face = uda_face_allnodes.where(indexer_validbool).mean(dim=reduce_dim)
+    return uda_face
+
+
+file_nc_list = [dfmt.data.fm_curvedbend_map(return_filepath=True),
+                dfmt.data.fm_grevelingen_map(return_filepath=True),
+                ]
+
+for file_nc in file_nc_list:
+    uds = dfmt.open_partitioned_dataset(file_nc)
+    grid = uds.grid
+    varn_edge = [varn for varn in ['mesh2d_vicwwu','mesh2d_u1'] if varn in uds.data_vars][0]
+    uda_edge = uds[varn_edge]
+
+    dtstart = dt.datetime.now()
+    uda_face_isel = uda_to_faces_isel(uda_edge).compute()
+    time_isel = (dt.datetime.now()-dtstart).total_seconds()
+
+    dtstart = dt.datetime.now()
+    uda_face = dfmt.uda_to_faces(uda_edge).compute()
+    time_uda_to_faces = (dt.datetime.now()-dtstart).total_seconds()
+    assert np.allclose(uda_face, uda_face_isel, equal_nan=True)
+
+    # regridder with operators for all location pairs, reused for multiple variables
+    dtstart = dt.datetime.now()
+    regridder = dfmt.LocationRegridder(grid)
+    uda_face = regridder.regrid(uda_edge, target='face').compute()
+    uda_node = regridder.regrid(uda_face, target='node', weights='area').compute()
+    uda_edge_back = regridder.regrid(uda_node, target='edge').compute()
+    time_regridder = (dt.datetime.now()-dtstart).total_seconds()
+
+    print(f'>> {grid.n_face} faces, {grid.n_edge} edges, variable {varn_edge} with shape {uda_edge.shape}')
+    print(f'   edge-to-face: stack/isel {time_isel:.4f} sec, dfmt.uda_to_faces() {time_uda_to_faces:.4f} sec')
+    print(f'   edge-to-face-to-node-to-edge with dfmt.LocationRegridder: {time_regridder:.4f} sec')
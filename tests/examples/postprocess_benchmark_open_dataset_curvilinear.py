@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark for the structured node numbering and edge derivation in dfmt.open_dataset_curvilinear()
+compared to the previous implementation with np.unique on all vertex coordinates and face edges
+"""
+
+import datetime as dt
+import numpy as np
+import xarray as xr
+import xugrid as xu
+import dfm_tools as dfmt
+from dfm_tools.xugrid_helpers import (get_curvilinear_face_node_connectivity,
+                                      get_edge_connectivity,
+                                      )
+
+
+file_nc = r'P:\archivedprojects\11206304-futuremares-rawdata-preps\data\CMIP6_BC\CMCC-ESM2\vo_Omon_CMCC-ESM2_historical_r1i1p1f1_gn_*.nc'
+
+ds = xr.open_mfdataset(file_nc, data_vars="minimal")
+vertices_longitude = ds.variables['vertices_longitude'].transpose('i','j',...).to_numpy()
+vertices_latitude = ds.variables['vertices_latitude'].transpose('i','j',...).to_numpy()
+vertices_longitude = (vertices_longitude+180) % 360 - 180
+
+# previous implementation, for comparison only
+dtstart = dt.datetime.now()
+face_xy_vertices_flat = np.stack([vertices_longitude,vertices_latitude],axis=-1).reshape(-1,2)
+uniq, inv = np.unique(face_xy_vertices_flat, axis=0, return_inverse=True)
+time_unique = (dt.datetime.now()-dtstart).total_seconds()
+
+dtstart = dt.datetime.now()
+node_x, node_y, face_node_connectivity = get_curvilinear_face_node_connectivity(vertices_longitude, vertices_latitude)
+time_structured = (dt.datetime.now()-dtstart).total_seconds()
+bool_notnan = ~np.isnan(face_xy_vertices_flat).any(axis=1)
+assert np.array_equal(face_node_connectivity.ravel()[bool_notnan], inv.ravel()[bool_notnan])
+
+# edges of faces with four unique nodes
+fnc = face_node_connectivity.reshape(-1,4)
+fnc = fnc[~(np.diff(np.c_[fnc,fnc[:,0]],axis=1)==0).any(axis=1)]
+grid = xu.Ugrid2d(node_x, node_y, -1, fnc)
+dtstart = dt.datetime.now()
+edge_node_connectivity_xu = grid.edge_node_connectivity
+time_edges_xu = (dt.datetime.now()-dtstart).total_seconds()
+
+dtstart = dt.datetime.now()
+edge_node_connectivity, _ = get_edge_connectivity(fnc, len(node_x))
+time_edges = (dt.datetime.now()-dtstart).total_seconds()
+assert np.array_equal(edge_node_connectivity, edge_node_connectivity_xu)
+
+dtstart = dt.datetime.now()
+uds = dfmt.open_dataset_curvilinear(file_nc, convert_360to180=True)
+time_open = (dt.datetime.now()-dtstart).total_seconds()
+
+print(f'>> {vertices_longitude.shape[0]*vertices_longitude.shape[1]} cells, {len(node_x)} unique nodes')
+print(f'   node numbering: np.unique {time_unique:.2f} sec, structured {time_structured:.2f} sec')
+print(f'   edges: xugrid {time_edges_xu:.2f} sec, hashed {time_edges:.2f} sec')
+print(f'   dfmt.open_dataset_curvilinear(): {time_open:.2f} sec')
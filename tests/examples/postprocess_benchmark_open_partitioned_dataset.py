@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark for the max_workers argument of dfmt.open_partitioned_dataset(), opening all partitions
+sequentially compared to opening them concurrently in a thread pool
+"""
+
+import datetime as dt
+import numpy as np
+import dfm_tools as dfmt
+
+file_nc_list = [dfmt.data.fm_grevelingen_map(return_filepath=True),
+                ]
+
+nrepeats = 3
+for file_nc in file_nc_list:
+    # open once before timing, so the files are in the os cache for all cases
+    dfmt.open_partitioned_dataset(file_nc)
+    
+    times_dict = {}
+    for max_workers in [1, 2, 4, None]:
+        dtstart = dt.datetime.now()
+        for i in range(nrepeats):
+            uds = dfmt.open_partitioned_dataset(file_nc, max_workers=max_workers)
+        times_dict[max_workers] = (dt.datetime.now()-dtstart).total_seconds()/nrepeats
+        if max_workers == 1:
+            uds_sequential = uds
+        else:
+            assert np.array_equal(uds.grid.face_node_connectivity, uds_sequential.grid.face_node_connectivity)
+    
+    print(f'>> {file_nc}: {uds.grid.n_face} faces')
+    for max_workers, time_open in times_dict.items():
+        print(f'   max_workers={max_workers}: {time_open:.2f} sec (speedup {times_dict[1]/time_open:.2f})')
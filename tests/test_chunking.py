@@ -0,0 +1,55 @@
+import os
+import pytest
+import numpy as np
+import xarray as xr
+import dfm_tools as dfmt
+
+
+def create_dataset_timespace(file_nc, ntimes=100, nfaces=1000, disk_chunks=None):
+    ds = xr.Dataset()
+    ds['time'] = xr.DataArray(np.arange(ntimes), dims='time')
+    ds['s1'] = xr.DataArray(np.zeros((ntimes, nfaces)), dims=('time','nFaces'))
+    ds['bl'] = xr.DataArray(np.zeros(nfaces), dims='nFaces')
+    encoding = {}
+    if disk_chunks is not None:
+        encoding = {'s1': {'chunksizes': disk_chunks}}
+    ds.to_netcdf(file_nc, encoding=encoding)
+
+
+@pytest.mark.unittest
+def test_get_chunks(tmp_path):
+    file_nc = os.path.join(tmp_path, 'timespace.nc')
+    create_dataset_timespace(file_nc)
+    # 1000 faces of 8 bytes gives 8000 bytes per timestep
+    chunks_snapshot = dfmt.get_chunks(file_nc, access_pattern='snapshot', chunksize_bytes=80000)
+    chunks_reduction = dfmt.get_chunks(file_nc, access_pattern='reduction', chunksize_bytes=80000)
+    chunks_timeseries = dfmt.get_chunks(file_nc, access_pattern='timeseries', chunksize_bytes=80000)
+    chunks_partitions = dfmt.get_chunks(file_nc, access_pattern='reduction', chunksize_bytes=80000, npartitions=4)
+    chunks_small = dfmt.get_chunks(file_nc, access_pattern='snapshot', chunksize_bytes=4000)
+    assert chunks_snapshot == {'time': 1}
+    assert chunks_reduction == {'time': 10}
+    assert chunks_timeseries == {'time': 100, 'nFaces': 100}
+    assert chunks_partitions == {'time': 2}
+    assert chunks_small == {'time': 1, 'nFaces': 500}
+
+
+@pytest.mark.unittest
+def test_get_chunks_diskchunks(tmp_path):
+    file_nc = os.path.join(tmp_path, 'timespace_chunked.nc')
+    create_dataset_timespace(file_nc, disk_chunks=(4, 300))
+    chunks_snapshot = dfmt.get_chunks(file_nc, access_pattern='snapshot', chunksize_bytes=80000)
+    chunks_reduction = dfmt.get_chunks(file_nc, access_pattern='reduction', chunksize_bytes=80000)
+    chunks_timeseries = dfmt.get_chunks(file_nc, access_pattern='timeseries', chunksize_bytes=80000)
+    # multiples of the on-disk chunks
+    assert chunks_snapshot == {'time': 4}
+    assert chunks_reduction == {'time': 8}
+    assert chunks_timeseries == {'time': 100, 'nFaces': 300}
+
+
+@pytest.mark.unittest
+def test_get_chunks_invalid_access_pattern(tmp_path):
+    file_nc = os.path.join(tmp_path, 'timespace.nc')
+    create_dataset_timespace(file_nc)
+    with pytest.raises(ValueError) as e:
+        dfmt.get_chunks(file_nc, access_pattern='random')
+    assert "unknown access_pattern 'random'" in str(e.value)
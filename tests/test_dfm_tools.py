@@ -4,6 +4,7 @@ import pytest
 import os
 import dfm_tools as dfmt
 import numpy as np
+import dask
 import hydrolib.core.dflowfm as hcdfm
 import pandas as pd
 from dfm_tools.get_nc import (calc_dist_pythagoras,
@@ -323,6 +324,26 @@ def test_zlayermodel_correct_layers_nanabovewl():
     assert np.allclose(zw_onecell, zw_onecell_expected)
 
 
+@pytest.mark.unittest
+def test_zlayermodel_reconstruct_lazy():
+    """
+    the reconstruction of all timesteps should not compute anything and should not modify the interface_z variable
+    """
+
+    file_nc = dfmt.data.fm_grevelingen_map(return_filepath=True) #zlayer
+    uds = dfmt.open_partitioned_dataset(file_nc)
+    interface_z = uds['mesh2d_interface_z'].to_numpy().copy()
+
+    uds_fullgrid = reconstruct_zw_zcc_fromz(uds)
+    assert isinstance(uds_fullgrid['mesh2d_flowelem_zw'].data, dask.array.Array)
+    assert np.array_equal(uds['mesh2d_interface_z'].to_numpy(), interface_z)
+
+    # the top interface is at the waterlevel, also if the waterlevel is above the top interface_z
+    zw_top = uds_fullgrid['mesh2d_flowelem_zw'].isel(time=3, nmesh2d_face=5000, nmesh2d_interface=-1)
+    wl = uds_fullgrid['mesh2d_s1'].isel(time=3, nmesh2d_face=5000)
+    assert np.isclose(zw_top, wl)
+
+
 @pytest.mark.requireslocaldata
 @pytest.mark.unittest
 def test_zsigmalayermodel_correct_layers():
@@ -10,6 +10,9 @@ import pytest
 import numpy as np
 import dfm_tools as dfmt
 import xarray as xr
+import geopandas as gpd
+import xugrid as xu
+import dask
 
 
 @pytest.mark.unittest
@@ -28,6 +31,90 @@ def test_polyline_mapslice():
     assert np.isclose(uds_crs.grid.node_y.max(), 0.9261683648147339)
 
 
+@pytest.mark.unittest
+def test_polyline_mapslice_timedependent():
+    uds = dfmt.data.fm_curvedbend_map()
+    timestep = 72
+    line_array = np.array([[ 104.15421399, 2042.7077107 ],
+                            [2913.47878063, 2102.48057382]])
+    
+    uds_crs = dfmt.polyline_mapslice(uds.isel(time=slice(70,75)), line_array)
+    assert uds_crs.sizes['time'] == 5
+    assert uds_crs['mesh2d_node_z'].dims == ('time', 'mesh2d_nNodes')
+    
+    uds_crs_sel = dfmt.get_crs_timestep(uds_crs, timestep-70)
+    uds_crs_one = dfmt.polyline_mapslice(uds.isel(time=timestep), line_array)
+    assert np.allclose(uds_crs_sel.grid.node_x, uds_crs_one.grid.node_x)
+    assert np.allclose(uds_crs_sel.grid.node_y, uds_crs_one.grid.node_y)
+    assert np.isclose(uds_crs_sel.grid.node_y.max(), 0.9261683648147339)
+
+
+@pytest.mark.unittest
+def test_polyline_mapslice_batch():
+    uds = dfmt.data.fm_curvedbend_map()
+    timestep = 72
+    line_array_list = [np.array([[ 104.15421399, 2042.7077107 ],
+                                 [2913.47878063, 2102.48057382]]),
+                       np.array([[1000, 1000],
+                                 [1000, 3000]]),
+                       ]
+    
+    uds_crs_list = dfmt.polyline_mapslice_batch(uds.isel(time=timestep), line_array_list)
+    assert len(uds_crs_list) == 2
+    for line_array, uds_crs in zip(line_array_list, uds_crs_list):
+        uds_crs_one = dfmt.polyline_mapslice(uds.isel(time=timestep), line_array)
+        assert np.allclose(uds_crs.grid.node_x, uds_crs_one.grid.node_x)
+        assert np.allclose(uds_crs.grid.node_y, uds_crs_one.grid.node_y)
+    assert len(uds_crs_list[0].grid.node_x) == 720
+    
+    uds_crs_concat = dfmt.polyline_mapslice_batch(uds.isel(time=timestep), line_array_list, concat=True)
+    nfaces = [uds_crs.grid.n_face for uds_crs in uds_crs_list]
+    assert uds_crs_concat.grid.n_face == sum(nfaces)
+    assert (uds_crs_concat['transect'] == 1).sum() == nfaces[1]
+
+
+def uds_sigma_synthetic(ntimes=None):
+    """
+    sigma model with three layers on a 4x3 grid, waterlevel at 1m and bed at -4m
+    """
+    x_bounds = np.column_stack([np.arange(4), np.arange(1,5)]).astype(float)
+    y_bounds = np.column_stack([np.arange(3), np.arange(1,4)]).astype(float)
+    grid = xu.Ugrid2d.from_structured_bounds(x_bounds, y_bounds)
+    facedim = grid.face_dimension
+    ds = grid.to_dataset()
+    ds['mesh2d'].attrs.update(layer_dimension='mesh2d_nLayers', interface_dimension='mesh2d_nInterfaces')
+    ds['mesh2d_s1'] = xr.DataArray(np.full(grid.n_face, 1.0), dims=facedim)
+    ds['mesh2d_bldepth'] = xr.DataArray(np.full(grid.n_face, 4.0), dims=facedim, attrs={'standard_name':'altitude'})
+    for varn, dimn, sigma in [('mesh2d_interface_sigma', 'mesh2d_nInterfaces', np.linspace(-1,0,4)),
+                              ('mesh2d_layer_sigma', 'mesh2d_nLayers', np.linspace(-5/6,-1/6,3))]:
+        attrs = {'standard_name':'ocean_sigma_coordinate', 'formula_terms':f'sigma: {varn} eta: mesh2d_s1 depth: mesh2d_bldepth'}
+        ds[varn] = xr.DataArray(sigma, dims=dimn, attrs=attrs)
+    ds['mesh2d_sa1'] = xr.DataArray(np.ones((grid.n_face,3)), dims=(facedim,'mesh2d_nLayers'))
+    if ntimes is not None:
+        ds['mesh2d_s1'] = ds['mesh2d_s1'].expand_dims(time=ntimes).copy()
+        ds['mesh2d_sa1'] = ds['mesh2d_sa1'].expand_dims(time=ntimes).copy()
+    uds = xu.UgridDataset(ds)
+    return uds
+
+
+@pytest.mark.unittest
+def test_polyline_mapslice_batch_sigma(capsys):
+    uds = uds_sigma_synthetic()
+    
+    line_array_list = [np.array([[0.5,0.5],[3.5,0.5]]),
+                       np.array([[1.5,0.2],[1.5,2.8]])]
+    dfmt.get_nc.ZWZCC_CACHE.clear()
+    uds_crs_list = dfmt.polyline_mapslice_batch(uds, line_array_list)
+    
+    # zw/zcc are reconstructed once for all polylines
+    out, _ = capsys.readouterr()
+    assert out.count('computing zw/zcc') == 1
+    assert 'already present' not in out
+    assert [uds_crs.grid.n_face for uds_crs in uds_crs_list] == [12, 9]
+    assert np.allclose(uds_crs_list[0].grid.node_y.min(), -4)
+    assert np.allclose(uds_crs_list[0].grid.node_y.max(), 1)
+
+
 @pytest.mark.unittest
 def test_get_dataset_atdepths_hisfile():
     
@@ -46,3 +133,185 @@ def test_get_dataset_atdepths_hisfile():
     assert np.isclose(data_xr_selzt.temperature.sum(), 1295.56826688)
 
 
+@pytest.mark.unittest
+def test_extract_timeseries_at_points():
+    file_nc = dfmt.data.fm_grevelingen_map(return_filepath=True)
+    uds = dfmt.open_partitioned_dataset(file_nc, access_pattern='timeseries')
+    
+    # adding xy=[1,1] deliberately to test if there are nans included
+    gdf = gpd.GeoDataFrame(geometry=gpd.points_from_xy([51500,55000,51500,1],[418800,421500,418800,1]))
+    gdf['name'] = ['pt_0001','pt_0002','pt_0003','pt_0004']
+    ds = dfmt.extract_timeseries_at_points(uds, gdf)
+    
+    assert ds.mesh2d_sa1.dims == ('point', 'time', 'mesh2d_nLayers')
+    assert (ds.name.to_numpy() == gdf['name'].to_numpy()).all()
+    assert ds.mesh2d_face_index.to_numpy()[-1] == -1
+    sa1_values = ds.mesh2d_sa1.isel(time=-1).to_numpy()
+    assert np.isnan(sa1_values[-1]).all()
+    assert np.allclose(sa1_values[0], sa1_values[2])
+    
+    # compare to xugrid sel_points
+    ds_sel = uds.mesh2d_sa1.ugrid.sel_points(x=gdf.geometry.x[:2], y=gdf.geometry.y[:2])
+    sa1_expected = ds_sel.isel(time=-1).to_numpy()
+    assert np.allclose(sa1_values[:2], sa1_expected, equal_nan=True)
+
+@pytest.mark.unittest
+def test_extract_timeseries_at_points_rechunk(capsys):
+    x_bounds = np.column_stack([np.arange(4), np.arange(1,5)]).astype(float)
+    y_bounds = np.column_stack([np.arange(2), np.arange(1,3)]).astype(float)
+    grid = xu.Ugrid2d.from_structured_bounds(x_bounds, y_bounds)
+    data = np.arange(6*grid.n_face, dtype=float).reshape(6,-1)
+    uds = xu.UgridDataset(grids=[grid])
+    uds['mesh2d_s1'] = xr.DataArray(data, dims=('time',grid.face_dimension)).chunk({'time':1})
+    gdf = gpd.GeoDataFrame(geometry=gpd.points_from_xy([0.5,3.5],[0.5,1.5]))
+    
+    ds = dfmt.extract_timeseries_at_points(uds, gdf, load=False)
+    assert ds.mesh2d_s1.chunksizes['time'] == (6,)
+    assert "WARNING: the data is read in 6 chunks along time" in capsys.readouterr().out
+    assert np.array_equal(ds.mesh2d_s1.to_numpy(), data[:,[0,7]].T)
+    
+    # no warning for data that is not chunked along time
+    uds['mesh2d_s1'] = uds['mesh2d_s1'].chunk({'time':-1})
+    dfmt.extract_timeseries_at_points(uds, gdf)
+    assert "WARNING" not in capsys.readouterr().out
+
+
+@pytest.mark.unittest
+def test_get_dataset_atdepths_methods():
+    # hisfile-like dataset with one station with 4 layers of 1 meter and one station with one layer below bed
+    zw = np.array([[[-4, -3, -2, -1, 0],
+                    [np.nan, -3, -2, -1, 0]]])
+    zcc = (zw[:,:,1:] + zw[:,:,:-1])/2
+    ds = xr.Dataset()
+    ds['zcoordinate_w'] = xr.DataArray(zw, dims=('time','stations','laydimw'))
+    ds['zcoordinate_c'] = xr.DataArray(zcc, dims=('time','stations','laydim'))
+    ds['temperature'] = xr.DataArray(np.array([[[4., 3., 2., 1.],[np.nan, 3., 2., 1.]]]), dims=('time','stations','laydim'))
+    ds = ds.set_coords(['zcoordinate_w','zcoordinate_c'])
+    
+    depths = [-3.5, -2.25, 0, 1]
+    ds_layer = dfmt.get_Dataset_atdepths(data_xr=ds, depths=depths, reference='z0')
+    ds_linear = dfmt.get_Dataset_atdepths(data_xr=ds, depths=depths, reference='z0', method='linear')
+    assert ds_layer.temperature.dims == ('time','stations','depth_from_z0')
+    assert np.allclose(ds_layer.temperature.isel(time=0), [[4, 3, 1, np.nan], [np.nan, 3, 1, np.nan]], equal_nan=True)
+    assert np.allclose(ds_linear.temperature.isel(time=0), [[4, 2.75, 1, np.nan], [np.nan, 2.75, 1, np.nan]], equal_nan=True)
+    
+    with pytest.raises(ValueError) as e:
+        dfmt.get_Dataset_atdepths(data_xr=ds, depths=depths, method='nearest')
+    assert 'unknown method "nearest"' in str(e.value)
+
+
+@pytest.mark.unittest
+def test_searchsorted_lastaxis():
+    zvals = np.array([[-np.inf, -3, -2, -1, 0],
+                      [-4, -3, -2, np.inf, np.inf],
+                      [-4, -3, -3, -1, 0]])
+    depths = np.array([-5, -3, -2.5, 0, 1])
+    index = dfmt.get_nc.searchsorted_lastaxis(zvals, depths)
+    index_expected = np.array([np.searchsorted(row, depths, side='right') for row in zvals])
+    assert np.array_equal(index, index_expected)
+
+
+@pytest.mark.unittest
+def test_reconstruct_zw_zcc_cache(tmp_path):
+    uds = dfmt.data.fm_curvedbend_map()
+    dfmt.get_nc.ZWZCC_CACHE.clear()
+    
+    uds_zw = dfmt.reconstruct_zw_zcc(uds.isel(time=-1))
+    assert len(dfmt.get_nc.ZWZCC_CACHE) == 1
+    uds_zw_cached = dfmt.reconstruct_zw_zcc(uds.isel(time=-1))
+    assert len(dfmt.get_nc.ZWZCC_CACHE) == 1
+    assert 'mesh2d_flowelem_zw' in uds_zw_cached.coords
+    assert np.allclose(uds_zw['mesh2d_flowelem_zw'], uds_zw_cached['mesh2d_flowelem_zw'], equal_nan=True)
+    
+    # other selection results in other key
+    dfmt.reconstruct_zw_zcc(uds.isel(time=0))
+    assert len(dfmt.get_nc.ZWZCC_CACHE) == 2
+    
+    # persist to file and read again
+    file_zw = tmp_path / 'curvedbend_zw.nc'
+    dfmt.reconstruct_zw_zcc(uds.isel(time=-1), cache=False, file_zw=file_zw)
+    uds_zw_file = dfmt.reconstruct_zw_zcc(uds.isel(time=-1), cache=False, file_zw=file_zw)
+    assert np.allclose(uds_zw['mesh2d_flowelem_zcc'], uds_zw_file['mesh2d_flowelem_zcc'], equal_nan=True)
+
+
+@pytest.mark.unittest
+def test_reconstruct_zw_zcc_cache_lazy():
+    uds = uds_sigma_synthetic(ntimes=2).chunk({'time':1})
+    dfmt.get_nc.ZWZCC_CACHE.clear()
+    
+    # lazy zw/zcc stay lazy, also when reused from the cache
+    uds_zw = dfmt.reconstruct_zw_zcc(uds)
+    uds_zw_cached = dfmt.reconstruct_zw_zcc(uds)
+    for uds_one in [uds_zw, uds_zw_cached]:
+        assert isinstance(uds_one['mesh2d_flowelem_zw'].data, dask.array.Array)
+        assert isinstance(uds_one['mesh2d_flowelem_zcc'].data, dask.array.Array)
+    assert np.allclose(uds_zw_cached['mesh2d_flowelem_zw'].isel(time=0, mesh2d_nFaces=0), [-4, -2.333333, -0.666667, 1])
+    
+    # only the variables are cached, not the (coordinates of the) dataset
+    zw_cached, zcc_cached = dfmt.get_nc.ZWZCC_CACHE[dfmt.get_nc.get_zw_zcc_cachekey(uds)]
+    assert isinstance(zw_cached, xr.Variable)
+    assert isinstance(zcc_cached, xr.Variable)
+    uds_zw_cached['mesh2d_flowelem_zw'].attrs['units'] = 'm'
+    assert 'units' not in zw_cached.attrs
+
+
+@pytest.mark.unittest
+def test_rasterizer(tmp_path):
+    x_bounds = np.array([[0,1],[1,2],[2,3],[3,4]], dtype=float)
+    y_bounds = np.array([[0,1],[1,2]], dtype=float)
+    grid = xu.Ugrid2d.from_structured_bounds(x_bounds, y_bounds)
+    data = np.arange(3*grid.n_face, dtype=float).reshape(3, grid.n_face)
+    uda = xu.UgridDataArray(xr.DataArray(data, dims=('time', grid.face_dimension)), grid=grid)
+    uda = uda.chunk({'time':1})
+    ds_like = xr.Dataset(coords={'x':np.linspace(-0.5, 4.5, 11), 'y':np.linspace(0.1, 1.9, 5)})
+    
+    rasterizer = dfmt.Rasterizer(grid, ds_like=ds_like)
+    assert rasterizer.shape == (5, 11)
+    da_raster = rasterizer.rasterize(uda)
+    assert da_raster.chunks[0] == (1, 1, 1)
+    da_raster_expected = uda.ugrid.rasterize_like(ds_like)
+    xr.testing.assert_identical(da_raster, da_raster_expected)
+    
+    file_raster = tmp_path / 'raster_index.nc'
+    rasterizer.to_netcdf(file_raster)
+    rasterizer_loaded = dfmt.Rasterizer.from_netcdf(file_raster, grid=grid)
+    da_raster_loaded = dfmt.rasterize_ugrid(uda, rasterizer=rasterizer_loaded)
+    xr.testing.assert_identical(da_raster_loaded, da_raster_expected)
+    
+    grid_other = xu.Ugrid2d.from_structured_bounds(x_bounds+1, y_bounds)
+    with pytest.raises(ValueError) as e:
+        dfmt.Rasterizer.from_netcdf(file_raster, grid=grid_other)
+    assert "topology of the grid does not match" in str(e.value)
+
+
+@pytest.mark.unittest
+def test_rasterizer_conservative(tmp_path):
+    # 4x2 grid of unit faces rasterized to raster cells of 2x2
+    x_bounds = np.array([[0,1],[1,2],[2,3],[3,4]], dtype=float)
+    y_bounds = np.array([[0,1],[1,2]], dtype=float)
+    grid = xu.Ugrid2d.from_structured_bounds(x_bounds, y_bounds)
+    data = np.arange(2*grid.n_face, dtype=float).reshape(2, grid.n_face)
+    data[1,0] = np.nan
+    uda = xu.UgridDataArray(xr.DataArray(data, dims=('time', grid.face_dimension)), grid=grid)
+    uda = uda.chunk({'time':1, grid.face_dimension:3})
+    ds_like = xr.Dataset(coords={'x':np.array([1, 3, 5], dtype=float), 'y':np.array([1, 3], dtype=float)})
+    
+    rasterizer = dfmt.Rasterizer(grid, ds_like=ds_like, method='conservative')
+    da_raster = dfmt.rasterize_ugrid(uda, rasterizer=rasterizer)
+    assert da_raster.dims == ('time', 'y', 'x')
+    assert da_raster.chunks[0] == (1, 1)
+    
+    # mean of the four faces per raster cell, nan faces are skipped and cells outside the grid are nan
+    cx, cy = grid.centroids.T
+    for itime in range(2):
+        for ix, x in enumerate(ds_like.x.to_numpy()[:2]):
+            bool_cell = np.abs(cx - x) < 1
+            assert np.isclose(da_raster.isel(time=itime, y=0, x=ix), np.nanmean(data[itime, bool_cell]))
+    assert da_raster.isel(x=2).isnull().all()
+    assert da_raster.isel(y=1).isnull().all()
+    
+    file_raster = tmp_path / 'raster_weights.nc'
+    rasterizer.to_netcdf(file_raster)
+    rasterizer_loaded = dfmt.Rasterizer.from_netcdf(file_raster, grid=grid)
+    assert rasterizer_loaded.method == 'conservative'
+    xr.testing.assert_identical(rasterizer_loaded.rasterize(uda), da_raster)
@@ -189,3 +189,33 @@ def test_read_polyfile_as_gdf_points_linestrings(tmp_path):
     assert np.allclose(line0_geom.xy[1], reference_y)
     assert 'name' in gdf_lines.columns
     assert gdf_lines['name'].tolist() == reference_names
+
+
+@pytest.mark.unittest
+def test_set_datablock():
+    quantityunitpair = [hcdfm.QuantityUnitPair(quantity="time", unit="minutes since 2020-01-01"),
+                        hcdfm.QuantityUnitPair(quantity="waterlevelbnd", unit="m")]
+    datablock_np = np.array([[0, 1.5], [60, 2.5]])
+    kwargs = dict(name="bnd_0001", quantityunitpair=quantityunitpair, timeinterpolation="linear")
+    ts_validated = hcdfm.TimeSeries(**kwargs, datablock=datablock_np.tolist())
+    ts_empty = hcdfm.TimeSeries(**kwargs)
+    
+    # numeric arrays are set without validating each value, resulting in the same object
+    ts_fast = dfmt.hydrolib_helpers.set_datablock(ts_empty, datablock_np)
+    assert ts_fast == ts_validated
+    assert 'datablock' in ts_fast.__fields_set__
+    assert ts_empty.datablock == []
+    with pytest.raises(ValueError) as e:
+        dfmt.hydrolib_helpers.set_datablock(ts_empty, np.array([[0, np.nan]]))
+    assert "NaN is not supported in datablocks." in str(e.value)
+    with pytest.raises(ValueError) as e:
+        dfmt.hydrolib_helpers.set_datablock(ts_empty, np.array([0, 1.5]))
+    assert "datablock should be 2D" in str(e.value)
+    with pytest.raises(ValueError) as e:
+        dfmt.hydrolib_helpers.set_datablock(ts_empty, np.array([[0, 1.5, 2.5]]))
+    assert "datablock has 3 columns, but 2 columns are expected" in str(e.value)
+    
+    # other arrays are validated by hydrolib
+    with pytest.raises(ValueError) as e:
+        dfmt.hydrolib_helpers.set_datablock(ts_empty, np.array([[0, np.nan]], dtype=object))
+    assert "NaN is not supported in datablocks." in str(e.value)
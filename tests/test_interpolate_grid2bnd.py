@@ -248,6 +248,45 @@ def test_plipointsDataset_to_ForcingModel_drop_allnan_points():
     assert forcingmodel_object.forcing[1].name == 'abc_bnd_0004'
 
 
+@pytest.mark.unittest
+def test_plipointsDataset_to_ForcingModel_t3d_vector():
+    ncbnd_construct = get_ncbnd_construct()
+    dimn_point = ncbnd_construct['dimn_point']
+    dimn_depth = ncbnd_construct['dimn_depth']
+    varn_depth = ncbnd_construct['varn_depth']
+    varn_pointname = ncbnd_construct['varn_pointname']
+    
+    ux_values = np.arange(2*3*4, dtype=float).reshape(2,3,4) # time, z, node
+    ux_values[:,0,0] = np.nan # filled with the value below
+    ux_values[:,2,1] = np.nan # filled with the value above
+    ux_values[:,:,2] = np.nan # point on land
+    ds = xr.Dataset()
+    ds['ux'] = xr.DataArray(ux_values, dims=('time',dimn_depth,dimn_point)).assign_attrs(units='m/s')
+    ds['uy'] = (-ds['ux']).assign_attrs(units='m/s')
+    ds['time'] = xr.DataArray(pd.date_range('2020-01-01', periods=2, freq='1h'), dims='time')
+    ds['time'].encoding['units'] = 'minutes since 2020-01-01'
+    ds[varn_depth] = xr.DataArray([-10, -5, -1], dims=dimn_depth)
+    ds[varn_pointname] = xr.DataArray([f'bnd_{i+1:04d}' for i in range(4)], dims=dimn_point)
+    ds = ds.set_coords([varn_depth, varn_pointname])
+    
+    forcingmodel_object = dfmt.plipointsDataset_to_ForcingModel(plipointsDataset=ds)
+    assert [forcing.name for forcing in forcingmodel_object.forcing] == ['bnd_0001', 'bnd_0002', 'bnd_0004']
+    
+    # time in minutes and alternating ux/uy columns per layer, with the nans filled over depth
+    datablock_point0 = np.array(forcingmodel_object.forcing[0].datablock)
+    assert np.allclose(datablock_point0[:,0], [0, 60])
+    assert np.allclose(datablock_point0[0,1:], [4, -4, 4, -4, 8, -8])
+    datablock_point1 = np.array(forcingmodel_object.forcing[1].datablock)
+    assert np.allclose(datablock_point1[1,1:], [13, -13, 17, -17, 17, -17])
+    assert isinstance(forcingmodel_object.forcing[0].datablock[0][0], float)
+    
+    # nan values in one timestep are not supported by FM
+    ds['ux'][0,:,0] = np.nan
+    with pytest.raises(ValueError) as e:
+        dfmt.plipointsDataset_to_ForcingModel(plipointsDataset=ds)
+    assert "NaN is not supported in datablocks." in str(e.value)
+
+
 @pytest.mark.systemtest
 def test_open_prepare_dataset_correctdepths(tmp_path):
     """
@@ -404,6 +443,105 @@ def test_interp_regularnc_to_plipointsDataset():
     """
 
 
+@pytest.mark.unittest
+@pytest.mark.parametrize("descending", [False, True])
+def test_interp_regularnc_to_plipointsDataset_stencil(descending):
+    """
+    The single bilinear stencil with nearest fallback in dfmt.interp_regularnc_to_plipointsDataset()
+    should give the same values as the previous combination of linear and nearest interpolation with xarray
+    """
+    ncbnd_construct = get_ncbnd_construct()
+    dimn_point = ncbnd_construct['dimn_point']
+    varn_pointname = ncbnd_construct['varn_pointname']
+    
+    ds = cmems_dataset_4times().chunk({'time':2})
+    if descending:
+        ds = ds.isel(latitude=slice(None,None,-1))
+    
+    # points on grid values, halfway between grid values, on the bounds and inbetween
+    points_x = [-9.6, -9.55, -9.5, -9.45, -9.4, -9.52, -9.43, -9.58]
+    points_y = [42.9, 42.95, 43.1, 43.05, 43.0, 42.97, 43.08, 43.1]
+    geom = gpd.points_from_xy(x=points_x, y=points_y)
+    gdf = gpd.GeoDataFrame(data={varn_pointname:[f'name_{i+1:04d}' for i in range(len(geom))]}, geometry=geom)
+    data_interp = dfmt.interp_regularnc_to_plipointsDataset(ds, gdf, load=True)
+    
+    x_xr = xr.DataArray(points_x, dims=(dimn_point))
+    y_xr = xr.DataArray(points_y, dims=(dimn_point))
+    data_interp_lin = ds.interp(longitude=x_xr, latitude=y_xr, method='linear')
+    data_interp_near = ds.interp(longitude=x_xr, latitude=y_xr, method='nearest')
+    data_interp_expected = data_interp_lin.combine_first(data_interp_near)
+    
+    assert data_interp.so.dims == data_interp_expected.so.dims
+    assert np.allclose(data_interp.so, data_interp_expected.so, equal_nan=True)
+    assert data_interp.so.isnull().sum() > 0
+
+
+@pytest.mark.unittest
+def test_plipointsinterpolator_netcdf_cache(tmp_path):
+    ds = cmems_dataset_4times()
+    gdf = data_dcsm_gdf()
+    gdf.geometry = gpd.points_from_xy(x=[-9.55, -9.45, -9.4], y=[42.95, 43.05, 43.0])
+    data_interp = dfmt.interp_regularnc_to_plipointsDataset(ds, gdf, load=True)
+    
+    # cached on grid and points, also for other variables on the same grid
+    interpolator = dfmt.get_plipoints_interpolator(ds, gdf)
+    assert dfmt.get_plipoints_interpolator(ds.rename_vars({'so':'thetao'}), gdf) is interpolator
+    
+    # weights saved to and loaded from netcdf give the same result
+    file_weights = os.path.join(tmp_path, 'plipoints_weights.nc')
+    interpolator.to_netcdf(file_weights)
+    interpolator_loaded = dfmt.PlipointsInterpolator.from_netcdf(file_weights)
+    data_interp_loaded = dfmt.interp_regularnc_to_plipointsDataset(ds, gdf, interpolator=interpolator_loaded)
+    xr.testing.assert_identical(data_interp, data_interp_loaded)
+    
+    # dir_weights writes the weights once and reuses them
+    dfmt.interpolate_grid2bnd.PLIPOINTS_INTERPOLATOR_CACHE.clear()
+    dir_weights = os.path.join(tmp_path, 'weights')
+    dfmt.get_plipoints_interpolator(ds, gdf, dir_weights=dir_weights)
+    assert len(os.listdir(dir_weights)) == 1
+    dfmt.interpolate_grid2bnd.PLIPOINTS_INTERPOLATOR_CACHE.clear()
+    interpolator_dir = dfmt.get_plipoints_interpolator(ds, gdf, dir_weights=dir_weights)
+    assert np.allclose(interpolator_dir.weights, interpolator.weights)
+    assert len(os.listdir(dir_weights)) == 1
+    
+    # other grid
+    ds_other = ds.assign_coords(longitude=ds.longitude+0.01)
+    with pytest.raises(ValueError) as e:
+        interpolator.interpolate(ds_other)
+    assert "do not match the grid of the PlipointsInterpolator" in str(e.value)
+
+
+@pytest.mark.unittest
+def test_plipointsinterpolator_bbox(capsys):
+    ds = cmems_dataset_4times()
+    ds = ds.reindex(longitude=np.linspace(-10,-9.1,10).round(1), latitude=np.linspace(42.5,43.4,10).round(1))
+    ds = ds.chunk({'time':2})
+    gdf = data_dcsm_gdf()
+    gdf.geometry = gpd.points_from_xy(x=[-9.55, -9.45, -9.4], y=[42.95, 43.05, 43.0])
+    interpolator = dfmt.PlipointsInterpolator(ds, gdf)
+    
+    # bounding box of the points padded by the stencil
+    bbox_slices = interpolator.bbox_slices
+    assert ds.longitude.isel(longitude=bbox_slices['longitude']).to_numpy().tolist() == [-9.6, -9.5, -9.4]
+    assert ds.latitude.isel(latitude=bbox_slices['latitude']).to_numpy().tolist() == [42.9, 43.0, 43.1]
+    
+    data_interp = interpolator.interpolate(ds)
+    captured = capsys.readouterr()
+    assert "bounding box of plipoints: reading 0.00 of 0.02 MB available (9.0%)" in captured.out
+    data_interp_expected = interpolator.interpolate(ds.isel(bbox_slices).compute().reindex_like(ds))
+    assert np.allclose(data_interp.so, data_interp_expected.so, equal_nan=True)
+
+
+@pytest.mark.unittest
+def test_interp_regularnc_to_plipointsDataset_outofbounds():
+    ds = cmems_dataset_notime()
+    gdf = data_dcsm_gdf()
+    gdf.geometry = gpd.points_from_xy(x=[-9.5, -9.7, -9.5], y=[43, 43, 43.2])
+    with pytest.raises(ValueError) as e:
+        dfmt.interp_regularnc_to_plipointsDataset(ds, gdf, load=False)
+    assert "2 of requested pli points are out of bounds" in str(e.value)
+
+
 @pytest.mark.unittest
 def test_interp_regularnc_to_plipointsDataset_checkvardimnames():
     """
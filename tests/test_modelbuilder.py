@@ -86,6 +86,44 @@ def test_cmems_nc_to_ini_midnight_centered(tmp_path):
     assert ds_out['depth'].attrs['positive'] == 'up'
 
 
+@pytest.mark.systemtest
+def test_cmems_nc_to_bc_max_workers(tmp_path):
+    ds = cmems_dataset_4times()
+    ds["time"] = pd.date_range("2019-12-31", periods=4, freq="1D")
+    dir_pattern = os.path.join(tmp_path, "cmems_{ncvarname}.nc")
+    for varn, units in zip(["so", "thetao", "uo", "vo"], ["1e-3", "degC", "m/s", "m/s"]):
+        ds_var = ds.rename({"so":varn})
+        ds_var[varn] = ds_var[varn].assign_attrs(units=units)
+        ds_var.to_netcdf(dir_pattern.format(ncvarname=varn))
+    
+    file_pli = os.path.join(tmp_path, "bnd.pli")
+    points = [hcdfm.Point(x=-9.55, y=42.95, data=[]), hcdfm.Point(x=-9.45, y=43.05, data=[])]
+    polyobject = hcdfm.PolyObject(metadata=hcdfm.Metadata(name="bnd", n_rows=2, n_columns=2), points=points)
+    hcdfm.PolyFile(objects=[polyobject]).save(file_pli)
+    
+    list_quantities = ["salinitybnd", "temperaturebnd", "uxuyadvectionvelocitybnd"]
+    kwargs = dict(list_quantities=list_quantities, tstart="2020-01-01", tstop="2020-01-02",
+                  file_pli=file_pli, dir_pattern=dir_pattern)
+    dir_sequential = os.path.join(tmp_path, "sequential")
+    dir_parallel = os.path.join(tmp_path, "parallel")
+    os.makedirs(dir_sequential)
+    os.makedirs(dir_parallel)
+    ext_sequential = dfmt.cmems_nc_to_bc(ext_bnd=hcdfm.ExtModel(), dir_output=dir_sequential, **kwargs)
+    dfmt.interpolate_grid2bnd.PLIPOINTS_INTERPOLATOR_CACHE.clear()
+    ext_parallel = dfmt.cmems_nc_to_bc(ext_bnd=hcdfm.ExtModel(), dir_output=dir_parallel, max_workers=2, **kwargs)
+    # the interpolator is derived once in this process and passed to the workers
+    assert len(dfmt.interpolate_grid2bnd.PLIPOINTS_INTERPOLATOR_CACHE) == 1
+    
+    # boundaries in the order of list_quantities and identical bc files
+    assert [boundary.quantity for boundary in ext_parallel.boundary] == list_quantities
+    for boundary_sequential, boundary_parallel in zip(ext_sequential.boundary, ext_parallel.boundary):
+        file_bc_sequential = boundary_sequential.forcingfile.filepath
+        file_bc_parallel = boundary_parallel.forcingfile.filepath
+        assert os.path.basename(file_bc_sequential) == os.path.basename(file_bc_parallel)
+        with open(file_bc_sequential) as f_sequential, open(file_bc_parallel) as f_parallel:
+            assert f_sequential.read() == f_parallel.read()
+
+
 @pytest.mark.unittest
 def test_create_model_exec_files_none(tmp_path):
     mdu_file = tmp_path / "temp_test.mdu"
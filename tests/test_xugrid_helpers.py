@@ -6,14 +6,24 @@ Created on Fri Jul 14 12:04:27 2023
 """
 
 import os
+import gc
 import pytest
 import xarray as xr
 import xugrid as xu
 import dfm_tools as dfmt
 import numpy as np
+import dask
 from dfm_tools.xugrid_helpers import (remove_unassociated_edges,
-                                      get_vertical_dimensions
+                                      get_vertical_dimensions,
+                                      get_topology_cache_file,
+                                      write_topology_cache,
+                                      read_topology_cache,
+                                      get_ghostcell_keep_indices,
+                                      get_curvilinear_face_node_connectivity,
+                                      get_edge_connectivity,
+                                      get_chunks_fromsize,
                                       )
+from dfm_tools.xarray_helpers import file_to_list
 
 #TODO: many xugrid_helpers tests are still in test_dfm_tools.py
 
@@ -66,6 +76,243 @@ def test_remove_nan_fillvalue_attrs(tmp_path):
     assert count_dfmt == 0
 
 
+@pytest.mark.unittest
+def test_open_partitioned_dataset_max_workers():
+    file_nc = dfmt.data.fm_grevelingen_map(return_filepath=True)
+    uds_seq = dfmt.open_partitioned_dataset(file_nc)
+    uds_par = dfmt.open_partitioned_dataset(file_nc, max_workers=4)
+    
+    assert uds_par.grid.n_face == uds_seq.grid.n_face
+    assert np.array_equal(uds_par.grid.face_node_connectivity, uds_seq.grid.face_node_connectivity)
+    assert uds_par['mesh2d_s1'].isel(time=-1).equals(uds_seq['mesh2d_s1'].isel(time=-1))
+
+
+@pytest.mark.unittest
+def test_open_partitioned_dataset_max_workers_synthetic(tmp_path):
+    # four partitions of a 8x4 grid with a column of ghostcells on each internal boundary
+    x_bounds = np.column_stack([np.arange(8), np.arange(1,9)])
+    y_bounds = np.column_stack([np.arange(4), np.arange(1,5)])
+    grid = xu.Ugrid2d.from_structured_bounds(x_bounds, y_bounds)
+    face_x = grid.face_x
+    domain = (face_x // 2).astype(int)
+    s1 = np.arange(3)[:,np.newaxis] + face_x
+    file_nc_list = []
+    for idomain in range(4):
+        face_index = np.flatnonzero(np.abs(face_x - (2*idomain+1)) <= 2)
+        uds = xu.UgridDataset(grids=[grid.topology_subset(face_index)])
+        uds['mesh2d_flowelem_domain'] = xr.DataArray(domain[face_index], dims=grid.face_dimension)
+        uds['mesh2d_s1'] = xr.DataArray(s1[:,face_index], dims=('time',grid.face_dimension))
+        file_nc = os.path.join(tmp_path, f'synthetic_{idomain:04d}_map.nc')
+        uds.ugrid.to_netcdf(file_nc)
+        file_nc_list.append(file_nc)
+    
+    uds_seq = dfmt.open_partitioned_dataset(file_nc_list)
+    uds_par = dfmt.open_partitioned_dataset(file_nc_list, max_workers=3)
+    
+    assert uds_seq.grid.n_face == grid.n_face
+    assert uds_par.grid.n_face == uds_seq.grid.n_face
+    assert np.array_equal(uds_par.grid.face_node_connectivity, uds_seq.grid.face_node_connectivity)
+    assert uds_par['mesh2d_s1'].equals(uds_seq['mesh2d_s1'])
+
+
+@pytest.mark.unittest
+def test_open_partitioned_dataset_cache_topology():
+    file_nc = dfmt.data.fm_grevelingen_map(return_filepath=True)
+    file_nc_list = file_to_list(file_nc)
+    file_cache = get_topology_cache_file(file_nc_list, remove_edges=False, remove_ghost=True)
+    if os.path.exists(file_cache):
+        os.remove(file_cache)
+    
+    uds_nocache = dfmt.open_partitioned_dataset(file_nc)
+    uds_writecache = dfmt.open_partitioned_dataset(file_nc, cache_topology=True)
+    assert os.path.exists(file_cache)
+    uds_fromcache = dfmt.open_partitioned_dataset(file_nc, cache_topology=True)
+    
+    for uds in [uds_writecache, uds_fromcache]:
+        assert set(uds.variables) == set(uds_nocache.variables)
+        assert np.array_equal(uds.grid.face_node_connectivity, uds_nocache.grid.face_node_connectivity)
+        assert np.array_equal(uds.grid.edge_node_connectivity, uds_nocache.grid.edge_node_connectivity)
+        assert uds['mesh2d_sa1'].isel(time=-1).equals(uds_nocache['mesh2d_sa1'].isel(time=-1))
+
+
+@pytest.mark.unittest
+def test_write_topology_cache(tmp_path):
+    x_bounds = np.column_stack([np.arange(4), np.arange(1,5)])
+    y_bounds = np.column_stack([np.arange(2), np.arange(1,3)])
+    grid = xu.Ugrid2d.from_structured_bounds(x_bounds, y_bounds)
+    indexes = {grid.face_dimension:[np.array([0,1,2,3]), np.array([0,1,2,3])]}
+    file_cache = os.path.join(tmp_path, 'synthetic_topology.nc')
+    write_topology_cache(grid, indexes, file_cache=file_cache)
+    # the temporary file is renamed to the cachefile
+    assert os.listdir(tmp_path) == ['synthetic_topology.nc']
+    
+    grid_cache, indexes_cache = read_topology_cache(file_cache, npartitions=2)
+    assert np.array_equal(grid_cache.face_node_connectivity, grid.face_node_connectivity)
+    for index, index_cache in zip(indexes[grid.face_dimension], indexes_cache[grid.face_dimension]):
+        assert np.array_equal(index, index_cache)
+
+
+@pytest.mark.unittest
+def test_partitioned_map_to_zarr(tmp_path):
+    file_nc = dfmt.data.fm_grevelingen_map(return_filepath=True)
+    store = os.path.join(tmp_path, "Grevelingen-FM_merged_map.zarr")
+    dfmt.partitioned_map_to_zarr(file_nc, store, target_chunksize_mb=1)
+    
+    uds_nc = dfmt.open_partitioned_dataset(file_nc)
+    uds_zarr = dfmt.open_dataset_zarr(store)
+    
+    assert uds_zarr.grid.n_face == uds_nc.grid.n_face
+    assert uds_zarr.sizes['time'] == uds_nc.sizes['time']
+    assert np.allclose(uds_zarr['mesh2d_s1'].isel(time=-1), uds_nc['mesh2d_s1'].isel(time=-1))
+
+
+@pytest.mark.unittest
+def test_partitioned_map_to_zarr_dimn_time(tmp_path):
+    x_bounds = np.column_stack([np.arange(4), np.arange(1,5)])
+    y_bounds = np.column_stack([np.arange(2), np.arange(1,3)])
+    grid = xu.Ugrid2d.from_structured_bounds(x_bounds, y_bounds)
+    uds = xu.UgridDataset(grids=[grid])
+    uds['mesh2d_s1'] = xr.DataArray(np.arange(5*grid.n_face, dtype=float).reshape(5,-1), dims=('nmesh2d_time',grid.face_dimension))
+    file_nc = os.path.join(tmp_path, 'synthetic_map.nc')
+    uds.ugrid.to_netcdf(file_nc)
+    
+    # two timesteps per chunk, so the store is written in three parts
+    chunks = get_chunks_fromsize(uds, target_chunksize_mb=2*grid.n_face*8/1e6, dimn_time='nmesh2d_time')
+    assert chunks == {'nmesh2d_time':2, grid.face_dimension:-1}
+    store = os.path.join(tmp_path, 'synthetic_map.zarr')
+    dfmt.partitioned_map_to_zarr(file_nc, store, chunks=chunks, dimn_time='nmesh2d_time')
+    uds_zarr = dfmt.open_dataset_zarr(store)
+    assert np.array_equal(uds_zarr['mesh2d_s1'], uds['mesh2d_s1'])
+    
+    # without time-dependent variables the time dimension is not chunked
+    uds_notime = uds.assign_coords(nmesh2d_time=np.arange(5)).drop_vars('mesh2d_s1')
+    chunks = get_chunks_fromsize(uds_notime, dimn_time='nmesh2d_time')
+    assert 'nmesh2d_time' not in chunks
+
+
+@pytest.mark.unittest
+def test_get_ghostcell_keep_indices():
+    # two partitions of a 4x1 grid with one ghostcell each
+    x_bounds = np.array([[0,1],[1,2],[2,3],[3,4]])
+    y_bounds = np.array([[0,1]])
+    grid = xu.Ugrid2d.from_structured_bounds(x_bounds, y_bounds)
+    domain = np.array([0,0,1,1])
+    partitions = []
+    for face_index in [[0,1,2], [1,2,3]]:
+        uds = xu.UgridDataset(grids=[grid.topology_subset(np.array(face_index))])
+        uds['mesh2d_flowelem_domain'] = xr.DataArray(domain[face_index], dims=grid.face_dimension)
+        partitions.append(uds)
+    
+    file_nc_list = ['model_0000_map.nc', 'model_0001_map.nc']
+    
+    keep_indices = get_ghostcell_keep_indices(partitions, file_nc_list)
+    assert np.array_equal(keep_indices[0], [0,1])
+    assert np.array_equal(keep_indices[1], [1,2])
+    
+    # without domain number in the filename, all faces are kept
+    keep_indices = get_ghostcell_keep_indices(partitions, ['model_map.nc', 'model_0001_map.nc'])
+    assert keep_indices[0] is None
+    assert np.array_equal(keep_indices[1], [1,2])
+
+
+@pytest.mark.unittest
+def test_get_ghostcell_keep_indices_tie():
+    # the second partition has as many faces of its own domain as the first partition has ghostcells of it
+    x_bounds = np.array([[0,1],[1,2],[2,3],[3,4]])
+    y_bounds = np.array([[0,1]])
+    grid = xu.Ugrid2d.from_structured_bounds(x_bounds, y_bounds)
+    domain = np.array([0,0,1,1])
+    partitions = []
+    for face_index in [[0,1,2,3], [1,2,3]]:
+        uds = xu.UgridDataset(grids=[grid.topology_subset(np.array(face_index))])
+        uds['mesh2d_flowelem_domain'] = xr.DataArray(domain[face_index], dims=grid.face_dimension)
+        partitions.append(uds)
+    file_nc_list = ['model_0000_map.nc', 'model_0001_map.nc']
+    
+    keep_indices = get_ghostcell_keep_indices(partitions, file_nc_list)
+    assert np.array_equal(keep_indices[0], [0,1])
+    assert np.array_equal(keep_indices[1], [1,2])
+
+
+@pytest.mark.unittest
+def test_get_face_locator():
+    x_bounds = np.array([[0,1],[1,2],[2,3],[3,4]])
+    y_bounds = np.array([[0,1],[1,2]])
+    grid = xu.Ugrid2d.from_structured_bounds(x_bounds, y_bounds)
+    grid_copy = xu.Ugrid2d.from_structured_bounds(x_bounds, y_bounds)
+    
+    face_locator = dfmt.get_face_locator(grid)
+    # cached on topology, so also reused for another grid object
+    assert dfmt.get_face_locator(grid_copy) is face_locator
+    # the topology is hashed once per grid object and the hash is dropped with the grid
+    assert dfmt.xugrid_helpers.GRID_KEY_CACHE[grid_copy] == face_locator.key
+    n_keys = len(dfmt.xugrid_helpers.GRID_KEY_CACHE)
+    del grid_copy
+    gc.collect()
+    assert len(dfmt.xugrid_helpers.GRID_KEY_CACHE) == n_keys - 1
+    grid_copy = xu.Ugrid2d.from_structured_bounds(x_bounds, y_bounds)
+    
+    xy = np.array([[0.5,0.5],[3.5,1.5],[10,10]])
+    face_index = face_locator.locate_points(xy)
+    assert np.array_equal(face_index, grid.locate_points(xy))
+    assert face_index[-1] == -1
+    assert len(face_locator._face_index_cache) == 1
+    
+    # the face indices of the least recently used points are removed
+    for i in range(1, dfmt.xugrid_helpers.FACE_INDEX_CACHE_MAXSIZE):
+        face_locator.locate_points(xy + i)
+    xy_key_first = list(face_locator._face_index_cache)[0]
+    xy_key_second = list(face_locator._face_index_cache)[1]
+    face_locator.locate_points(xy)
+    face_locator.locate_points(xy + 10)
+    assert len(face_locator._face_index_cache) == dfmt.xugrid_helpers.FACE_INDEX_CACHE_MAXSIZE
+    assert xy_key_first in face_locator._face_index_cache
+    assert xy_key_second not in face_locator._face_index_cache
+    
+    face_locator.check_grid(grid_copy)
+    grid_other = xu.Ugrid2d.from_structured_bounds(x_bounds+1, y_bounds)
+    with pytest.raises(ValueError) as e:
+        face_locator.check_grid(grid_other)
+    assert "topology of the grid does not match" in str(e.value)
+
+
+@pytest.mark.unittest
+def test_face_locator_intersect_edges_prefilter():
+    x_bounds = np.column_stack([np.arange(50), np.arange(1,51)]).astype(float)
+    y_bounds = np.column_stack([np.arange(40), np.arange(1,41)]).astype(float)
+    grid = xu.Ugrid2d.from_structured_bounds(x_bounds, y_bounds)
+    edges = np.array([[[2.5,3.5],[8.2,6.1]],
+                      [[8.2,6.1],[9.7,12.3]]])
+    
+    face_locator = dfmt.FaceLocator(grid.copy())
+    edge_index, face_index, intersections = face_locator.intersect_edges(edges)
+    # the prefilter does not build the celltree of the entire grid
+    assert face_locator._celltree is None
+    edge_index_full, face_index_full, intersections_full = grid.intersect_edges(edges)
+    
+    isort = np.lexsort((face_index, edge_index))
+    isort_full = np.lexsort((face_index_full, edge_index_full))
+    assert np.array_equal(edge_index[isort], edge_index_full[isort_full])
+    assert np.array_equal(face_index[isort], face_index_full[isort_full])
+    assert np.allclose(intersections[isort], intersections_full[isort_full])
+    
+    # edges outside of the grid
+    edge_index, face_index, intersections = face_locator.intersect_edges(edges + 100)
+    assert len(face_index) == 0
+    
+    # the celltree of the prefiltered faces is reused for the same edges
+    assert len(face_locator._celltree_subset_cache) == 1
+    nfaces_subset = face_locator._celltree_subset_nfaces
+    face_locator.intersect_edges(edges)
+    assert face_locator._celltree_subset_nfaces == nfaces_subset
+    
+    # once the prefiltered celltrees contained as many faces as the grid, the celltree of the entire grid is used
+    face_locator._celltree_subset_nfaces = grid.n_face
+    edge_index, face_index, intersections = face_locator.intersect_edges(edges + 1)
+    assert face_locator._celltree is not None
+    assert np.array_equal(np.sort(face_index), np.sort(grid.intersect_edges(edges + 1)[1]))
+
+
 @pytest.mark.unittest
 def test_uds_auto_set_crs_cartesian():
     file_nc = dfmt.data.fm_grevelingen_map(return_filepath=True).replace('0*','0002')
@@ -161,6 +408,108 @@ def test_uda_edges_to_faces_interfaces_to_centers():
         assert (np.abs(uda_face_sel.to_numpy()-uda_face_sel_expected)<1e-6).all()
 
 
+@pytest.mark.unittest
+def test_uda_nodes_to_faces_sparse_chunked():
+    # one triangle and one square, so the face_node_connectivity contains a fillvalue
+    node_x = np.array([0, 1, 1, 0, 2], dtype=float)
+    node_y = np.array([0, 0, 1, 1, 0], dtype=float)
+    face_node_connectivity = np.array([[0, 1, 2, 3],
+                                       [1, 4, 2, -1]])
+    grid = xu.Ugrid2d(node_x, node_y, -1, face_node_connectivity)
+    
+    node_values = np.array([[1, 2, 3, 4, 5],
+                            [1, np.nan, 3, 4, 5]])
+    uda_node = xu.UgridDataArray(xr.DataArray(node_values, dims=('time', grid.node_dimension)), grid=grid)
+    uda_node = uda_node.chunk({'time':1, grid.node_dimension:2})
+    uda_face = dfmt.uda_to_faces(uda_node)
+    
+    assert uda_face.dims == ('time', grid.face_dimension)
+    assert uda_face.chunks[0] == (1, 1)
+    assert hasattr(uda_face,'grid')
+    expected = np.array([[2.5, 10/3],
+                         [8/3, 4.0]])
+    assert np.allclose(uda_face.to_numpy(), expected)
+
+
+@pytest.mark.unittest
+def test_uda_to_faces_regridder_cache():
+    x_bounds = np.array([[0,1],[1,3]], dtype=float)
+    y_bounds = np.array([[0,1]], dtype=float)
+    grid = xu.Ugrid2d.from_structured_bounds(x_bounds, y_bounds)
+    grid_copy = xu.Ugrid2d.from_structured_bounds(x_bounds, y_bounds)
+    dfmt.xugrid_helpers.LOCATION_REGRIDDER_CACHE.clear()
+    
+    uda_node = xu.UgridDataArray(xr.DataArray(grid.node_x, dims=(grid.node_dimension,)), grid=grid)
+    uda_face = dfmt.uda_to_faces(uda_node)
+    regridder = dfmt.xugrid_helpers.get_location_regridder(grid)
+    # the regridder is reused for another grid object with the same topology
+    uda_node_copy = xu.UgridDataArray(xr.DataArray(grid_copy.node_x, dims=(grid_copy.node_dimension,)), grid=grid_copy)
+    uda_face_copy = dfmt.uda_to_faces(uda_node_copy)
+    assert len(dfmt.xugrid_helpers.LOCATION_REGRIDDER_CACHE) == 1
+    assert dfmt.xugrid_helpers.get_location_regridder(grid_copy) is regridder
+    assert uda_face_copy.grid is grid_copy
+    assert np.allclose(uda_face_copy, uda_face)
+    
+    # a grid with another order of the edges gets a new regridder for edge variables
+    edge_node_connectivity = grid.edge_node_connectivity[::-1]
+    grid_edges = xu.Ugrid2d(grid.node_x, grid.node_y, -1, grid.face_node_connectivity, edge_node_connectivity=edge_node_connectivity)
+    uda_edge = xu.UgridDataArray(xr.DataArray(grid_edges.edge_x, dims=(grid_edges.edge_dimension,)), grid=grid_edges)
+    uda_face_edges = dfmt.uda_to_faces(uda_edge)
+    assert dfmt.xugrid_helpers.get_location_regridder(grid_edges) is not regridder
+    assert np.allclose(uda_face_edges, grid.face_x)
+
+
+@pytest.mark.unittest
+def test_location_regridder():
+    x_bounds = np.array([[0,1],[1,3]], dtype=float)
+    y_bounds = np.array([[0,1]], dtype=float)
+    grid = xu.Ugrid2d.from_structured_bounds(x_bounds, y_bounds)
+    regridder = dfmt.LocationRegridder(grid)
+    
+    uda_face = xu.UgridDataArray(xr.DataArray(np.array([1.0, 4.0]), dims=(grid.face_dimension,)), grid=grid)
+    uda_node = regridder.regrid(uda_face, target='node')
+    uda_node_area = regridder.regrid(uda_face, target='node', weights='area')
+    assert uda_node.dims == (grid.node_dimension,)
+    assert uda_node.attrs['location'] == 'node'
+    # the nodes at x=1 are shared by both faces, the face with x=1 to x=3 has the double area
+    bool_shared = grid.node_x == 1
+    assert np.allclose(uda_node.to_numpy()[bool_shared], 2.5)
+    assert np.allclose(uda_node_area.to_numpy()[bool_shared], 3.0)
+    assert np.allclose(uda_node.to_numpy()[grid.node_x == 0], 1.0)
+    
+    uda_edge = regridder.regrid(uda_node, target='edge')
+    assert uda_edge.dims == (grid.edge_dimension,)
+    uda_face_back = regridder.regrid(uda_edge, target='face')
+    assert np.allclose(uda_face_back, [1.75, 3.25])
+    
+    assert regridder.get_operator('face', 'node').shape == (grid.n_node, grid.n_face)
+    with pytest.raises(ValueError) as e:
+        regridder.get_operator('node', 'face', weights='area')
+    assert "only supported for source location 'face'" in str(e.value)
+
+
+@pytest.mark.unittest
+def test_uda_interfaces_to_centers_stencil():
+    grid = xu.Ugrid2d.from_structured_bounds(np.array([[0,1],[1,2]], dtype=float), np.array([[0,1]], dtype=float))
+    ds_grid = grid.to_dataset()
+    ds_grid[grid.name] = ds_grid[grid.name].assign_attrs(layer_dimension='mesh2d_nLayers', interface_dimension='mesh2d_nInterfaces')
+    grid = xu.Ugrid2d.from_dataset(ds_grid)
+    
+    data = np.array([[[-4, -2, 0], [-3, np.nan, 1]]]*3, dtype=float)
+    da_int = xr.DataArray(data, dims=('time', grid.face_dimension, 'mesh2d_nInterfaces'), attrs={'units':'m'})
+    uda_int = xu.UgridDataArray(da_int, grid=grid).chunk({'time':1})
+    uda_int = uda_int.assign_coords(mesh2d_nInterfaces=[0, 1, 2])
+    uda_cen = dfmt.uda_interfaces_to_centers(uda_int)
+    
+    assert uda_cen.dims == ('time', grid.face_dimension, 'mesh2d_nLayers')
+    assert uda_cen.chunks[0] == (1, 1, 1)
+    assert 'mesh2d_nInterfaces' not in uda_cen.coords
+    assert uda_cen.attrs == {'units':'m'}
+    assert hasattr(uda_cen,'grid')
+    uda_cen_expected = np.array([[-3, -1], [np.nan, np.nan]])
+    assert np.allclose(uda_cen.isel(time=0), uda_cen_expected, equal_nan=True)
+
+
 @pytest.mark.unittest
 def test_uda_nodes_to_faces():
     file_nc = dfmt.data.fm_grevelingen_net(return_filepath=True)
@@ -205,6 +554,62 @@ def test_open_dataset_delft3d4():
     uds.umag.isel(time=-1, KMAXOUT_RESTR=-1).ugrid.plot()
 
 
+@pytest.mark.unittest
+def test_open_dataset_delft3d4_synthetic(tmp_path):
+    # small trim file with a dummy row/column of corners and U1/V1 with fillvalues
+    mmax, nmax = 5, 4
+    xcor, ycor = np.meshgrid(1000 + np.arange(mmax)*100.0, 1000 + np.arange(nmax)*50.0, indexing='ij')
+    xcor[-1,:] = ycor[-1,:] = xcor[:,-1] = ycor[:,-1] = 0
+    u1 = np.ones((3,2,mmax,nmax))
+    v1 = np.zeros((3,2,mmax,nmax))
+    u1[:,:,2,2] = -999
+    v1[:,:,2,2] = -999
+    ds = xr.Dataset()
+    ds['XCOR'] = xr.DataArray(xcor, dims=('MC','NC'), attrs={'grid':'grid'})
+    ds['YCOR'] = xr.DataArray(ycor, dims=('MC','NC'), attrs={'grid':'grid'})
+    ds['ALFAS'] = xr.DataArray(np.zeros((mmax,nmax)), dims=('M','N'), attrs={'grid':'grid'})
+    ds['KCV'] = xr.DataArray(np.ones((mmax,nmax)), dims=('M','NC'), attrs={'grid':'grid'})
+    ds['S1'] = xr.DataArray(np.arange(3*mmax*nmax).reshape(3,mmax,nmax), dims=('time','M','N'), attrs={'grid':'grid'})
+    ds['U1'] = xr.DataArray(u1, dims=('time','KMAXOUT_RESTR','MC','N'), attrs={'grid':'grid'})
+    ds['V1'] = xr.DataArray(v1, dims=('time','KMAXOUT_RESTR','M','NC'), attrs={'grid':'grid'})
+    ds['grid'] = xr.DataArray(0, attrs={'vertical_dimensions':'KMAXOUT: KMAXOUT_RESTR'})
+    file_nc = os.path.join(tmp_path, 'trim-synthetic.nc')
+    ds.to_netcdf(file_nc)
+    
+    uds = dfmt.open_dataset_delft3d4(file_nc, chunks={'time':1})
+    
+    assert uds.grid.n_face == (mmax-2) * (nmax-2)
+    assert "vertical_dimensions" in uds.grid.attrs
+    # the face_edge_connectivity derived by xugrid is consistent with the edges passed to the grid
+    face_edge_nodes = np.sort(uds.grid.edge_node_connectivity[uds.grid.face_edge_connectivity], axis=2)
+    face_node_pairs = np.sort(np.stack([uds.grid.face_node_connectivity,
+                                        np.roll(uds.grid.face_node_connectivity, -1, axis=1)], axis=2), axis=2)
+    assert np.array_equal(face_edge_nodes, face_node_pairs)
+    assert set(uds.data_vars) == set(['ALFAS', 'S1', 'ux', 'uy', 'umag', 'udir'])
+    assert "grid" not in uds.S1.attrs
+    # cell centers without the first M/N
+    assert np.array_equal(uds.S1.isel(time=0).to_numpy(), ds.S1.isel(time=0, M=slice(1,-1), N=slice(1,-1)).to_numpy().ravel())
+    # velocities are derived lazily with the chunks of the other dimensions
+    assert isinstance(uds.ux.data, dask.array.Array)
+    assert uds.ux.chunks == ((1,1,1), (2,), (uds.grid.n_face,))
+    ux = uds.ux.isel(time=0, KMAXOUT_RESTR=0).to_numpy()
+    # the face in the corner of the masked U1/V1 points is nan, the neighbouring face is averaged with zero
+    assert np.isnan(ux[3])
+    assert np.allclose(ux[[0,1,2,4]], 1)
+    assert np.allclose(ux[5], 0.5)
+    assert np.allclose(uds.udir.isel(time=0, KMAXOUT_RESTR=0).to_numpy()[[0,1,2,4,5]], 0)
+    
+    # the grid is derived once per XCOR/YCOR, but copies are returned so they can be modified independently
+    dfmt.xugrid_helpers.DELFT3D4_GRID_CACHE.clear()
+    uds = dfmt.open_dataset_delft3d4(file_nc)
+    uds2 = dfmt.open_dataset_delft3d4(file_nc)
+    assert len(dfmt.xugrid_helpers.DELFT3D4_GRID_CACHE) == 1
+    assert uds2.grid is not uds.grid
+    assert np.array_equal(uds2.grid.face_node_connectivity, uds.grid.face_node_connectivity)
+    uds.ugrid.set_crs('EPSG:28992')
+    assert uds2.grid.crs is None
+
+
 @pytest.mark.requireslocaldata
 @pytest.mark.unittest
 def test_open_dataset_curvilinear():
@@ -220,3 +625,79 @@ def test_open_dataset_curvilinear():
     
     # check if all zero-sized cells were dropped: https://github.com/Deltares/dfm_tools/issues/926
     assert (uds.grid.area > 0).all()
+
+
+def get_curvilinear_vertices(n_i=12, n_j=6):
+    # global curvilinear vertices with a periodic seam at 0/360 and a row of cells collapsing at the pole
+    lon_bnds, lat_bnds = np.meshgrid(np.linspace(0, 360, n_i+1), np.linspace(-80, 90, n_j+1), indexing='ij')
+    corners = [(0,0), (1,0), (1,1), (0,1)]
+    vertices_lon = np.stack([lon_bnds[a:a+n_i, b:b+n_j] for a,b in corners], axis=-1)
+    vertices_lat = np.stack([lat_bnds[a:a+n_i, b:b+n_j] for a,b in corners], axis=-1)
+    vertices_lon[:,-1,2:] = 0
+    vertices_lon[2,2] = np.nan
+    vertices_lat[2,2] = np.nan
+    return vertices_lon, vertices_lat
+
+
+@pytest.mark.unittest
+def test_get_curvilinear_face_node_connectivity():
+    vertices_lon, vertices_lat = get_curvilinear_vertices()
+    vertices_lon = (vertices_lon+180) % 360 - 180
+    vertices_lon[5,3,1] += 0.01
+    
+    node_x, node_y, fnc = get_curvilinear_face_node_connectivity(vertices_lon, vertices_lat)
+    
+    # equal to the numbering with np.unique, apart from the arbitrary order of the nan nodes
+    face_xy_vertices_flat = np.stack([vertices_lon, vertices_lat], axis=-1).reshape(-1,2)
+    uniq, inv = np.unique(face_xy_vertices_flat, axis=0, return_inverse=True)
+    bool_notnan = ~np.isnan(vertices_lon.ravel())
+    assert np.array_equal(node_x, uniq[:,0], equal_nan=True)
+    assert np.array_equal(node_y, uniq[:,1], equal_nan=True)
+    assert np.array_equal(fnc.ravel()[bool_notnan], inv.ravel()[bool_notnan])
+    
+    # equal edges as derived by xugrid, for the faces without nan or duplicate nodes
+    bool_valid = ~np.isnan(vertices_lon[:,:-1]).any(axis=-1)
+    fnc_valid = fnc[:,:-1][bool_valid]
+    grid = xu.Ugrid2d(node_x, node_y, -1, fnc_valid)
+    edge_node_connectivity, face_edge_connectivity = get_edge_connectivity(fnc_valid, len(node_x))
+    assert np.array_equal(edge_node_connectivity, grid.edge_node_connectivity)
+    assert np.array_equal(face_edge_connectivity, grid.face_edge_connectivity)
+
+
+@pytest.mark.unittest
+def test_open_dataset_curvilinear_synthetic(tmp_path):
+    n_i, n_j = 12, 6
+    vertices_lon, vertices_lat = get_curvilinear_vertices(n_i=n_i, n_j=n_j)
+    ds = xr.Dataset()
+    # vertices with different i/j order than the data variables
+    ds['vertices_longitude'] = xr.DataArray(vertices_lon.transpose(1,0,2), dims=('j','i','vertices'))
+    ds['vertices_latitude'] = xr.DataArray(vertices_lat.transpose(1,0,2), dims=('j','i','vertices'))
+    ds['longitude'] = ds['vertices_longitude'].mean('vertices')
+    ds['latitude'] = ds['vertices_latitude'].mean('vertices')
+    ds = ds.set_coords(['longitude','latitude'])
+    ds['vo'] = (ds['longitude'] + 1000*ds['latitude']).expand_dims(time=3, lev=2).transpose('time','lev','i','j')
+    ds['lev_bnds'] = xr.DataArray(np.zeros((2,2)), dims=('lev','bnds'))
+    file_nc = os.path.join(tmp_path, 'curvilinear.nc')
+    ds.to_netcdf(file_nc)
+    
+    uds = dfmt.open_dataset_curvilinear(file_nc, convert_360to180=True)
+    
+    assert set(uds.coords) == set(['mesh2d_nFaces'])
+    assert set(uds.data_vars) == set(['lev_bnds', 'vo'])
+    assert uds.lev_bnds.dims == ('lev', 'bnds')
+    assert uds.vo.dims == ('time', 'lev', 'mesh2d_nFaces')
+    # the pole row and the cell with nan vertices are dropped
+    assert uds.grid.n_face == n_i * (n_j-1) - 1
+    # periodic seam nodes are merged
+    assert uds.grid.n_node == n_i * n_j
+    assert (uds.grid.area > 0).all()
+    # the face_edge_connectivity derived by xugrid is consistent with the edges passed to the grid
+    face_edge_nodes = np.sort(uds.grid.edge_node_connectivity[uds.grid.face_edge_connectivity], axis=2)
+    face_node_pairs = np.sort(np.stack([uds.grid.face_node_connectivity,
+                                        np.roll(uds.grid.face_node_connectivity, -1, axis=1)], axis=2), axis=2)
+    assert np.array_equal(face_edge_nodes, face_node_pairs)
+    # data is mapped to the correct faces (except the faces that cross the antimeridian after conversion)
+    vo_expected = uds.grid.face_x % 360 + 1000*uds.grid.face_y
+    bool_nocross = np.ptp(uds.grid.face_node_coordinates[:,:,0], axis=1) < 180
+    assert bool_nocross.sum() == n_i * (n_j-1) - 1 - (n_j-1)
+    assert np.allclose(uds.vo.isel(time=0, lev=0).to_numpy()[bool_nocross], vo_expected[bool_nocross])